@@ -10,29 +10,46 @@
 #!/usr/bin/env python3
 # Purpose: Load inbound TWCS, normalize timestamps to UTC, clean text, and save prepared outputs.
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import argparse
 import os
 import re
+import time
 import pandas as pd
 
+import storage
+from instrument import metrics, peak_rss_mb
+
 # ---------- paths ----------
 BASE_DIR   = Path(__file__).resolve().parent
 DATA_DIR   = BASE_DIR / "data"
 OUT_DIR    = BASE_DIR / "outputs"; OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-IN_FILE    = Path(os.getenv("TWCS_INBOUND", DATA_DIR / "twcs_inbound_with_roberta.csv"))
-OUT_CLEAN  = OUT_DIR / "twcs_prepared.csv"
+IN_FILE    = Path(os.getenv("TWCS_INBOUND", os.getenv("TWCS_RAW", DATA_DIR / "twcs.csv")))
+OUT_CLEAN  = DATA_DIR / "twcs_prepared.csv"   # read by 02_sentiment_roberta_with_vader_fallback.py
 OUT_SAMPLE = OUT_DIR / "sample_preview.csv"
 
 # ---------- helpers ----------
 _url  = re.compile(r"https?://\S+")
 _emo  = re.compile(r"[^\w\s\.\,\!\?\-\'\"]", flags=re.UNICODE)
 
+_ws   = re.compile(r"\s+")
+
 def clean_text(s: str) -> str:
     s = str(s).lower()
     s = _url.sub(" ", s)
     s = _emo.sub(" ", s)
-    return re.sub(r"\s+", " ", s).strip()
+    return _ws.sub(" ", s).strip()
+
+def clean_series(s: pd.Series) -> pd.Series:
+    # vectorized clean_text for a whole column
+    # mask missing text back to NaN after astype(str) (pandas 2 turns it into "nan") so it is dropped
+    s = s.astype(str).where(s.notna()).str.lower()
+    s = s.str.replace(_url, " ", regex=True)
+    s = s.str.replace(_emo, " ", regex=True)
+    return s.str.replace(_ws, " ", regex=True).str.strip()
 
 def pick(colnames, candidates):
     lc = {c.lower(): c for c in colnames}
@@ -40,25 +57,113 @@ def pick(colnames, candidates):
         if cand in lc: return lc[cand]
     raise ValueError(f"Missing any of required columns: {candidates}")
 
-# ---------- load ----------
-print(f"[load] {IN_FILE}")
-df = pd.read_csv(IN_FILE)
+def transform(df, text_col, time_col, id_col):
+    if "inbound" in df.columns:
+        # raw TWCS dumps mix customer mentions with brand replies; keep the mentions
+        df = df[df["inbound"].astype(str).str.lower() == "true"]
+    out = pd.DataFrame({
+        "tweet_id":   df[id_col],
+        "created_at": storage.parse_twcs_time(df[time_col]),
+        "text_clean2": clean_series(df[text_col]),
+    })
+    return out.dropna(subset=["created_at","text_clean2"])
+
+def detect_columns(colnames):
+    # pick required columns, tolerant to different schemas
+    text_col   = pick(colnames, ["text","body","message","content"])
+    time_col   = pick(colnames, ["created_at","created_at_utc","date","datetime","timestamp"])
+    id_col     = pick(colnames, ["tweet_id","id","status_id","message_id"])
+    return text_col, time_col, id_col
+
+def run_full():
+    # ---------- load ----------
+    print(f"[load] {IN_FILE}")
+    with metrics.timer("read_csv"):
+        df = pd.read_csv(IN_FILE)
+    cols = detect_columns(df.columns)
+    metrics.count("rows_in", len(df))
+
+    # ---------- transform ----------
+    print("[transform] normalize timestamps → UTC, clean text")
+    with metrics.timer("transform"):
+        df = transform(df, *cols)
+
+    # ---------- save ----------
+    with metrics.timer("to_csv"):
+        df.to_csv(OUT_CLEAN, index=False)
+        df.head(5).to_csv(OUT_SAMPLE, index=False)
+    metrics.count("rows_out", len(df))
+
+    print(f"[done] rows={len(df):,}  clean={OUT_CLEAN}  sample={OUT_SAMPLE}")
+
+def timed_chunks(reader):
+    # attributes the CSV parsing of each chunk to read_csv
+    while True:
+        with metrics.timer("read_csv"):
+            chunk = next(reader, None)
+        if chunk is None:
+            return
+        metrics.count("rows_in", len(chunk))
+        yield chunk
+
+def run_streaming(chunksize, workers=0):
+    # Reads, cleans and appends bounded chunks so peak memory tracks chunk size, not file size
+    print(f"[load] {IN_FILE} (streaming, chunksize={chunksize:,}, workers={workers})")
+    header = pd.read_csv(IN_FILE, nrows=0).columns
+    cols = detect_columns(header)
+    reader = pd.read_csv(IN_FILE, usecols=sorted(set(cols) | ({"inbound"} & set(header))), chunksize=chunksize)
 
-# pick required columns, tolerant to different schemas
-text_col   = pick(df.columns, ["text","body","message","content"])
-time_col   = pick(df.columns, ["created_at","created_at_utc","date","datetime","timestamp"])
-id_col     = pick(df.columns, ["tweet_id","id","status_id","message_id"])
+    tmp = OUT_CLEAN.with_suffix(".csv.tmp")
+    state = {"rows": 0, "chunk": 0, "t0": time.perf_counter(), "t_chunk": time.perf_counter()}
 
-# ---------- transform ----------
-print("[transform] normalize timestamps → UTC, clean text")
-df["created_at"] = pd.to_datetime(df[time_col], errors="coerce", utc=True)
-df["tweet_id"]   = df[id_col]
-df["text_clean"] = df[text_col].map(clean_text)
+    def write(out):
+        first = state["chunk"] == 0
+        with metrics.timer("to_csv"):
+            out.to_csv(tmp, index=False, mode="w" if first else "a", header=first)
+            if first:
+                out.head(5).to_csv(OUT_SAMPLE, index=False)
+        metrics.count("rows_out", len(out))
+        now = time.perf_counter()
+        state["rows"] += len(out); state["chunk"] += 1
+        print(f"[chunk {state['chunk']}] rows={len(out):,}  {len(out) / max(now - state['t_chunk'], 1e-9):,.0f} rows/s  "
+              f"total={state['rows']:,}  peak_rss={peak_rss_mb():,.0f} MB")
+        state["t_chunk"] = now
 
-df = df.dropna(subset=["created_at","text_clean"]).loc[:, ["tweet_id","created_at","text_clean"]]
+    if workers > 0:
+        # bounded in-flight queue: results are written in input order without buffering the whole file
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            inflight = deque()
+            for chunk in timed_chunks(reader):
+                inflight.append(pool.submit(transform, chunk, *cols))
+                if len(inflight) >= 2 * workers:
+                    with metrics.timer("wait_workers"):
+                        out = inflight.popleft().result()
+                    write(out)
+            while inflight:
+                with metrics.timer("wait_workers"):
+                    out = inflight.popleft().result()
+                write(out)
+    else:
+        for chunk in timed_chunks(reader):
+            with metrics.timer("transform"):
+                out = transform(chunk, *cols)
+            write(out)
 
-# ---------- save ----------
-df.to_csv(OUT_CLEAN, index=False)
-df.head(5).to_csv(OUT_SAMPLE, index=False)
+    if state["chunk"] == 0:
+        pd.DataFrame(columns=["tweet_id","created_at","text_clean2"]).to_csv(tmp, index=False)
+    os.replace(tmp, OUT_CLEAN)
+    elapsed = time.perf_counter() - state["t0"]
+    print(f"[done] rows={state['rows']:,}  {state['rows'] / max(elapsed, 1e-9):,.0f} rows/s  "
+          f"peak_rss={peak_rss_mb():,.0f} MB  clean={OUT_CLEAN}  sample={OUT_SAMPLE}")
 
-print(f"[done] rows={len(df):,}  clean={OUT_CLEAN}  sample={OUT_SAMPLE}")
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunksize", type=int, default=int(os.getenv("TWCS_CHUNKSIZE", "0")),
+                    help="stream the input in chunks of this many rows (0 = load whole file)")
+    ap.add_argument("--workers", type=int, default=0, help="clean chunks in a process pool (streaming only)")
+    args = ap.parse_args()
+    with metrics.stage("01"):
+        if args.chunksize > 0:
+            run_streaming(args.chunksize, args.workers)
+        else:
+            run_full()
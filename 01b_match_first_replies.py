@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Purpose: Match every inbound mention to its earliest brand reply and compute response_time_min.
+# Why: Stages 03/04 need response_time_min and author_id_brand; a pandas self-merge over the
+#      in_response_to_tweet_id chains of the full TWCS dump does not fit in memory.
+# What it does:
+# - Pass 1 streams the raw dump and keeps only (parent tweet_id, reply time, brand code) for
+#   brand replies, then sorts them once by (parent, time)                    -> O(n log n)
+# - Pass 2 streams the dump again; each chunk of mentions finds its first reply at or after
+#   the mention time with a binary search
+# - Appends tweet_id, created_at, response_time_min, author_id_brand to data/twcs_first_replies
+# Memory is one chunk plus a few numeric arrays over brand replies.
+
+from pathlib import Path
+import argparse
+import itertools
+import os
+import time
+import numpy as np
+import pandas as pd
+
+import storage
+from instrument import metrics
+
+# ---------- paths ----------
+BASE_DIR = Path(__file__).resolve().parent
+RAW_FILE = Path(os.getenv("TWCS_RAW", BASE_DIR / "data" / "twcs.csv"))
+OUTPUT   = "data/twcs_first_replies"
+
+COLUMNS  = ["tweet_id","author_id","inbound","created_at","in_response_to_tweet_id"]
+NAT = np.iinfo(np.int64).min
+
+# ---------- helpers ----------
+def parse_time_ns(s):
+    ts = storage.parse_twcs_time(s)
+    return ts.astype("datetime64[ns, UTC]").to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+def parse_inbound(s):
+    if s.dtype == bool:
+        return s.to_numpy()
+    return s.astype(str).str.strip().str.lower().isin(["true","1"]).to_numpy()
+
+def read_chunks(path, chunksize):
+    return pd.read_csv(path, usecols=COLUMNS, chunksize=chunksize,
+                       dtype={"author_id": str, "inbound": str})
+
+class ReplyIndex:
+    """Brand replies sorted by (parent tweet, reply time) as packed NumPy arrays.
+
+    Each reply is stored as one int64 key `parent_rank << 32 | seconds since base`, so the
+    first reply at or after a mention is a single binary search over `keys`.
+    """
+
+    def __init__(self, parents, keys, brand_codes, brands, base_s):
+        self.parents = parents          # sorted unique parent tweet ids
+        self.keys = keys                # sorted packed (parent rank, reply second)
+        self.brand_codes = brand_codes
+        self.brands = np.array(brands, dtype=object)
+        self.base_s = base_s
+
+    @classmethod
+    def build(cls, path, chunksize):
+        parents, times, codes = [], [], []
+        brand_ids = {}
+        for chunk in read_chunks(path, chunksize):
+            ts = parse_time_ns(chunk["created_at"])
+            parent = pd.to_numeric(chunk["in_response_to_tweet_id"], errors="coerce")
+            keep = ~parse_inbound(chunk["inbound"]) & parent.notna().to_numpy() & (ts != NAT)
+            if not keep.any():
+                continue
+            local, uniques = pd.factorize(chunk["author_id"].to_numpy()[keep])
+            lookup = np.array([brand_ids.setdefault(b, len(brand_ids)) for b in uniques], dtype=np.int32)
+            parents.append(parent.to_numpy()[keep].astype(np.int64))
+            times.append(ts[keep] // 1_000_000_000)
+            codes.append(lookup[local])
+
+        if not parents:
+            empty = np.empty(0, dtype=np.int64)
+            return cls(empty, empty, np.empty(0, dtype=np.int32), [], 0)
+        parents = np.concatenate(parents); secs = np.concatenate(times); codes = np.concatenate(codes)
+        base_s = int(secs.min())
+        uniq, rank = np.unique(parents, return_inverse=True)
+        keys = (rank.astype(np.int64) << 32) | (secs - base_s)
+        order = np.argsort(keys, kind="stable")
+        return cls(uniq, keys[order], codes[order], list(brand_ids), base_s)
+
+    def lookup(self, tweet_ids, mention_ns):
+        # returns (response_time_min, author_id_brand) for the first reply at/after each mention
+        n = len(tweet_ids)
+        minutes = np.full(n, np.nan)
+        brand = np.full(n, None, dtype=object)
+        if len(self.parents) == 0 or n == 0:
+            return minutes, brand
+        rank = np.searchsorted(self.parents, tweet_ids)
+        rank_c = np.minimum(rank, len(self.parents) - 1)
+        hit = (self.parents[rank_c] == tweet_ids) & (mention_ns != NAT)
+        mention_s = mention_ns // 1_000_000_000 - self.base_s
+        probe = (rank_c.astype(np.int64) << 32) | np.clip(mention_s, 0, 0xFFFFFFFF)
+        j = np.minimum(np.searchsorted(self.keys, probe), len(self.keys) - 1)
+        hit &= (self.keys[j] >> 32) == rank_c
+        hit &= self.keys[j] >= probe
+        reply_s = self.keys[j] & 0xFFFFFFFF
+        minutes[hit] = (reply_s[hit] - mention_s[hit]) / 60.0
+        brand[hit] = self.brands[self.brand_codes[j[hit]]]
+        return minutes, brand
+
+def match_mentions(path, index, chunksize):
+    # yields one frame per chunk of inbound mentions
+    for chunk in read_chunks(path, chunksize):
+        ts = parse_time_ns(chunk["created_at"])
+        keep = parse_inbound(chunk["inbound"]) & (ts != NAT)
+        ids = pd.to_numeric(chunk["tweet_id"], errors="coerce").to_numpy()
+        keep &= ~np.isnan(ids)
+        ids = ids[keep].astype(np.int64); ts = ts[keep]
+        minutes, brand = index.lookup(ids, ts)
+        yield pd.DataFrame({
+            "tweet_id":          ids,
+            "created_at":        pd.to_datetime(ts, utc=True),
+            "response_time_min": minutes,
+            "author_id_brand":   brand,
+        })
+
+# ---------- run ----------
+def main(chunksize):
+    t0 = time.perf_counter()
+    print(f"[pass 1] indexing brand replies in {RAW_FILE}")
+    with metrics.timer("build_index"):
+        index = ReplyIndex.build(RAW_FILE, chunksize)
+    print(f"[pass 1] replies={len(index.keys):,} replied tweets={len(index.parents):,} brands={len(index.brands):,} "
+          f"({time.perf_counter() - t0:,.1f}s)")
+
+    rows = matched = 0
+    chunks = match_mentions(RAW_FILE, index, chunksize)
+    for i in itertools.count():
+        with metrics.timer("match_chunk"):
+            out = next(chunks, None)
+        if out is None:
+            break
+        with metrics.timer("write_table"):
+            storage.write_table(out, OUTPUT, append=i > 0)
+        rows += len(out); matched += int(out["response_time_min"].notna().sum())
+    metrics.count("mentions", rows)
+    metrics.count("with_reply", matched)
+    print(f"[done] mentions={rows:,} with_reply={matched:,} out={OUTPUT} ({time.perf_counter() - t0:,.1f}s)")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunksize", type=int, default=500_000)
+    with metrics.stage("01b"):
+        main(ap.parse_args().chunksize)
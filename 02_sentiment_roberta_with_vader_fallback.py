@@ -1,73 +1,279 @@
-
 # Purpose: Score sentiment using RoBERTa with VADER fallback.
 # Why: Modern transformer sentiment is more accurate; VADER provides a lightweight backup.
+#
+# Usage:
+#   python 02_sentiment_roberta_with_vader_fallback.py                      # single process
+#   python 02_sentiment_roberta_with_vader_fallback.py --workers 8          # sharded, resumable
+#   python 02_sentiment_roberta_with_vader_fallback.py --workers 8 --shard-rows 200000
+#   SCORE_SERVER=http://127.0.0.1:8765 python 02_sentiment_roberta_with_vader_fallback.py   # use a warm score_server.py
+
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
 
 import pandas as pd
 import numpy as np
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from scipy.special import softmax
 import nltk
 from nltk.sentiment import SentimentIntensityAnalyzer
 
-INPUT = 'data/twcs_prepared.csv'
-OUTPUT = 'data/twcs_inbound_with_roberta.csv'
+import storage
+from instrument import metrics
+from sentiment_cache import SentimentCache, cached_score, format_stats
 
-print('Loading ' + INPUT)
-df = pd.read_csv(INPUT)
-texts = df['text_clean2'].fillna('').astype(str).tolist()
+INPUT = 'data/twcs_prepared.csv'
+OUTPUT = storage.INBOUND   # day-partitioned Parquet; PULSEGUARD_CSV_EXPORT=1 also writes the CSV
+REPLIES = 'data/twcs_first_replies'   # from 01b_match_first_replies.py, if it has been run
+SHARD_DIR = 'data/twcs_roberta_shards'
+# Scores are cached by sha1(text) + model name/version; set SENTIMENT_CACHE= to disable
+CACHE_PATH = os.getenv('SENTIMENT_CACHE', 'data/sentiment_cache.sqlite')
 
-# Try RoBERTa
 model_name = 'cardiffnlp/twitter-roberta-base-sentiment-latest'
-use_roberta = True
-try:
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(model_name)
-    print('Loaded RoBERTa model')
-except Exception as e:
-    print('RoBERTa load failed: ' + str(e))
-    use_roberta = False
-
-# VADER
-try:
-    nltk.data.find('sentiment/vader_lexicon.zip')
-except LookupError:
-    nltk.download('vader_lexicon')
-sia = SentimentIntensityAnalyzer()
-
-label_map = {0: 'Negative', 1: 'Neutral', 2: 'Positive'}
-
-def score_roberta(texts, batch_size=32):
-    preds = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i+batch_size]
-        enc = tokenizer(batch, return_tensors='pt', padding=True, truncation=True, max_length=256)
-        with torch.no_grad():
-            logits = model(**enc).logits
-        probs = softmax(logits.numpy(), axis=1)
-        idx = probs.argmax(axis=1)
-        conf = probs.max(axis=1)
-        for j in range(len(batch)):
-            preds.append((label_map[int(idx[j])], float(conf[j]), float(probs[j][2] - probs[j][0])))
-    return preds
-
-if use_roberta:
+
+
+def load_roberta(num_threads=None):
+    # Returns a RoBERTa scorer: the warm score_server.py at $SCORE_SERVER if one is up, else a
+    # local model (ONNX Runtime, else PyTorch; see onnx_engine.load_scorer), or None when
+    # neither loads
+    from score_client import connect
+    client = connect()
+    if client is not None:
+        print('Using score server ' + client.url + ' (' + client.backend + ', ' + client.model_version + ')')
+        return client
     try:
-        preds = score_roberta(texts)
-        df['sentiment_roberta'] = [p[0] for p in preds]
-        df['confidence_roberta'] = [p[1] for p in preds]
-        df['score_pos_minus_neg'] = [p[2] for p in preds]
+        from onnx_engine import describe, load_scorer
+        scorer = load_scorer(model_name, num_threads=num_threads)
+        print('Loaded RoBERTa model (' + describe(scorer) + ')')
+        return scorer
     except Exception as e:
-        print('RoBERTa inference failed: ' + str(e))
-        use_roberta = False
+        print('RoBERTa load failed: ' + str(e))
+        return None
+
+
+def load_vader():
+    try:
+        nltk.data.find('sentiment/vader_lexicon.zip')
+    except LookupError:
+        nltk.download('vader_lexicon')
+    return SentimentIntensityAnalyzer()
+
+
+def load_first_replies():
+    if not storage.exists(REPLIES):
+        return None
+    return storage.read_table(REPLIES, columns=['tweet_id', 'response_time_min', 'author_id_brand'])
+
+
+def attach_first_replies(df, replies):
+    # adds response_time_min / author_id_brand used by stages 03 and 04
+    if replies is None:
+        return df
+    df = df.drop(columns=['response_time_min', 'author_id_brand'], errors='ignore')
+    return df.merge(replies, on='tweet_id', how='left')
+
+
+def open_cache():
+    return SentimentCache(CACHE_PATH) if CACHE_PATH else None
+
+
+def score_roberta(scorer, texts, cache=None):
+    # Dedupes texts and scores only cache misses, in length-bucketed batches.
+    # Returns (labels, confidence, score_pos_minus_neg) arrays in input order.
+    (labels, conf, pos_minus_neg), stats = cached_score(
+        cache, scorer.model_name + '@' + scorer.model_version, texts, scorer.score)
+    print(format_stats('roberta', stats))
+    if stats['misses']:
+        print(scorer.report())
+    return labels, conf, pos_minus_neg
+
+
+def _vader_scores(sia, texts):
+    polar = [sia.polarity_scores(t) for t in texts]
+    compound = np.array([p['compound'] for p in polar], dtype=np.float32)
+    labels = np.where(compound >= 0.05, 'Positive', np.where(compound <= -0.05, 'Negative', 'Neutral'))
+    pos_minus_neg = np.array([p['pos'] - p['neg'] for p in polar], dtype=np.float32)
+    return labels, np.abs(compound), pos_minus_neg, compound
+
+
+def score_vader(sia, texts, cache=None):
+    # Returns (labels, confidence, score_pos_minus_neg, compound) arrays in input order
+    result, stats = cached_score(cache, 'vader@' + nltk.__version__, texts,
+                                 lambda t: _vader_scores(sia, t), with_compound=True)
+    print(format_stats('vader', stats))
+    return result
+
+
+def score_frame(df, scorer, sia, cache=None):
+    texts = df['text_clean2'].fillna('').astype(str).tolist()
+    if scorer is not None:
+        try:
+            with metrics.timer('score_roberta'):
+                labels, conf, pos_minus_neg = score_roberta(scorer, texts, cache)
+            df['sentiment_roberta'] = labels
+            df['confidence_roberta'] = conf
+            df['score_pos_minus_neg'] = pos_minus_neg
+            return df
+        except Exception as e:
+            print('RoBERTa inference failed: ' + str(e))
 
-if not use_roberta:
     print('Falling back to VADER')
-    df['vader_compound'] = df['text_clean2'].apply(lambda x: sia.polarity_scores(x)['compound'])
-    df['sentiment_roberta'] = np.where(df['vader_compound'] >= 0.05, 'Positive', np.where(df['vader_compound'] <= -0.05, 'Negative', 'Neutral'))
-    df['confidence_roberta'] = df['vader_compound'].abs()
-    df['score_pos_minus_neg'] = df['text_clean2'].apply(lambda x: sia.polarity_scores(x)['pos'] - sia.polarity_scores(x)['neg'])
-
-print('Saving to ' + OUTPUT)
-df.to_csv(OUTPUT, index=False)
-print('Rows: ' + str(len(df)))
+    with metrics.timer('score_vader'):
+        labels, conf, pos_minus_neg, compound = score_vader(sia, texts, cache)
+    df['vader_compound'] = compound
+    df['sentiment_roberta'] = labels
+    df['confidence_roberta'] = conf
+    df['score_pos_minus_neg'] = pos_minus_neg
+    return df
+
+
+def run_single():
+    print('Loading ' + INPUT)
+    with metrics.timer('read_csv'):
+        df = pd.read_csv(INPUT)
+    with metrics.timer('attach_first_replies'):
+        df = attach_first_replies(df, load_first_replies())
+    with metrics.timer('load_model'):
+        scorer, sia = load_roberta(), load_vader()
+    df = score_frame(df, scorer, sia, open_cache())
+    print('Saving to ' + OUTPUT)
+    with metrics.timer('write_table'):
+        storage.write_table(df, OUTPUT)
+    metrics.count('rows', len(df))
+    print('Rows: ' + str(len(df)))
+
+
+# ---------- sharded mode ----------
+# Each worker loads the model once; each finished shard is renamed into place atomically,
+# so a rerun only scores shards that are missing and then merges them in order.
+
+def prepare_onnx():
+    # export/quantize the ONNX model once in the parent, before workers load it
+    if os.getenv('SCORE_SERVER') or os.getenv('ROBERTA_BACKEND', 'auto') == 'torch':
+        return
+    try:
+        from onnx_engine import ensure_onnx
+        ensure_onnx(model_name, quantize=os.getenv('ROBERTA_QUANTIZE', '0') == '1')
+    except Exception as e:
+        print('ONNX export skipped: ' + str(e))
+
+
+_worker = {}
+
+
+def _init_worker(num_threads):
+    metrics.reset()   # a forked worker starts with a copy of the parent's timers
+    with metrics.timer('load_model'):
+        _worker['scorer'] = load_roberta(num_threads)
+        _worker['sia'] = load_vader()
+    _worker['cache'] = open_cache()
+    _worker['replies'] = load_first_replies()
+
+
+def _score_shard(shard_id, df, shard_dir):
+    # returns the worker's timers since its last shard so the parent report covers them
+    with metrics.timer('attach_first_replies'):
+        df = attach_first_replies(df, _worker['replies'])
+    df = score_frame(df, _worker['scorer'], _worker['sia'], _worker['cache'])
+    final = Path(shard_dir) / f'part-{shard_id:05d}.csv'
+    tmp = final.with_suffix('.csv.tmp')
+    with metrics.timer('to_csv'):
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, final)
+    return shard_id, len(df), metrics.drain()
+
+
+def _hub_revision(name):
+    # commit hash of the locally cached hub snapshot, which is what from_pretrained loads
+    try:
+        from huggingface_hub import constants
+        ref = Path(constants.HF_HUB_CACHE) / ('models--' + name.replace('/', '--')) / 'refs' / 'main'
+        return ref.read_text().strip()
+    except (ImportError, OSError):
+        return None
+
+
+def scorer_settings():
+    # what decides the scores besides the input: backend, quantization and the exact weights
+    from onnx_engine import ONNX_DIR
+    from score_client import connect
+    backend = os.getenv('ROBERTA_BACKEND', 'auto')
+    settings = {'backend': backend, 'quantize': os.getenv('ROBERTA_QUANTIZE', '0') == '1'}
+    client = connect(timeout=30) if os.getenv('SCORE_SERVER') else None
+    onnx_meta = Path(ONNX_DIR) / 'meta.json'
+    if client is not None:
+        settings.update(backend='server:' + client.backend, model_revision=client.model_version)
+    elif backend != 'torch' and onnx_meta.exists():
+        settings['model_revision'] = json.loads(onnx_meta.read_text()).get('revision')
+    else:
+        settings['model_revision'] = _hub_revision(model_name)
+    return settings
+
+
+def _prepare_shard_dir(shard_dir, shard_rows):
+    st = os.stat(INPUT)
+    meta = {'input': os.path.abspath(INPUT), 'size': st.st_size, 'mtime': st.st_mtime,
+            'shard_rows': shard_rows, 'model_name': model_name, **scorer_settings()}
+    meta_path = shard_dir / '_meta.json'
+    if meta_path.exists() and json.loads(meta_path.read_text()) != meta:
+        print('Input, shard size or scoring settings changed; discarding stale shards in ' + str(shard_dir))
+        shutil.rmtree(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    meta_path.write_text(json.dumps(meta))
+
+
+def merge_shards(shard_dir, n_shards, output):
+    # one shard in memory at a time; the first replaces the table, the rest append to it
+    for i in range(n_shards):
+        part = pd.read_csv(Path(shard_dir) / f'part-{i:05d}.csv')
+        storage.write_table(part, output, append=i > 0)
+
+
+def run_sharded(workers, shard_rows):
+    shard_dir = Path(SHARD_DIR)
+    prepare_onnx()   # first, so the shard meta sees the exported model's revision
+    _prepare_shard_dir(shard_dir, shard_rows)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print('Sharding ' + INPUT + ' into ' + str(shard_rows) + '-row shards across ' + str(workers) + ' workers')
+
+    n_shards = skipped = rows = 0
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        for shard_id, chunk in enumerate(pd.read_csv(INPUT, chunksize=shard_rows)):
+            n_shards += 1
+            if (shard_dir / f'part-{shard_id:05d}.csv').exists():
+                skipped += 1
+                continue
+            # keep at most two shards per worker in flight so memory stays bounded
+            while len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    sid, n, worker_metrics = fut.result()
+                    metrics.merge(worker_metrics, 'worker.')
+                    rows += n
+                    print('Shard ' + str(sid) + ' done (' + str(n) + ' rows)')
+            pending.add(pool.submit(_score_shard, shard_id, chunk, str(shard_dir)))
+        for fut in pending:
+            sid, n, worker_metrics = fut.result()
+            metrics.merge(worker_metrics, 'worker.')
+            rows += n
+            print('Shard ' + str(sid) + ' done (' + str(n) + ' rows)')
+
+    print('Shards: ' + str(n_shards) + ' (skipped ' + str(skipped) + ' already scored, scored ' + str(rows) + ' rows)')
+    metrics.count('rows', rows)
+    print('Merging shards into ' + OUTPUT)
+    with metrics.timer('merge_shards'):
+        merge_shards(shard_dir, n_shards, OUTPUT)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--workers', type=int, default=0, help='score shards across this many processes (0 = single process)')
+    ap.add_argument('--shard-rows', type=int, default=100_000)
+    args = ap.parse_args()
+    with metrics.stage('02'):
+        if args.workers > 0:
+            run_sharded(args.workers, args.shard_rows)
+        else:
+            run_single()
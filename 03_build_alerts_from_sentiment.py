@@ -1,24 +1,84 @@
-
 # Purpose: Build SLA alerts based on negative sentiment and response-time breaches.
 # Why: Focus agent attention on urgent, negative mentions not answered in time.
+#
+# Usage:
+#   python 03_build_alerts_from_sentiment.py                        # legacy: one row per breached tier
+#   python 03_build_alerts_from_sentiment.py --compact              # one row per mention, highest tier
+#   python 03_build_alerts_from_sentiment.py --brand-thresholds data/sla_thresholds.csv
+#   python 03_build_alerts_from_sentiment.py --incremental          # only mentions after the last watermark
+#   python 03_build_alerts_from_sentiment.py --incidents            # + incident_id/size/text (near-duplicates)
+#
+# --incidents folds new negative mentions into the incident index (data/twcs_incidents, see
+# incidents.py) and tags each alert with its incident. Keep it on or off across --incremental runs,
+# since appended alert files must share the columns of the earlier ones.
 
+import argparse
+import json
+import os
 import pandas as pd
+import storage
+from alert_builder import DEFAULT_THRESHOLDS, attach_incidents, build_alerts, load_brand_thresholds
+from incidents import INCIDENTS, IncidentIndex
+from instrument import metrics
+
+INPUT = storage.INBOUND
+OUTPUT = storage.ALERTS
+WATERMARK = 'data/twcs_alerts_roberta.watermark.json'
+
+
+def read_watermark():
+    if not os.path.exists(WATERMARK) or not storage.exists(OUTPUT):
+        return None
+    with open(WATERMARK) as f:
+        return pd.Timestamp(json.load(f)['created_at'])
+
+
+def write_watermark(ts):
+    tmp = WATERMARK + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'created_at': ts.isoformat()}, f)
+    os.replace(tmp, WATERMARK)
+
 
-INPUT = 'data/twcs_inbound_with_roberta.csv'
-OUTPUT = 'data/twcs_alerts_roberta.csv'
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--thresholds', type=float, nargs='+', default=DEFAULT_THRESHOLDS)
+    ap.add_argument('--brand-thresholds', default=None, help='CSV of author_id_brand,thresholds (e.g. 15;30;60)')
+    ap.add_argument('--compact', action='store_true', help='one row per mention with the highest breached tier')
+    ap.add_argument('--incremental', action='store_true', help='append alerts for mentions newer than the watermark')
+    ap.add_argument('--incidents', action='store_true', help='cluster negative mentions and tag alerts with their incident')
+    args = ap.parse_args()
 
-print('Loading ' + INPUT)
-df = pd.read_csv(INPUT)
+    with metrics.stage('03'):
+        # Expected columns: sentiment_roberta, response_time_min, author_id_brand (from 01b_match_first_replies.py)
+        watermark = read_watermark() if args.incremental else None
+        print('Loading ' + INPUT + ('' if watermark is None else ' after ' + str(watermark)))
+        with metrics.timer('read_table'):
+            df = storage.read_table(INPUT, start=watermark)
+        if watermark is not None:
+            df = df[df['created_at'] > watermark]
 
-# Expected columns: sentiment_roberta, response_time_min, author_id_brand
-thresholds = [30, 60, 120]
-alerts = []
-for t in thresholds:
-    dfa = df[(df['sentiment_roberta'] == 'Negative') & ((df['response_time_min'].isna()) | (df['response_time_min'] > t))].copy()
-    dfa['sla_threshold_min'] = t
-    alerts.append(dfa)
+        incidents = None
+        if args.incidents:
+            with metrics.timer('incidents'):
+                incidents = IncidentIndex.load(INCIDENTS, source=INPUT)
+                added = len(incidents.ingest(df[df['sentiment_roberta'] == 'Negative']))
+                incidents.save()
+                df['incident_id'] = incidents.incident_ids(df['tweet_id'])
+            metrics.count('incident_mentions', added)
+            print('Incidents: ' + str(incidents.n) + ' (' + str(added) + ' new negative mentions clustered)')
 
-alerts_df = pd.concat(alerts, ignore_index=True) if len(alerts) > 0 else pd.DataFrame()
-print('Alerts rows: ' + str(len(alerts_df)))
-alerts_df.to_csv(OUTPUT, index=False)
-print('Saved ' + OUTPUT)
+        brand_thresholds = load_brand_thresholds(args.brand_thresholds) if args.brand_thresholds else None
+        with metrics.timer('build_alerts'):
+            alerts_df = build_alerts(df, args.thresholds, brand_thresholds, compact=args.compact)
+            if incidents is not None:
+                alerts_df = attach_incidents(alerts_df, incidents.clusters())
+        metrics.count('mentions', len(df))
+        metrics.count('alerts', len(alerts_df))
+        print('Alerts rows: ' + str(len(alerts_df)))
+        if watermark is None or len(alerts_df) > 0:
+            with metrics.timer('write_table'):
+                storage.write_table(alerts_df, OUTPUT, append=watermark is not None)
+        if df['created_at'].notna().any():
+            write_watermark(df['created_at'].max() if watermark is None else max(watermark, df['created_at'].max()))
+        print('Saved ' + OUTPUT)
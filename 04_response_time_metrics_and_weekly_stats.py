@@ -1,28 +1,71 @@
-
 # Purpose: Compute response-time distribution and weekly percentiles for top brands.
 # Why: Quantify customer support responsiveness across time.
+#
+# Weekly p50/p90/p95 come from per-(brand, week) t-digest sketches persisted in
+# data/twcs_rt_sketches.json. Each run only folds in mentions newer than the stored watermark;
+# --rebuild starts over from the full table. --rollup merges the weekly sketches per month
+# or per brand without touching raw rows.
 
+import argparse
+import os
 import pandas as pd
+import storage
+from quantile_sketch import SketchStore, percentile_frame
+from instrument import metrics
 
-INPUT = 'data/twcs_inbound_with_roberta.csv'
+INPUT = storage.INBOUND
 OUT_RT = 'data/twcs_first_reply_times.csv'
 OUT_WK = 'data/twcs_weekly_rt_stats.csv'
+SKETCHES = 'data/twcs_rt_sketches.json'
+
+ap = argparse.ArgumentParser()
+ap.add_argument('--rebuild', action='store_true', help='ignore saved sketches and rescan the whole table')
+ap.add_argument('--rollup', choices=['month', 'brand'], nargs='*', default=[])
+args = ap.parse_args()
+
+with metrics.stage('04'):
+    store = SketchStore.load(SKETCHES) if os.path.exists(SKETCHES) and not args.rebuild else SketchStore()
+    watermark = store.watermark
+
+    print('Loading ' + INPUT + ('' if watermark is None else ' after ' + str(watermark)))
+    with metrics.timer('read_table'):
+        df = storage.read_table(INPUT, columns=['author_id_brand','response_time_min','created_at'], start=watermark)
+    metrics.count('rows', len(df))
+    if watermark is not None:
+        df = df[df['created_at'] > watermark]
+
+    # response_time_min comes from 01b_match_first_replies.py, attached to each mention in stage 02
+    rt_pairs = df[['author_id_brand','response_time_min']].dropna().copy()
+    append = watermark is not None and os.path.exists(OUT_RT)
+    with metrics.timer('to_csv'):
+        rt_pairs.to_csv(OUT_RT, index=False, mode='a' if append else 'w', header=not append)
+    print(('Appended ' + str(len(rt_pairs)) + ' rows to ' if append else 'Saved ') + OUT_RT)
+
+    # Weekly percentiles by brand
+    if 'created_at' in df.columns:
+        df['week'] = df['created_at'].dt.tz_localize(None).dt.to_period('W').dt.start_time
+        with metrics.timer('sketch_add'):
+            store.add(df, 'week')
+        if df['created_at'].notna().any():
+            store.watermark = df['created_at'].max()
+        store.save(SKETCHES)
+        print('Updated ' + SKETCHES + ' (' + str(len(store.sketches)) + ' brand-week sketches)')
+
+        with metrics.timer('percentiles'):
+            agg = percentile_frame(store.sketches, ['author_id_brand','week']).drop(columns='n')
+        agg['week'] = pd.to_datetime(agg['week'])
+        agg.to_csv(OUT_WK, index=False)
+        print('Saved ' + OUT_WK)
 
-print('Loading ' + INPUT)
-df = pd.read_csv(INPUT)
-
-# Assume response_time_min already present from earlier matching of mentions with first replies
-rt_pairs = df[['author_id_brand','response_time_min']].dropna().copy()
-rt_pairs.to_csv(OUT_RT, index=False)
-print('Saved ' + OUT_RT)
-
-# Weekly percentiles by brand
-if 'created_at' in df.columns:
-    df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce', utc=True)
-    df['week'] = df['created_at'].dt.to_period('W').dt.start_time
-    agg = df.dropna(subset=['response_time_min']).groupby(['author_id_brand','week'])['response_time_min'].quantile([0.5,0.9,0.95]).unstack(level=-1)
-    agg = agg.rename(columns={0.5:'p50_min',0.9:'p90_min',0.95:'p95_min'}).reset_index()
-    agg.to_csv(OUT_WK, index=False)
-    print('Saved ' + OUT_WK)
-else:
-    print('created_at missing; skipping weekly stats')
+        for level in args.rollup:
+            if level == 'month':
+                merged = store.rollup(lambda b, w: (b, pd.Timestamp(w).strftime('%Y-%m')))
+                out = percentile_frame(merged, ['author_id_brand','month'])
+            else:
+                merged = store.rollup(lambda b, w: b)
+                out = percentile_frame(merged, ['author_id_brand'])
+            path = 'data/twcs_' + level + '_rt_stats.csv'
+            out.to_csv(path, index=False)
+            print('Saved ' + path)
+    else:
+        print('created_at missing; skipping weekly stats')
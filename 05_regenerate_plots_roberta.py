@@ -1,61 +1,118 @@
-
 # Purpose: Regenerate key plots using RoBERTa labels.
 # Why: Visuals help stakeholders grasp trends and outliers quickly.
+#
+# Figures are written to outputs/figures with the Agg backend and rendered in parallel; a figure
+# is skipped when its input data hashes the same as at its last render (see plot_render.py).
+# Daily negatives come from the minute rollup, which this stage only reads; rollup_store.py builds it.
+#
+# Usage:
+#   python 05_regenerate_plots_roberta.py                       # PNGs to outputs/figures
+#   python 05_regenerate_plots_roberta.py --formats png svg --force
+#   python 05_regenerate_plots_roberta.py --show                # interactive windows (needs a display)
 
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+import storage
+from instrument import metrics
+from plot_render import FIG_DIR, render_figures, show_figures
+from rollup_store import RollupStore, _to_ts
 
 sns.set(style='whitegrid')
 
-rt_pairs = pd.read_csv('data/twcs_first_reply_times.csv')
-weekly_stats = pd.read_csv('data/twcs_weekly_rt_stats.csv')
-inbound_rb = pd.read_csv('data/twcs_inbound_with_roberta.csv')
-alerts_rb = pd.read_csv('data/twcs_alerts_roberta.csv')
-
-print('Loaded data for plotting')
-
-plt.figure(figsize=(8,5))
-import numpy as np
-sns.histplot(rt_pairs['response_time_min'], bins=40, kde=True, color='steelblue')
-plt.title('Overall First Response Time (minutes)')
-plt.xlabel('Minutes to First Reply')
-plt.ylabel('Count')
-plt.tight_layout()
-plt.show()
-
-brand_counts = rt_pairs['author_id_brand'].value_counts().head(6).index.tolist()
-weekly_top = weekly_stats[weekly_stats['author_id_brand'].isin(brand_counts)].copy()
-plt.figure(figsize=(10,6))
-for metric, color in [('p50_min','green'),('p90_min','orange'),('p95_min','red')]:
-    tmp = weekly_top.sort_values('week')
-    for b in brand_counts:
-        sub = tmp[tmp['author_id_brand'] == b]
-        plt.plot(sub['week'], sub[metric], marker='o', linewidth=1, label=b + ' ' + metric)
-plt.xticks(rotation=45, ha='right')
-plt.title('Weekly Response Time Percentiles (Top Brands)')
-plt.xlabel('Week')
-plt.ylabel('Minutes')
-handles, labels = plt.gca().get_legend_handles_labels()
-unique = dict(zip(labels, handles))
-plt.legend(unique.values(), unique.keys(), bbox_to_anchor=(1.05,1), loc='upper left', fontsize=8)
-plt.tight_layout()
-plt.show()
-
-inbound_rb['created_at'] = pd.to_datetime(inbound_rb['created_at'], errors='coerce')
-inbound_rb['date'] = inbound_rb['created_at'].dt.date
-neg_daily = inbound_rb[inbound_rb['sentiment_roberta'] == 'Negative'].groupby('date').size().reset_index(name='neg_count')
-alerts_rb['created_at'] = pd.to_datetime(alerts_rb['created_at'], errors='coerce')
-alerts_rb['date'] = alerts_rb['created_at'].dt.date
-alerts_daily = alerts_rb.groupby('date').size().reset_index(name='alerts_count')
-plt.figure(figsize=(10,5))
-plt.plot(neg_daily['date'], neg_daily['neg_count'], marker='o', color='crimson', label='Negative inbound (RoBERTa)')
-plt.plot(alerts_daily['date'], alerts_daily['alerts_count'], marker='s', color='black', label='Alerts (RoBERTa)')
-plt.title('Daily Negative Tweets and Alerts (RoBERTa)')
-plt.xlabel('Date')
-plt.ylabel('Count')
-plt.legend()
-plt.tight_layout()
-plt.show()
-
-print('Finished plotting.')
+RT_PAIRS = 'data/twcs_first_reply_times.csv'
+WEEKLY = 'data/twcs_weekly_rt_stats.csv'
+METRICS = ['p50_min', 'p90_min', 'p95_min']
+
+
+def draw_rt_hist(rt):
+    fig = plt.figure(figsize=(8,5))
+    sns.histplot(rt, bins=40, kde=True, color='steelblue')
+    plt.title('Overall First Response Time (minutes)')
+    plt.xlabel('Minutes to First Reply')
+    plt.ylabel('Count')
+    fig.tight_layout()
+    return fig
+
+
+def draw_weekly_percentiles(wide):
+    # wide: index week, columns (metric, brand)
+    fig = plt.figure(figsize=(10,6))
+    for metric, brand in wide.columns:
+        sub = wide[(metric, brand)].dropna()
+        plt.plot(sub.index, sub.to_numpy(), marker='o', linewidth=1, label=brand + ' ' + metric)
+    plt.xticks(rotation=45, ha='right')
+    plt.title('Weekly Response Time Percentiles (Top Brands)')
+    plt.xlabel('Week')
+    plt.ylabel('Minutes')
+    plt.legend(bbox_to_anchor=(1.05,1), loc='upper left', fontsize=8)
+    fig.tight_layout()
+    return fig
+
+
+def draw_daily_negatives(data):
+    neg_daily, alerts_daily = data
+    fig = plt.figure(figsize=(10,5))
+    plt.plot(neg_daily['date'], neg_daily['neg_count'], marker='o', color='crimson', label='Negative inbound (RoBERTa)')
+    plt.plot(alerts_daily['date'], alerts_daily['alerts_count'], marker='s', color='black', label='Alerts (RoBERTa)')
+    plt.title('Daily Negative Tweets and Alerts (RoBERTa)')
+    plt.xlabel('Date')
+    plt.ylabel('Count')
+    plt.legend()
+    fig.tight_layout()
+    return fig
+
+
+def weekly_wide(rt_pairs, weekly_stats, top=6):
+    brands = rt_pairs['author_id_brand'].value_counts().head(top).index.tolist()
+    wide = weekly_stats[weekly_stats['author_id_brand'].isin(brands)].pivot_table(
+        index='week', columns='author_id_brand', values=METRICS)
+    return wide.reindex(columns=pd.MultiIndex.from_product([METRICS, brands])).dropna(axis=1, how='all')
+
+
+def daily_counts():
+    # read-only: the rollup stage (python rollup_store.py) refreshes and saves the shared rollup
+    store = RollupStore.load(source=storage.INBOUND)
+    if store.watermark is None:
+        print('Minute rollup is empty; run python rollup_store.py first')
+    per_day = store.buckets.groupby(store.buckets['minute'] // 1440)['negatives'].sum()
+    per_day = per_day[per_day > 0]
+    neg_daily = pd.DataFrame({'date': _to_ts(per_day.index * 1440).date, 'neg_count': per_day.to_numpy()})
+    alerts = storage.read_table(storage.ALERTS, columns=['created_at'])
+    alerts_daily = alerts.groupby(alerts['created_at'].dt.date).size().rename_axis('date').reset_index(name='alerts_count')
+    return neg_daily, alerts_daily
+
+
+def build_jobs():
+    with metrics.timer('read_csv'):
+        rt_pairs = pd.read_csv(RT_PAIRS)
+        weekly_stats = pd.read_csv(WEEKLY, parse_dates=['week'])
+    print('Loaded data for plotting')
+    with metrics.timer('weekly_wide'):
+        wide = weekly_wide(rt_pairs, weekly_stats)
+    with metrics.timer('daily_counts'):
+        daily = daily_counts()
+    return [
+        ('rt_histogram', draw_rt_hist, rt_pairs['response_time_min'].dropna().to_numpy()),
+        ('weekly_rt_percentiles', draw_weekly_percentiles, wide),
+        ('daily_negatives_alerts', draw_daily_negatives, daily),
+    ]
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--out-dir', default=FIG_DIR)
+    ap.add_argument('--formats', nargs='+', default=['png'], help='any matplotlib format, e.g. png svg')
+    ap.add_argument('--workers', type=int, default=None)
+    ap.add_argument('--force', action='store_true', help='re-render even if inputs are unchanged')
+    ap.add_argument('--show', action='store_true', help='open interactive windows instead of writing files')
+    args = ap.parse_args()
+
+    with metrics.stage('05'):
+        jobs = build_jobs()
+        if args.show:
+            show_figures(jobs)
+        else:
+            render_figures(jobs, args.out_dir, args.formats, args.workers, args.force)
+    print('Finished plotting.')
@@ -1,38 +1,59 @@
-
 # Purpose: Extract top uni/bi/tri-gram phrases from negative mentions.
 # Why: Reveal drivers and themes behind negative spikes for actionability.
+#
+# Phrase counts live in data/twcs_phrase_counts (per hour and brand, see phrase_counts.py); each run
+# only tokenizes negative mentions newer than the stored watermark, then answers from merged counts.
+#
+# Usage:
+#   python 06_negative_phrase_mining.py                                  # all-time top 50 per n-gram order
+#   python 06_negative_phrase_mining.py --start 2017-10-01 --brand AppleSupport
+#   python 06_negative_phrase_mining.py --surging                        # last hour vs the week before
+#   python 06_negative_phrase_mining.py --hash-features 1048576          # bound memory with hashed phrase ids
+
+import argparse
+import storage
+from instrument import metrics
+from phrase_counts import ORDERS, PHRASES, PhraseStore
 
-import pandas as pd
-import numpy as np
-from sklearn.feature_extraction.text import CountVectorizer
-import re
+INPUT = storage.INBOUND
 
-INPUT = 'data/twcs_inbound_with_roberta.csv'
+ap = argparse.ArgumentParser()
+ap.add_argument('--start', default=None)
+ap.add_argument('--end', default=None)
+ap.add_argument('--brand', action='append', default=None, help='exact author_id_brand; repeatable')
+ap.add_argument('--top', type=int, default=50)
+ap.add_argument('--surging', action='store_true', help='also write phrases surging in the last hour vs baseline')
+ap.add_argument('--recent-hours', type=int, default=1)
+ap.add_argument('--baseline-hours', type=int, default=168)
+ap.add_argument('--hash-features', type=int, default=None, help='hash phrases into this many buckets')
+ap.add_argument('--rebuild', action='store_true', help='ignore saved counts and rescan the whole table')
+args = ap.parse_args()
 
-print('Loading ' + INPUT)
-df = pd.read_csv(INPUT)
-neg = df[df['sentiment_roberta'] == 'Negative'].copy()
-texts = neg['text_clean2'].fillna('').astype(str).tolist()
+with metrics.stage('06'):
+    if args.rebuild:
+        store = PhraseStore(n_features=args.hash_features)
+    else:
+        store = PhraseStore.load(PHRASES, source=INPUT, n_features=args.hash_features)
+    print('Loading ' + INPUT + ('' if store.watermark is None else ' after ' + str(store.watermark)))
+    with metrics.timer('refresh'):
+        added = store.refresh(INPUT)
+    with metrics.timer('save'):
+        store.save(PHRASES)
+    metrics.count('negatives_added', added)
+    print('Folded ' + str(added) + ' negative mentions into ' + PHRASES)
 
-stop_words = 'english'
-vectorizers = {
-    'uni': CountVectorizer(stop_words=stop_words, ngram_range=(1,1), min_df=2, max_df=0.9),
-    'bi': CountVectorizer(stop_words=stop_words, ngram_range=(2,2), min_df=2, max_df=0.9),
-    'tri': CountVectorizer(stop_words=stop_words, ngram_range=(3,3), min_df=2, max_df=0.9)
-}
+    for key, n in ORDERS.items():
+        with metrics.timer('top'):
+            dfc = store.top(args.start, args.end, args.brand, n=n, k=args.top)[['phrase','count']]
+        out = 'data/negative_phrases_' + key + '.csv'
+        dfc.to_csv(out, index=False)
+        print('Saved ' + out + ' rows: ' + str(len(dfc)))
 
-results = {}
-for key, vec in vectorizers.items():
-    if len(texts) == 0:
-        results[key] = pd.DataFrame(columns=['phrase','count'])
-        continue
-    X = vec.fit_transform(texts)
-    counts = np.asarray(X.sum(axis=0)).ravel()
-    vocab = np.array(vec.get_feature_names_out())
-    dfc = pd.DataFrame({'phrase': vocab, 'count': counts}).sort_values('count', ascending=False).head(50)
-    results[key] = dfc
-    out = 'data/negative_phrases_' + key + '.csv'
-    dfc.to_csv(out, index=False)
-    print('Saved ' + out + ' rows: ' + str(len(dfc)))
+    if args.surging:
+        with metrics.timer('surging'):
+            sdf = store.surging(recent_h=args.recent_hours, baseline_h=args.baseline_hours, brands=args.brand, k=args.top)
+        out = 'data/negative_phrases_surging.csv'
+        sdf.to_csv(out, index=False)
+        print('Saved ' + out + ' rows: ' + str(len(sdf)))
 
 print('Done negative phrase mining.')
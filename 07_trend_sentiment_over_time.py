@@ -1,50 +1,90 @@
-
 # Purpose: Plot sentiment trend and volumes with 15-minute bins.
 # Why: Track sentiment direction and volume changes over time.
+#
+# Bins come from the minute rollup (built by rollup_store.py, only read here) instead of resampling
+# raw rows, and figures are rendered headless with a render cache (plot_render.py); see 05 for the
+# shared flags.
 
+import argparse
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+import storage
+from instrument import metrics
+from plot_render import FIG_DIR, render_figures, show_figures
+from rollup_store import COUNT_COLS, RollupStore, _to_ts
 
-INPUT = 'data/twcs_inbound_with_roberta.csv'
-
-print('Loading ' + INPUT)
-df = pd.read_csv(INPUT)
-df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
+INPUT = storage.INBOUND
+FREQ_MIN = 15
 
 sns.set(style='whitegrid')
 
-def enc(s):
-    if s == 'Positive':
-        return 1
-    if s == 'Negative':
-        return -1
-    return 0
 
-df = df.sort_values('created_at')
-df['senti_val'] = df['sentiment_roberta'].apply(enc)
-trend = df.set_index('created_at').resample('15T')['senti_val'].mean().rename('avg_sentiment_15m').reset_index()
-counts = df.set_index('created_at').groupby('sentiment_roberta').resample('15T').size().unstack(0).fillna(0).reset_index().rename(columns={'created_at':'time'})
+def bins_15m(store, freq_min=FREQ_MIN):
+    """avg sentiment and per-label volume for every 15-minute bin between the first and last mention."""
+    b = store.buckets
+    per_bin = b.groupby(b['minute'] // freq_min)[COUNT_COLS].sum()
+    if len(per_bin) == 0:
+        return pd.DataFrame(columns=['time', 'avg_sentiment_15m', 'Negative', 'Neutral', 'Positive'])
+    per_bin = per_bin.reindex(np.arange(per_bin.index.min(), per_bin.index.max() + 1), fill_value=0)
+    n = per_bin['mentions'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = np.where(n > 0, per_bin['senti_sum'] / n, np.nan)
+    out = pd.DataFrame({'time': _to_ts(per_bin.index * freq_min), 'avg_sentiment_15m': avg,
+                        'Negative': per_bin['negatives'].to_numpy(),
+                        'Neutral': n - per_bin['negatives'].to_numpy() - per_bin['positives'].to_numpy(),
+                        'Positive': per_bin['positives'].to_numpy()})
+    # like the old resample/unstack, labels that never occur get no line
+    return out.drop(columns=[c for c in ['Negative', 'Neutral', 'Positive'] if out[c].sum() == 0])
 
-import matplotlib.pyplot as plt
-plt.figure(figsize=(10,6))
-plt.plot(trend['created_at'], trend['avg_sentiment_15m'], color='purple', label='Avg sentiment (15m)')
-plt.axhline(0, color='gray', linestyle='--', linewidth=1)
-plt.title('Sentiment Trend Over Time (15m)')
-plt.xlabel('Time')
-plt.ylabel('Avg sentiment index (-1..1)')
-plt.tight_layout()
-plt.show()
-
-plt.figure(figsize=(10,6))
-for col in ['Negative','Neutral','Positive']:
-    if col in counts.columns:
-        plt.plot(counts['time'], counts[col], label=col)
-plt.title('Volume by Sentiment (15m)')
-plt.xlabel('Time')
-plt.ylabel('Mentions')
-plt.legend()
-plt.tight_layout()
-plt.show()
-
-print('Plotted sentiment trend and volumes.')
+
+def draw_trend(trend):
+    fig = plt.figure(figsize=(10,6))
+    plt.plot(trend['time'], trend['avg_sentiment_15m'], color='purple', label='Avg sentiment (15m)')
+    plt.axhline(0, color='gray', linestyle='--', linewidth=1)
+    plt.title('Sentiment Trend Over Time (15m)')
+    plt.xlabel('Time')
+    plt.ylabel('Avg sentiment index (-1..1)')
+    fig.tight_layout()
+    return fig
+
+
+def draw_volumes(counts):
+    fig = plt.figure(figsize=(10,6))
+    for col in ['Negative','Neutral','Positive']:
+        if col in counts.columns:
+            plt.plot(counts['time'], counts[col], label=col)
+    plt.title('Volume by Sentiment (15m)')
+    plt.xlabel('Time')
+    plt.ylabel('Mentions')
+    plt.legend()
+    fig.tight_layout()
+    return fig
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--out-dir', default=FIG_DIR)
+    ap.add_argument('--formats', nargs='+', default=['png'])
+    ap.add_argument('--workers', type=int, default=None)
+    ap.add_argument('--force', action='store_true')
+    ap.add_argument('--show', action='store_true')
+    args = ap.parse_args()
+
+    with metrics.stage('07'):
+        print('Loading the minute rollup of ' + INPUT)
+        with metrics.timer('rollup_load'):
+            # read-only: the rollup stage (python rollup_store.py) refreshes and saves it
+            store = RollupStore.load(source=INPUT)
+        if store.watermark is None:
+            print('Minute rollup is empty; run python rollup_store.py first')
+        with metrics.timer('bins_15m'):
+            bins = bins_15m(store)
+        jobs = [('sentiment_trend_15m', draw_trend, bins[['time', 'avg_sentiment_15m']]),
+                ('sentiment_volume_15m', draw_volumes, bins.drop(columns='avg_sentiment_15m'))]
+        if args.show:
+            show_figures(jobs)
+        else:
+            render_figures(jobs, args.out_dir, args.formats, args.workers, args.force)
+    print('Plotted sentiment trend and volumes.')
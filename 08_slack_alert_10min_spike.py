@@ -1,37 +1,165 @@
-
 # Purpose: Slack alert when last-10-minute negative rate >= 30% AND volume >= 50.
 # Why: Alert ops when negativity spikes with sufficient volume.
+#
+# Usage:
+#   python 08_slack_alert_10min_spike.py                       # one-shot check of the inbound table
+#   python 08_slack_alert_10min_spike.py --follow              # daemon over the live stream buffer
+#   python 08_slack_alert_10min_spike.py --follow --windows 5 10 30 --webhook stub
+#   python 08_slack_alert_10min_spike.py --detector baseline              # per-brand z-scores over history
+#   python 08_slack_alert_10min_spike.py --detector baseline --follow --webhook stub
+#
+# --detector baseline replaces the fixed thresholds with brand_baseline.BrandBaselineDetector:
+# each brand's bucket is scored against its own EWMA and hour-of-week baseline. Its state is
+# kept in --state between runs, so a one-shot run only reads what arrived since the last one.
 
+import argparse
+import asyncio
+import os
 import pandas as pd
 from datetime import datetime, timezone, timedelta
-import requests
-
-INPUT = 'data/twcs_inbound_with_roberta.csv'
-SLACK_WEBHOOK_URL = 'https://hooks.slack.com/services/REPLACE/ME/WEBHOOK'
-
-print('Loading ' + INPUT)
-df = pd.read_csv(INPUT)
-df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce', utc=True)
-
-now_utc = datetime.now(timezone.utc)
-window_start = now_utc - timedelta(minutes=10)
-recent = df[(df['created_at'] >= window_start) & (df['created_at'] <= now_utc)]
-
-total = len(recent)
-neg = (recent['sentiment_roberta'] == 'Negative').sum()
-rate = (neg / total) if total > 0 else 0.0
-print('Checked window ' + str(window_start) + ' to ' + str(now_utc))
-print('Volume: ' + str(total))
-print('Negatives: ' + str(neg))
-print('Negative rate: ' + str(round(rate * 100, 2)) + '%')
-
-if total >= 50 and rate >= 0.30:
-    text = 'PulseGuard Alert: 10-min negative rate ' + str(round(rate * 100, 2)) + '% with volume ' + str(total)
-    payload = {'text': text}
+import storage
+from instrument import metrics
+from brand_baseline import BrandBaselineDetector
+from spike_detector import SpikeDetector, AlertDispatcher, SlackWebhook, StubWebhook, follow, format_alert
+from tail_reader import FileTail
+
+INPUT = storage.INBOUND
+STREAM_BUF = 'outputs/twitter_stream_buffer.csv'
+ALERT_LOG = 'outputs/alerts_log.csv'
+ANOMALIES = 'outputs/brand_anomalies.csv'
+BASELINE_STATE = 'outputs/brand_baseline_state.npz'
+SLACK_WEBHOOK_URL = os.getenv('SLACK_WEBHOOK_URL', 'https://hooks.slack.com/services/REPLACE/ME/WEBHOOK')
+
+
+def run_once():
+    import requests
+
+    now_utc = datetime.now(timezone.utc)
+    window_start = now_utc - timedelta(minutes=10)
+
+    # only the last 10 minutes are decoded: day partitions and row groups outside the window are skipped
+    print('Loading ' + INPUT)
+    with metrics.timer('read_table'):
+        recent = storage.read_table(INPUT, columns=['created_at','sentiment_roberta'], start=window_start, end=now_utc)
+
+    total = len(recent)
+    neg = (recent['sentiment_roberta'] == 'Negative').sum()
+    rate = (neg / total) if total > 0 else 0.0
+    print('Checked window ' + str(window_start) + ' to ' + str(now_utc))
+    print('Volume: ' + str(total))
+    print('Negatives: ' + str(neg))
+    print('Negative rate: ' + str(round(rate * 100, 2)) + '%')
+
+    if total >= 50 and rate >= 0.30:
+        text = 'PulseGuard Alert: 10-min negative rate ' + str(round(rate * 100, 2)) + '% with volume ' + str(total)
+        payload = {'text': text}
+        try:
+            resp = requests.post(SLACK_WEBHOOK_URL, json=payload, timeout=10)
+            print('Slack status: ' + str(resp.status_code))
+        except Exception as e:
+            print('Slack send failed: ' + str(e))
+    else:
+        print('Thresholds not met; no alert sent.')
+
+
+def load_baseline(args):
+    if args.state and os.path.exists(args.state):
+        # the bucket size is part of the learned state; only the threshold can change on resume
+        detector = BrandBaselineDetector.load(args.state, z_threshold=args.z_threshold)
+        print('Resumed baseline state for ' + str(detector.n) + ' brands from ' + args.state)
+        return detector
+    return BrandBaselineDetector(bucket_min=args.bucket_min, z_threshold=args.z_threshold)
+
+
+def save_baseline(detector, args):
+    if args.state:
+        os.makedirs(os.path.dirname(args.state) or '.', exist_ok=True)
+        detector.save(args.state)
+        print('Saved baseline state to ' + args.state)
+
+
+def run_baseline(args):
+    import requests
+
+    detector = load_baseline(args)
+    now_utc = datetime.now(timezone.utc)
+    resume_s = detector.reopen()
+    if resume_s is not None:
+        start = pd.Timestamp(resume_s, unit='s', tz='UTC')   # the open bucket is re-read in full
+    else:
+        start = now_utc - timedelta(days=args.history_days)
+    print('Loading ' + INPUT + ' from ' + str(start))
+    with metrics.timer('read_table'):
+        df = storage.read_table(INPUT, columns=['created_at', 'sentiment_roberta', 'author_id_brand'],
+                                start=start, end=now_utc)
+    metrics.count('rows', len(df))
+    with metrics.timer('baseline'):
+        anomalies = detector.ingest_frame(df) + detector.advance(now_utc.timestamp())
+    print('Brands tracked: ' + str(detector.n) + '; anomalous brand-buckets: ' + str(len(anomalies)))
+
+    os.makedirs(os.path.dirname(ANOMALIES), exist_ok=True)
+    found = detector.frame(anomalies)
+    found.to_csv(ANOMALIES, index=False, mode='a', header=not os.path.exists(ANOMALIES))
+    if len(found):
+        print(found.head(10).to_string(index=False))
+
+    # only the bucket that just closed is alerted on; older ones were covered by earlier runs
+    recent = [a for a in anomalies if a['ts'] > now_utc.timestamp() - detector.bucket_s]
+    for alert in recent:
+        try:
+            resp = requests.post(SLACK_WEBHOOK_URL, json={'text': format_alert(alert)}, timeout=10)
+            print('Slack status: ' + str(resp.status_code) + ' ' + format_alert(alert))
+        except Exception as e:
+            print('Slack send failed: ' + str(e))
+    if not recent:
+        print('No brand above z=' + str(args.z_threshold) + ' in the last bucket; no alert sent.')
+    save_baseline(detector, args)
+
+
+def run_follow(args):
+    os.makedirs(os.path.dirname(ALERT_LOG), exist_ok=True)
+    if args.detector == 'baseline':
+        detector = load_baseline(args)
+    else:
+        detector = SpikeDetector(windows_min=args.windows, min_volume=args.min_volume,
+                                 min_neg_rate=args.min_neg_rate, per_brand=not args.pooled_only)
+    webhook = StubWebhook() if args.webhook == 'stub' else SlackWebhook(args.webhook)
+    dispatcher = AlertDispatcher(webhook, cooldown_s=args.cooldown, log_path=ALERT_LOG)
+    tail = FileTail(args.source, from_end=args.from_end)
+    print('Following ' + args.source + ' (windows ' + str(args.windows) + ' min, tick ' + str(args.tick) + 's)')
     try:
-        resp = requests.post(SLACK_WEBHOOK_URL, json=payload, timeout=10)
-        print('Slack status: ' + str(resp.status_code))
-    except Exception as e:
-        print('Slack send failed: ' + str(e))
-else:
-    print('Thresholds not met; no alert sent.')
+        asyncio.run(follow(tail, detector, dispatcher, tick_s=args.tick, clock=args.clock))
+    except KeyboardInterrupt:
+        print('Stopped; suppressed duplicates: ' + str(dispatcher.suppressed))
+    if args.detector == 'baseline':
+        save_baseline(detector, args)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--follow', action='store_true', help='run as a long-lived detector over --source')
+    ap.add_argument('--source', default=STREAM_BUF)
+    ap.add_argument('--from-end', action='store_true', help='ignore rows already in the file at startup')
+    ap.add_argument('--windows', type=float, nargs='+', default=[10])
+    ap.add_argument('--min-volume', type=int, default=50)
+    ap.add_argument('--min-neg-rate', type=float, default=0.30)
+    ap.add_argument('--pooled-only', action='store_true', help='only evaluate all brands together')
+    ap.add_argument('--tick', type=float, default=1.0)
+    ap.add_argument('--cooldown', type=float, default=900, help='seconds before the same alert may fire again')
+    ap.add_argument('--clock', choices=['wall', 'event'], default='wall')
+    ap.add_argument('--webhook', default=SLACK_WEBHOOK_URL, help="Slack webhook URL, or 'stub' to only log")
+    ap.add_argument('--detector', choices=['rule', 'baseline'], default='rule',
+                    help='fixed rate/volume rule, or per-brand adaptive baselines')
+    ap.add_argument('--z-threshold', type=float, default=4.0, help='baseline: z-score that raises an anomaly')
+    ap.add_argument('--bucket-min', type=float, default=10, help='baseline: scoring bucket in minutes')
+    ap.add_argument('--history-days', type=float, default=28, help='baseline: history read on a cold start')
+    ap.add_argument('--state', default=BASELINE_STATE, help="baseline state file ('' to keep none)")
+    args = ap.parse_args()
+    # with --follow, PULSEGUARD_METRICS_PORT exposes live ingest/evaluate timings
+    with metrics.stage('08'):
+        if args.follow:
+            run_follow(args)
+        elif args.detector == 'baseline':
+            run_baseline(args)
+        else:
+            run_once()
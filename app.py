@@ -3,6 +3,12 @@ import numpy as np
 import time
 from datetime import datetime, timedelta, timezone
 import streamlit as st
+import storage
+from rollup_store import RollupStore, ROLLUP
+from dashboard_index import FrameIndex
+from incidents import INCIDENTS, IncidentIndex, collapse_duplicates
+from instrument import metrics
+from score_client import connect
 
 # -----------------------------
 # Config
@@ -11,41 +17,78 @@ st.set_page_config(page_title="PulseGuard Lite", layout="wide")
 SOURCE_INBOUND = "twcs_inbound_with_roberta.csv"     # uses RoBERTa labels
 SOURCE_ALERTS  = "twcs_alerts_roberta.csv"           # alerts built on RoBERTa
 REFRESH_SECONDS = 30                                  # auto refresh interval
+metrics.serve_from_env()                              # PULSEGUARD_METRICS_PORT: helper timings for Prometheus
 
 # -----------------------------
 # Helpers
 # -----------------------------
-@st.cache_data(ttl=REFRESH_SECONDS, show_spinner=False)
-def load_data(inbound_path, alerts_path):
-    df = pd.read_csv(inbound_path)
-    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce", utc=True)
-    alerts = pd.read_csv(alerts_path)
-    if "created_at" in alerts.columns:
-        alerts["created_at"] = pd.to_datetime(alerts["created_at"], errors="coerce", utc=True)
-    return df, alerts
-
-def slice_window(df, minutes=15):
+@st.cache_resource(show_spinner=False)
+def table_feed(path):
+    # one reader of appended rows per table and process, polled at most every REFRESH_SECONDS.
+    # Parquet decodes only the newest day partitions; the CSV fallback parses only bytes appended
+    # since the last poll, except on the first poll (and after a rewrite), which parses the file
+    return storage.TableTail(path, min_interval_s=REFRESH_SECONDS)
+
+@st.cache_resource(show_spinner=False)
+def frame_index(path):
+    # time-sorted rows + brand index shared by reruns; new rows are appended, never rebuilt
+    return FrameIndex()
+
+@metrics.timed("slice_window")
+def slice_window(index, minutes=15, brand_filter=""):
+    # binary search on the sorted timestamps (and per-brand positions) instead of full-column masks
     now_utc = datetime.now(timezone.utc)
     start = now_utc - timedelta(minutes=minutes)
-    return df[(df["created_at"] >= start) & (df["created_at"] <= now_utc)], start, now_utc
-
-def compute_kpis(df_recent):
-    total = len(df_recent)
-    neg = (df_recent["sentiment_roberta"] == "Negative").sum()
-    rate = (neg / total) if total > 0 else 0.0
-    return total, neg, rate
-
-def rolling_sentiment(df, window="15T"):
-    ts = df.set_index("created_at").sort_index()
-    senti_map = {"Positive": 1, "Neutral": 0, "Negative": -1}
-    ts["senti_val"] = ts["sentiment_roberta"].map(senti_map).fillna(0)
-    vol = ts["senti_val"].resample(window).count().rename("mentions")
-    neg = (ts["sentiment_roberta"] == "Negative").resample(window).sum().rename("negatives")
-    pos = (ts["sentiment_roberta"] == "Positive").resample(window).sum().rename("positives")
-    rate = (neg / vol.replace(0, np.nan)).rename("neg_rate")
-    idx = ts["senti_val"].rolling("1H").mean().resample(window).last().rename("rolling_sentiment_1h")
-    out = pd.concat([vol, neg, pos, rate, idx], axis=1).dropna(how="all")
-    return out.reset_index()
+    return index.select(brand_filter, start, now_utc), start, now_utc
+
+@st.cache_resource(show_spinner=False)
+def rollup_store(inbound_path):
+    # one store per process, shared across sessions; only rows past its watermark are folded in
+    return RollupStore.load(ROLLUP, source=inbound_path)
+
+@metrics.timed("refresh_inbound")
+def refresh_inbound(inbound_path):
+    # one poll of the shared feed hands the same new rows to everything built from the inbound table
+    index, store, incidents = frame_index(inbound_path), rollup_store(inbound_path), incident_index(inbound_path)
+    new = table_feed(inbound_path).read()   # None until the poll interval has passed
+    if new is not None and len(new):
+        with metrics.timer("index_append"):
+            index.append(new)
+        with metrics.timer("rollup_ingest"):
+            store.ingest(new)
+        with metrics.timer("incident_ingest"):
+            incidents.ingest(new[new["sentiment_roberta"] == "Negative"])
+    return index, store, incidents
+
+@metrics.timed("refresh_alerts")
+def refresh_alerts(alerts_path):
+    index = frame_index(alerts_path)
+    new = table_feed(alerts_path).read()
+    if new is not None:
+        index.append(new)
+    return index
+
+@metrics.timed("rolling_sentiment")
+def rolling_sentiment(store, start=None, end=None, window_min=15, brands=None):
+    # 15m mentions/negatives/positives/neg_rate and 1h rolling index from minute buckets;
+    # cost depends on the visible range, not on total history
+    return store.trend(start, end, freq_min=window_min, rolling_min=60, brands=brands)
+
+@st.cache_resource(show_spinner=False)
+def incident_index(inbound_path):
+    # near-duplicate negative mentions grouped into incidents; reruns only cluster new mentions
+    return IncidentIndex.load(INCIDENTS, source=inbound_path)
+
+@st.cache_resource(ttl=60, show_spinner=False)
+def score_client():
+    # warm score_server.py at $SCORE_SERVER; None if unset or down (retried after the ttl)
+    return connect(timeout=30)
+
+def matching_brands(store, brand_filter):
+    if brand_filter.strip() == "":
+        return None
+    needle = brand_filter.lower()
+    return [b for b in store.brands if needle in b.lower()]
 
 # -----------------------------
 # UI
@@ -61,6 +104,9 @@ with st.sidebar:
     st.header("Controls")
     minutes = st.slider("Window (minutes)", 5, 120, 15, step=5)
     brand_filter = st.text_input("Filter brand (contains)", value="")
+    collapse = st.checkbox("Collapse near-duplicate mentions", value=True)
+    trend_hours = st.selectbox("Trend range", [6, 24, 24 * 7, 24 * 30, None], index=4,
+                               format_func=lambda h: "All history" if h is None else (f"{h}h" if h < 48 else f"{h // 24}d"))
     st.markdown(f"Auto-refresh every {REFRESH_SECONDS}s")
     st.divider()
     st.markdown("Files expected:")
@@ -71,15 +117,12 @@ with st.sidebar:
     st.markdown("- Documentation: https://foganalytics.org/docs")
     st.markdown("- Support: support@foganalytics.org")
 
-inbound, alerts = load_data(SOURCE_INBOUND, SOURCE_ALERTS)
-if brand_filter.strip() != "":
-    mask = inbound["author_id_brand"].fillna("").str.contains(brand_filter, case=False, na=False)
-    inbound = inbound[mask]
-    if "author_id_brand" in alerts.columns:
-        alerts = alerts[alerts["author_id_brand"].fillna("").str.contains(brand_filter, case=False, na=False)]
+inbound_ix, store, incidents = refresh_inbound(SOURCE_INBOUND)
+alerts_ix = refresh_alerts(SOURCE_ALERTS)
+brands = matching_brands(store, brand_filter)
 
-recent, start, now_utc = slice_window(inbound, minutes=minutes)
-total, neg, rate = compute_kpis(recent)
+recent, start, now_utc = slice_window(inbound_ix, minutes=minutes, brand_filter=brand_filter)
+total, neg, rate, _ = store.kpis(start, now_utc, brands)
 
 col1, col2, col3, col4 = st.columns(4)
 col1.metric(f"Mentions (last {minutes}m)", value=total)
@@ -88,7 +131,8 @@ col3.metric(f"Negatives (last {minutes}m)", value=neg)
 latest_ts = recent["created_at"].max()
 col4.metric("Last event time (UTC)", value=str(latest_ts) if pd.notna(latest_ts) else "n/a")
 
-ts = rolling_sentiment(inbound, window="15T")
+trend_start = None if trend_hours is None else now_utc - timedelta(hours=trend_hours)
+ts = rolling_sentiment(store, trend_start, now_utc, window_min=15, brands=brands)
 
 with st.container():
     st.subheader("Trend: Mentions and Negative Rate")
@@ -104,20 +148,45 @@ with st.container():
 
 with st.container():
     st.subheader("Last Alerts")
-    if not alerts.empty:
-        last_alerts = alerts.sort_values("created_at", ascending=False).head(50)
-        show_cols = [c for c in ["created_at","author_id_brand","tweet_id","sentiment_roberta","confidence_roberta","response_time_min","sla_threshold_min","text_clean2"] if c in last_alerts.columns]
+    alert_rows = alerts_ix.rows(brand_filter)
+    if len(alert_rows) > 0:
+        last_alerts = alerts_ix.tail(alert_rows, 50)
+        show_cols = [c for c in ["created_at","author_id_brand","tweet_id","sentiment_roberta","confidence_roberta","response_time_min","sla_threshold_min","incident_size","text_clean2"] if c in last_alerts.columns]
         st.dataframe(last_alerts[show_cols], use_container_width=True, height=400)
     else:
         st.info("No alerts available yet.")
 
+with st.container():
+    st.subheader(f"Incidents (last {minutes}m)")
+    top_incidents = incidents.incidents(start, now_utc, brands, min_size=2, k=20)
+    if len(top_incidents) > 0:
+        st.dataframe(top_incidents[["mentions","total_mentions","author_id_brand","first_seen","last_seen","text_clean2"]],
+                     use_container_width=True, height=300)
+    else:
+        st.info("No repeated complaints in selected window.")
+
 with st.container():
     st.subheader("Recent Mentions (sample)")
     if not recent.empty:
-        sample = recent.sort_values("created_at", ascending=False).head(50)
-        show_cols = [c for c in ["created_at","author_id_brand","tweet_id","sentiment_roberta","confidence_roberta","text_clean2"] if c in sample.columns]
+        sample = recent
+        if collapse and "tweet_id" in recent.columns:
+            # one row per incident (its newest mention) with how many similar mentions it stands for
+            sample = collapse_duplicates(recent, incidents.incident_ids(recent["tweet_id"]))
+        sample = sample.sort_values("created_at", ascending=False).head(50)
+        show_cols = [c for c in ["created_at","author_id_brand","tweet_id","sentiment_roberta","confidence_roberta","similar","text_clean2"] if c in sample.columns]
         st.dataframe(sample[show_cols], use_container_width=True, height=400)
     else:
         st.info("No recent mentions in selected window.")
 
+client = score_client()
+if client is not None:
+    with st.expander("Score a message"):
+        text = st.text_input("Text", value="")
+        if text.strip():
+            try:
+                label, conf, pos_minus_neg = (x[0] for x in client.score([text]))
+                st.write(f"**{label}** (confidence {conf:.2f}, pos-neg {pos_minus_neg:+.2f}) via {client.model_name}")
+            except (OSError, RuntimeError) as e:
+                st.warning(f"Scoring failed: {e}")
+
 st.caption(f"Live view. Refreshes every {REFRESH_SECONDS} seconds.")
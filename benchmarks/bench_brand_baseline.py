@@ -0,0 +1,100 @@
+# Purpose: Per-tick cost of BrandBaselineDetector.step() from 10 to 10,000 brands.
+# Why: The detector scores every brand in one vectorized step per time bucket. The tick cost is
+#      sub-linear in brands: fixed NumPy call overhead dominates up to a few hundred brands, then
+#      each array op's pass over every brand (~0.1 us each) takes over. A per-brand Python loop
+#      over the same math (--reference) shows what the vectorized step saves.
+#
+# Usage: python benchmarks/bench_brand_baseline.py [--brands 10 100 1000 10000] [--ticks 2000] [--reference]
+
+import argparse
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from brand_baseline import BrandBaselineDetector  # noqa: E402
+
+
+def workload(n_brands, ticks, seed=0):
+    rng = np.random.default_rng(seed)
+    rates = 200.0 / np.arange(1, n_brands + 1)   # Zipf-like mean mentions per bucket
+    vol = rng.poisson(rates, size=(ticks, n_brands))
+    neg = rng.binomial(vol, rng.uniform(0.1, 0.4, size=n_brands))
+    return vol, neg
+
+
+def bench_vectorized(n_brands, ticks, warm_ticks=200):
+    det = BrandBaselineDetector(capacity=n_brands, warmup=warm_ticks // 2)
+    det.brand_ids([f'Brand{i}Support' for i in range(n_brands)])
+    vol, neg = workload(n_brands, warm_ticks + ticks)
+    for t in range(warm_ticks):
+        det.step(vol[t], neg[t], t)
+    hits = 0
+    t0 = time.perf_counter()
+    for t in range(warm_ticks, warm_ticks + ticks):
+        hits += len(det.step(vol[t], neg[t], t))
+    return (time.perf_counter() - t0) / ticks, hits
+
+
+def bench_reference(n_brands, ticks, alpha=0.02, z_threshold=4.0):
+    # the obvious per-brand loop: non-seasonal EWMA level/variance and EW negative rate only
+    state = [[0.0, 0.0, 0.0, 0.0, 0] for _ in range(n_brands)]
+    vol, neg = workload(n_brands, ticks)
+    vol, neg = vol.tolist(), neg.tolist()
+    hits = 0
+    t0 = time.perf_counter()
+    for t in range(ticks):
+        for i in range(n_brands):
+            s, v, k = state[i], vol[t][i], neg[t][i]
+            level, var_v, ew_vol, ew_neg, seen = s
+            z_v = (v - level) / math.sqrt(var_v + level + 1e-9)
+            p = min(max(ew_neg / ew_vol, 0.01), 0.99) if ew_vol > 0 else 0.3
+            z_n = (k - v * p) / math.sqrt(v * p * (1 - p) + 1e-9) if v else 0.0
+            hits += seen >= 36 and (z_v >= z_threshold or z_n >= z_threshold)
+            a = max(alpha, 1.0 / (seen + 1))
+            r = v - level
+            s[0] = level + a * r
+            s[1] = (1 - a) * (var_v + a * r * r)
+            s[2] = (1 - a) * ew_vol + a * v
+            s[3] = (1 - a) * ew_neg + a * k
+            s[4] = seen + 1
+    return (time.perf_counter() - t0) / ticks, hits
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--brands', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    ap.add_argument('--ticks', type=int, default=2000)
+    ap.add_argument('--reference', action='store_true', help='also time a per-brand Python loop (slow at 10k)')
+    ap.add_argument('--json', default=None, help='write results here')
+    args = ap.parse_args()
+
+    results = []
+    for n in args.brands:
+        per_tick, hits = bench_vectorized(n, args.ticks)
+        res = {'brands': n, 'ticks': args.ticks, 'us_per_tick': round(per_tick * 1e6, 1),
+               'ns_per_brand': round(per_tick * 1e9 / n, 1), 'anomalies': hits}
+        line = (f"[baseline] brands={n:>6,}  step={res['us_per_tick']:>9,.1f} us/tick  "
+                f"({res['ns_per_brand']:>8,.1f} ns/brand)  anomalies={hits}")
+        if args.reference:
+            ref, _ = bench_reference(n, max(20, args.ticks // max(1, n // 100)))
+            res['reference_us_per_tick'] = round(ref * 1e6, 1)
+            line += f"  loop={ref * 1e6:>11,.1f} us/tick  x{ref / per_tick:,.0f}"
+        print(line)
+        results.append(res)
+
+    lo, hi = results[0], results[-1]
+    growth = hi['us_per_tick'] / max(lo['us_per_tick'], 1e-9)
+    print(f"[baseline] {hi['brands'] // lo['brands']:,}x the brands -> {growth:.1f}x the per-tick cost")
+    if args.json:
+        Path(args.json).write_text(json.dumps({'results': results, 'growth': round(growth, 2)}, indent=2))
+        print(f"[baseline] wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
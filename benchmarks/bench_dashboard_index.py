@@ -0,0 +1,78 @@
+# Purpose: Microbenchmark dashboard rerun latency: full-column filtering vs the FrameIndex.
+# Why: Show that brand filtering + window slicing stays interactive at 1M and 10M rows.
+#
+# Usage: python benchmarks/bench_dashboard_index.py [--rows 1000000 10000000] [--brands 500]
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from dashboard_index import FrameIndex  # noqa: E402
+
+
+def synthetic(rows, n_brands, seed=0):
+    rng = np.random.default_rng(seed)
+    names = np.array([f'Brand{i}Support' for i in range(n_brands)], dtype=object)
+    weights = 1.0 / np.arange(1, n_brands + 1)   # Zipf-like: a few brands dominate volume
+    brand = pd.Categorical.from_codes(rng.choice(n_brands, size=rows, p=weights / weights.sum()), categories=names)
+    start = pd.Timestamp('2024-01-01', tz='UTC').value
+    ts = np.sort(rng.integers(start, start + 30 * 86_400 * 10**9, size=rows))
+    return pd.DataFrame({
+        'created_at': pd.to_datetime(ts, utc=True),
+        'author_id_brand': brand,
+        'sentiment_roberta': pd.Categorical.from_codes(rng.integers(0, 3, size=rows),
+                                                       categories=['Negative', 'Neutral', 'Positive']),
+    })
+
+
+def old_rerun(df, brand_filter, start, end):
+    # the pre-index app.py path
+    mask = df['author_id_brand'].astype(object).fillna('').str.contains(brand_filter, case=False, na=False)
+    sub = df[mask]
+    return sub[(sub['created_at'] >= start) & (sub['created_at'] <= end)]
+
+
+def best_of(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    ap.add_argument('--brands', type=int, default=500)
+    args = ap.parse_args()
+
+    for rows in args.rows:
+        df = synthetic(rows, args.brands)
+        end = df['created_at'].iloc[-1]
+        start = end - pd.Timedelta(minutes=15)
+        t0 = time.perf_counter()
+        ix = FrameIndex(df)
+        build = time.perf_counter() - t0
+        grown = FrameIndex(df.iloc[:-10_000])
+        t0 = time.perf_counter()
+        grown.append(df.iloc[-10_000:])
+        append = time.perf_counter() - t0
+        print(f"[{rows:,} rows] index build {build:.2f}s (once per process), "
+              f"append of 10,000 new rows {append * 1000:.1f} ms (each refresh)")
+        for needle in ['brand1support', 'brand42', 'support']:
+            old_s, old = best_of(lambda: old_rerun(df, needle, start, end), repeat=1 if rows > 2_000_000 else 3)
+            new_s, new = best_of(lambda: ix.select(needle, start, end))
+            assert len(old) == len(new)
+            print(f"  filter={needle!r:<16} matches={len(new):>7,}  old={old_s * 1000:9.1f} ms  "
+                  f"indexed={new_s * 1000:7.2f} ms  speedup={old_s / max(new_s, 1e-9):8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
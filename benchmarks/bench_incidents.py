@@ -0,0 +1,110 @@
+# Purpose: Insert rate and memory of incidents.IncidentIndex at 1M negative mentions.
+# Why: Incident clustering runs on every refresh, so assignment must stay fast as history grows
+#      (LSH lookups, not comparisons against every earlier mention) and the index must not grow
+#      with all-time history; this feeds seeded synthetic negatives in blocks and reports both.
+#
+# Usage: python benchmarks/bench_incidents.py [--mentions 1000000] [--block 100000] [--unique-share 0.3]
+#   --unique-share replaces that share of texts with one-off word salad, so most of them start
+#   their own incident (the index's worst case).
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / 'benchmarks'))
+from incidents import IncidentIndex  # noqa: E402
+from synth_twcs import generate  # noqa: E402
+
+
+def negatives(n, days, unique_share, seed=0):
+    # ~36% of synthetic mentions are negative; generate enough and keep the first n
+    df = generate(int(n / 0.33), days=days, seed=seed)
+    neg = df[df['sentiment_roberta'] == 'Negative'].head(n).reset_index(drop=True)
+    if unique_share > 0:
+        rng = np.random.default_rng(seed + 1)
+        rows = np.flatnonzero(rng.random(len(neg)) < unique_share)
+        vocab = np.array([f'w{i}' for i in range(20_000)], dtype=object)
+        words = vocab[rng.integers(0, len(vocab), size=(len(rows), 8))]
+        salad = pd.Series([' '.join(w) for w in words], dtype=object)
+        brand = neg['author_id_brand'].astype(object).iloc[rows].str.lower().to_numpy()
+        neg.loc[rows, 'text_clean2'] = '@' + brand + ' ' + salad.to_numpy()
+    return neg
+
+
+def traced(neg, args):
+    # a second, untimed pass under tracemalloc: what the index keeps, and the peak while ingesting
+    tracemalloc.start()
+    index = IncidentIndex(ttl_hours=args.ttl_hours)
+    for lo in range(0, len(neg), args.block):
+        index.ingest(neg.iloc[lo:lo + args.block])
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return retained / 2**20, peak / 2**20
+
+
+def index_mb(index):
+    n = index.n
+    arrays = index.sig[:n].nbytes + sum(getattr(index, k)[:n].nbytes for k in ('size', 'first_ns', 'last_ns', 'indexed'))
+    members = sum(a.nbytes for part in index.members for a in part)
+    buckets = len(index.buckets) * 100   # dict slot + two Python ints, roughly
+    texts = sum(len(t) + 49 for t in index.text)
+    return {'signatures_and_stats': arrays / 2**20, 'members': members / 2**20,
+            'lsh_buckets': buckets / 2**20, 'texts': texts / 2**20}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--mentions', type=int, default=1_000_000)
+    ap.add_argument('--block', type=int, default=100_000, help='mentions per timed ingest call')
+    ap.add_argument('--days', type=int, default=30)
+    ap.add_argument('--unique-share', type=float, default=0.0)
+    ap.add_argument('--ttl-hours', type=float, default=48)
+    ap.add_argument('--json', default=None, help='write results here')
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    neg = negatives(args.mentions, args.days, args.unique_share)
+    print(f"[incidents] {len(neg):,} negative mentions over {args.days} days in {time.perf_counter() - t0:.1f}s")
+
+    index = IncidentIndex(ttl_hours=args.ttl_hours)
+    blocks = []
+    total = 0.0
+    for lo in range(0, len(neg), args.block):
+        part = neg.iloc[lo:lo + args.block]
+        t0 = time.perf_counter()
+        index.ingest(part)
+        dt = time.perf_counter() - t0
+        total += dt
+        blocks.append({'mentions_seen': lo + len(part), 'per_s': round(len(part) / dt), 'incidents': index.n,
+                       'indexed': int(index.indexed[:index.n].sum()), 'buckets': len(index.buckets)})
+        b = blocks[-1]
+        print(f"[incidents] {b['mentions_seen']:>10,} seen  {b['per_s']:>9,}/s  incidents={b['incidents']:>9,}  "
+              f"live={b['indexed']:>8,}  buckets={b['buckets']:>9,}")
+
+    retained, peak = traced(neg, args)
+    clustered = int(index.size[:index.n][index.size[:index.n] >= 2].sum())
+    res = {'mentions': len(neg), 'seconds': round(total, 3), 'per_s': round(len(neg) / total),
+           'incidents': index.n, 'mentions_in_multi_incidents': clustered,
+           'retained_mb': round(retained, 1), 'peak_alloc_mb': round(peak, 1),
+           'index_mb': {k: round(v, 1) for k, v in index_mb(index).items()},
+           'first_block_per_s': blocks[0]['per_s'], 'last_block_per_s': blocks[-1]['per_s'], 'blocks': blocks}
+    print(f"[incidents] {res['mentions']:,} mentions in {res['seconds']:.2f}s ({res['per_s']:,}/s); "
+          f"{res['incidents']:,} incidents, {clustered / len(neg):.1%} of mentions share one")
+    print(f"[incidents] insert rate first block {res['first_block_per_s']:,}/s -> last block {res['last_block_per_s']:,}/s")
+    print(f"[incidents] retained {res['retained_mb']:,.1f} MB, peak {res['peak_alloc_mb']:,.1f} MB while ingesting; "
+          + ', '.join(f"{k}={v:,.1f} MB" for k, v in res['index_mb'].items()))
+    if args.json:
+        Path(args.json).write_text(json.dumps(res, indent=2))
+        print(f"[incidents] wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Purpose: Compare load time and memory of the Parquet storage layer against the CSV path.
+# Why: Justify moving stage hand-offs from CSV to typed, day-partitioned Parquet.
+#
+# Usage: python benchmarks/bench_storage.py [--rows 1000000]
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+import storage  # noqa: E402
+
+
+def tile_sample(rows, seed=0):
+    # Repeat the sample CSV and spread it over ~30 days so partitions and time filters matter
+    base = pd.read_csv(BASE_DIR / 'twcs_inbound_with_roberta.csv')
+    reps = int(np.ceil(rows / len(base)))
+    df = pd.concat([base] * reps, ignore_index=True).iloc[:rows]
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2017-10-01', tz='UTC')
+    offsets = np.sort(rng.integers(0, 30 * 24 * 3600, size=rows))
+    df['created_at'] = (start + pd.to_timedelta(offsets, unit='s')).astype(str)
+    df['tweet_id'] = np.arange(rows)
+    return df
+
+
+def timed(label, fn):
+    t0 = time.perf_counter()
+    df = fn()
+    secs = time.perf_counter() - t0
+    mb = df.memory_usage(deep=True).sum() / 1e6
+    print(f"{label:<44} {secs:8.3f}s  {mb:9.1f} MB  rows={len(df):,}")
+    return secs
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, default=1_000_000)
+    args = ap.parse_args()
+    if not storage.HAVE_ARROW:
+        sys.exit('pyarrow is required for this benchmark')
+
+    tmp = Path(tempfile.mkdtemp(prefix='pg_storage_'))
+    try:
+        stem = tmp / 'inbound'
+        df = tile_sample(args.rows)
+        df.to_csv(storage.csv_path(stem), index=False)
+        storage.write_table(df, stem, csv=False)
+        del df
+        last_day = pd.Timestamp('2017-10-30', tz='UTC')
+
+        def csv_full():
+            d = pd.read_csv(storage.csv_path(stem))
+            d['created_at'] = pd.to_datetime(d['created_at'], errors='coerce', utc=True)
+            return d
+
+        def csv_window():
+            d = csv_full()
+            return d[d['created_at'] >= last_day][['created_at', 'sentiment_roberta']]
+
+        print(f"[bench] rows={args.rows:,}")
+        a = timed('csv: full table + parse created_at', csv_full)
+        b = timed('parquet: full table', lambda: storage.read_table(stem))
+        c = timed('csv: 2 columns, last day', csv_window)
+        d = timed('parquet: 2 columns, last day (pushdown)',
+                  lambda: storage.read_table(stem, columns=['created_at', 'sentiment_roberta'], start=last_day))
+        print(f"[result] full load speedup={a / b:.1f}x  windowed load speedup={c / d:.1f}x")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Purpose: Check the ONNX Runtime RoBERTa backend against the PyTorch path on the sample CSV.
+# Why: Stage 02 prefers ONNX when it loads; its labels and scores must match what PyTorch
+#      produced, and it should be faster, before cached scores from it are trusted.
+#
+# Usage: python benchmarks/check_onnx_parity.py [--repeat 20] [--threads 4] [--inter-threads 1] [--quantize]
+#
+# fp32 must agree on every label and within --max-diff on score_pos_minus_neg; int8 (--quantize)
+# is held to --min-agreement instead, since quantization moves borderline rows.
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from onnx_engine import ONNX_DIR, OnnxRobertaScorer  # noqa: E402
+from roberta_engine import RobertaScorer  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--input', default=str(BASE_DIR / 'twcs_inbound_with_roberta.csv'))
+    ap.add_argument('--repeat', type=int, default=20, help='tile the sample this many times for timing')
+    ap.add_argument('--threads', type=int, default=None, help='torch threads / ORT intra-op threads')
+    ap.add_argument('--inter-threads', type=int, default=None)
+    ap.add_argument('--onnx-dir', default=ONNX_DIR)
+    ap.add_argument('--quantize', action='store_true', help='check the int8 ONNX model instead of fp32')
+    ap.add_argument('--max-diff', type=float, default=1e-3)
+    ap.add_argument('--min-agreement', type=float, default=0.95)
+    args = ap.parse_args()
+
+    texts = pd.read_csv(args.input)['text_clean2'].fillna('').astype(str).tolist()
+    ref = RobertaScorer(num_threads=args.threads)
+    onnx = OnnxRobertaScorer(onnx_dir=args.onnx_dir, intra_op_threads=args.threads,
+                             inter_op_threads=args.inter_threads, quantize=args.quantize)
+    print(f"[check] rows={len(texts)}  torch={ref.model_version}  onnx={onnx.model_version}")
+
+    ref_labels, ref_conf, ref_pmn = ref.score(texts)
+    labels, conf, pmn = onnx.score(texts)
+    agree = float(np.mean(ref_labels == labels)) if len(texts) else 1.0
+    max_diff = float(np.max(np.abs(ref_pmn - pmn))) if len(texts) else 0.0
+    conf_diff = float(np.max(np.abs(ref_conf - conf))) if len(texts) else 0.0
+    if args.quantize:
+        ok = agree >= args.min_agreement
+    else:
+        ok = agree == 1.0 and max_diff <= args.max_diff
+    print(f"[{'ok' if ok else 'FAIL'}] label agreement={agree:.2%}  max |score diff|={max_diff:.2e}  "
+          f"max |confidence diff|={conf_diff:.2e}")
+
+    tiled = texts * args.repeat
+    ref.score(tiled)
+    print(ref.report())
+    onnx.score(tiled)
+    print(onnx.report().replace('[roberta]', '[onnx]   '))
+    print(f"[result] speedup={ref.last_stats['seconds'] / onnx.last_stats['seconds']:.2f}x")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# Purpose: Load test for score_server.py: throughput and tail latency at increasing concurrency.
+# Why: Coalescing only pays off if many small concurrent requests end up in shared batches without
+#      blowing the latency budget; this measures both, plus how many requests each batch served.
+#
+# Usage:
+#   python score_server.py &                                            # or pass --spawn
+#   python benchmarks/load_test_score_server.py --concurrency 1 4 16 64 --duration 20
+#   python benchmarks/load_test_score_server.py --spawn --texts-per-request 1 --json out.json
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from score_client import ScoreClient  # noqa: E402
+from score_server import DEFAULT_PORT  # noqa: E402
+
+
+def wait_for(url, proc, timeout=600):
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        if proc.poll() is not None:
+            sys.exit(f'[load] server exited with code {proc.returncode}')
+        try:
+            return ScoreClient(url)
+        except OSError:
+            time.sleep(0.5)
+    sys.exit(f'[load] server at {url} not up after {timeout}s')
+
+
+def run_level(client, texts, concurrency, duration, per_request):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def worker(seed):
+        rng = np.random.default_rng(seed)
+        mine = []
+        while time.perf_counter() < stop:
+            batch = [texts[i] for i in rng.integers(0, len(texts), size=per_request)]
+            t0 = time.perf_counter()
+            try:
+                client.score(batch)
+                mine.append(time.perf_counter() - t0)
+            except (OSError, RuntimeError):
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(mine)
+
+    before = client.health()['stats']
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    after = client.health()['stats']
+
+    lat = np.array(latencies) * 1000
+    batches = after['batches'] - before['batches']
+    res = {
+        'concurrency': concurrency,
+        'texts_per_request': per_request,
+        'requests': len(lat),
+        'errors': errors[0],
+        'requests_per_s': round(len(lat) / wall, 1),
+        'texts_per_s': round(len(lat) * per_request / wall, 1),
+        'requests_per_batch': round((after['requests'] - before['requests']) / batches, 2) if batches else 0.0,
+    }
+    for q in (50, 95, 99):
+        res[f'p{q}_ms'] = round(float(np.percentile(lat, q)), 2) if len(lat) else None
+    res['max_ms'] = round(float(lat.max()), 2) if len(lat) else None
+    print(f"[load] c={concurrency:<4} {res['requests_per_s']:>9,.1f} req/s {res['texts_per_s']:>10,.1f} texts/s  "
+          f"p50={res['p50_ms']}ms p95={res['p95_ms']}ms p99={res['p99_ms']}ms max={res['max_ms']}ms  "
+          f"req/batch={res['requests_per_batch']}  errors={res['errors']}")
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--url', default=None, help=f'default $SCORE_SERVER or http://127.0.0.1:{DEFAULT_PORT}')
+    ap.add_argument('--spawn', action='store_true', help='start score_server.py for the test and stop it after')
+    ap.add_argument('--input', default=str(BASE_DIR / 'twcs_inbound_with_roberta.csv'))
+    ap.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    ap.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency level')
+    ap.add_argument('--texts-per-request', type=int, default=1)
+    ap.add_argument('--json', default=None, help='write results here')
+    args = ap.parse_args()
+
+    url = args.url or os.getenv('SCORE_SERVER') or f'http://127.0.0.1:{DEFAULT_PORT}'
+    proc = None
+    if args.spawn:
+        port = url.rsplit(':', 1)[-1] if url.startswith('http') else None
+        cmd = [sys.executable, str(BASE_DIR / 'score_server.py')] + (['--port', port] if port else ['--unix', url[5:]])
+        proc = subprocess.Popen(cmd)
+    try:
+        client = wait_for(url, proc) if proc else ScoreClient(url)
+        print(f"[load] {url}: {client.model_name} ({client.backend}, {client.model_version})")
+        texts = pd.read_csv(args.input)['text_clean2'].fillna('').astype(str).tolist()
+        client.score(texts[:8])   # warm-up
+        results = [run_level(client, texts, c, args.duration, args.texts_per_request) for c in args.concurrency]
+        server = client.health()
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+    if args.json:
+        Path(args.json).write_text(json.dumps({'url': url, 'server': server, 'results': results}, indent=2))
+        print(f"[load] wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+# Purpose: Timed, memory-tracked benchmarks of each stage's hot path and the dashboard helpers
+#          on seeded synthetic data, with JSON results that can be diffed across commits.
+# Why: The sample CSVs are ~50 rows; regressions at 1M-50M mentions only show up at scale.
+#
+# Usage:
+#   python benchmarks/run_benchmarks.py --rows 1000000                     # writes benchmarks/results/<commit>-<rows>.json
+#   python benchmarks/run_benchmarks.py --rows 1000000 --only alerts rollup_trend
+#   python benchmarks/run_benchmarks.py --rows 1000000 --compare benchmarks/results/abc1234-1000000.json
+#
+# Each benchmark reports the best wall time over --repeat runs and, from one extra run under
+# tracemalloc, the peak Python/NumPy allocation. --compare exits 1 if any benchmark got slower
+# than --tolerance (default 20%).
+
+import argparse
+import importlib.util
+import json
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / 'benchmarks'))
+import storage  # noqa: E402
+from alert_builder import build_alerts  # noqa: E402
+from brand_baseline import BrandBaselineDetector  # noqa: E402
+from dashboard_index import FrameIndex  # noqa: E402
+from incidents import IncidentIndex  # noqa: E402
+from phrase_counts import PhraseStore  # noqa: E402
+from quantile_sketch import SketchStore, percentile_frame  # noqa: E402
+from rollup_store import RollupStore  # noqa: E402
+from synth_twcs import generate  # noqa: E402
+
+RESULTS_DIR = BASE_DIR / 'benchmarks' / 'results'
+
+
+def _stage(filename, name):
+    # numbered stage scripts are not importable by name; their helpers sit behind __main__ guards
+    spec = importlib.util.spec_from_file_location(name, BASE_DIR / filename)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+class Skip(Exception):
+    pass
+
+
+# ---------- benchmarks: bench_x(df) does the setup and returns run() -> items processed ----------
+# (rows for batch stages, queries for the dashboard helpers)
+
+def bench_clean_text(df):
+    clean_series = _stage('01_clean_and_prepare.py', 'stage01').clean_series
+    raw = df['text_clean2'].str.upper() + ' https://t.co/abc123 🙄'
+    return lambda: len(clean_series(raw))
+
+
+def bench_score_roberta(df, sample=2000):
+    # the configured backend (ROBERTA_BACKEND etc.); torch and onnxruntime are imported lazily
+    try:
+        from onnx_engine import load_scorer
+        scorer = load_scorer()
+    except (ImportError, OSError) as e:
+        raise Skip(str(e))
+    texts = df['text_clean2'].sample(min(sample, len(df)), random_state=0).tolist()
+    return lambda: len(scorer.score(texts)[0])
+
+
+def bench_alerts(df, compact=False):
+    def run():
+        build_alerts(df, compact=compact)
+        return len(df)
+    return run
+
+
+def bench_alerts_compact(df):
+    return bench_alerts(df, compact=True)
+
+
+def bench_weekly_quantiles(df):
+    sub = df[['author_id_brand', 'response_time_min', 'created_at']].copy()
+    sub['week'] = sub['created_at'].dt.tz_localize(None).dt.to_period('W').dt.start_time
+
+    def run():
+        store = SketchStore()
+        store.add(sub, 'week')
+        percentile_frame(store.sketches, ['author_id_brand', 'week'])
+        return len(sub)
+    return run
+
+
+def bench_weekly_quantiles_exact(df):
+    # the pre-sketch stage-04 groupby, as a reference point
+    sub = df[['author_id_brand', 'response_time_min', 'created_at']].dropna().copy()
+    sub['week'] = sub['created_at'].dt.tz_localize(None).dt.to_period('W').dt.start_time
+
+    def run():
+        sub.groupby(['author_id_brand', 'week'], observed=True)['response_time_min'].quantile([0.5, 0.9, 0.95]).unstack()
+        return len(sub)
+    return run
+
+
+def bench_rollup_ingest(df):
+    cols = df[['created_at', 'sentiment_roberta', 'author_id_brand']]
+
+    def run():
+        RollupStore().ingest(cols)
+        return len(cols)
+    return run
+
+
+def bench_rollup_trend(df):
+    # app.rolling_sentiment: 15m bins + 1h rolling index over the last 7 days, all brands
+    store = RollupStore()
+    store.ingest(df[['created_at', 'sentiment_roberta', 'author_id_brand']])
+    end = df['created_at'].iloc[-1]
+
+    def run(queries=20):
+        for _ in range(queries):
+            store.trend(end - pd.Timedelta(days=7), end, 15, 60)
+        return queries
+    return run
+
+
+def bench_kpis(df):
+    store = RollupStore()
+    store.ingest(df[['created_at', 'sentiment_roberta', 'author_id_brand']])
+    end = df['created_at'].iloc[-1]
+    brands = [b for b in store.brands if '0001' in b]
+
+    def run(queries=200):
+        for _ in range(queries):
+            store.kpis(end - pd.Timedelta(minutes=15), end, brands)
+        return queries
+    return run
+
+
+def bench_index_build(df):
+    return lambda: len(FrameIndex(df))
+
+
+def bench_slice_window(df, queries=200):
+    # app.slice_window + alerts tail: 15-minute windows with and without a brand filter
+    ix = FrameIndex(df)
+    ends = df['created_at'].iloc[np.linspace(len(df) // 2, len(df) - 1, queries).astype(int)].tolist()
+    filters = ['', 'brand0001', 'support', 'brand01']
+
+    def run():
+        for i, end in enumerate(ends):
+            rows = ix.rows(filters[i % len(filters)], end - pd.Timedelta(minutes=15), end)
+            ix.tail(rows, 50)
+        return queries
+    return run
+
+
+def bench_phrase_ingest(df):
+    neg = df[df['sentiment_roberta'] == 'Negative'][['created_at', 'text_clean2', 'author_id_brand']]
+
+    def run():
+        PhraseStore().ingest(neg)
+        return len(neg)
+    return run
+
+
+def bench_incidents(df):
+    neg = df[df['sentiment_roberta'] == 'Negative'][['tweet_id', 'created_at', 'text_clean2', 'author_id_brand']]
+
+    def run():
+        IncidentIndex().ingest(neg)
+        return len(neg)
+    return run
+
+
+def bench_brand_baseline(df):
+    # 08 --detector baseline on a cold start: every brand scored per 10-minute bucket over the whole history
+    cols = df[['created_at', 'sentiment_roberta', 'author_id_brand']]
+
+    def run():
+        det = BrandBaselineDetector(bucket_min=10)
+        det.ingest_frame(cols)
+        return len(cols)
+    return run
+
+
+def bench_storage_roundtrip(df):
+    if not storage.HAVE_ARROW:
+        raise Skip('pyarrow not installed')
+    tmp = Path(tempfile.mkdtemp(prefix='pg_bench_'))
+    stem = str(tmp / 'inbound')
+    end = df['created_at'].iloc[-1]
+
+    def run():
+        storage.write_table(df, stem, csv=False)
+        storage.read_table(stem, columns=['created_at', 'sentiment_roberta'], start=end - pd.Timedelta(days=1))
+        return len(df)
+    run.cleanup = lambda: shutil.rmtree(tmp, ignore_errors=True)
+    return run
+
+
+BENCHMARKS = {
+    'clean_text': bench_clean_text,
+    'score_roberta': bench_score_roberta,
+    'alerts': bench_alerts,
+    'alerts_compact': bench_alerts_compact,
+    'weekly_quantiles': bench_weekly_quantiles,
+    'weekly_quantiles_exact': bench_weekly_quantiles_exact,
+    'rollup_ingest': bench_rollup_ingest,
+    'rollup_trend': bench_rollup_trend,
+    'kpis': bench_kpis,
+    'index_build': bench_index_build,
+    'slice_window': bench_slice_window,
+    'phrase_ingest': bench_phrase_ingest,
+    'incidents': bench_incidents,
+    'brand_baseline': bench_brand_baseline,
+    'storage_roundtrip': bench_storage_roundtrip,
+}
+
+
+def measure(name, make, df, repeat):
+    try:
+        run = make(df)
+    except Skip as e:
+        print(f"{name:<24} skipped: {e}")
+        return {'name': name, 'status': 'skipped', 'reason': str(e)}
+    times, items = [], 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        items = run()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    getattr(run, 'cleanup', lambda: None)()
+    best = min(times)
+    res = {'name': name, 'status': 'ok', 'seconds': round(best, 6), 'median_seconds': round(float(np.median(times)), 6),
+           'items': int(items), 'items_per_s': round(items / best, 1) if best > 0 else None,
+           'peak_alloc_mb': round(peak / 1e6, 1)}
+    print(f"{name:<24} {best:9.4f}s  {res['items_per_s'] or 0:>14,.0f} items/s  peak_alloc={res['peak_alloc_mb']:8.1f} MB")
+    return res
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current, baseline_path, tolerance):
+    base = json.loads(Path(baseline_path).read_text())
+    baseline = {r['name']: r for r in base['results'] if r['status'] == 'ok'}
+    worse = []
+    print(f"\nvs {baseline_path} @ {base['commit']} (tolerance {tolerance:.0%})")
+    same = lambda cfg: {k: v for k, v in cfg.items() if k != 'repeat'}
+    if same(base['config']) != same(current['config']):
+        print(f"warning: configs differ ({base['config']} vs {current['config']}); timings are not comparable")
+    for r in current['results']:
+        old = baseline.get(r['name'])
+        if r['status'] != 'ok' or old is None:
+            continue
+        ratio = r['seconds'] / old['seconds'] if old['seconds'] > 0 else float('inf')
+        # ignore sub-millisecond jitter on very fast benchmarks
+        flag = 'REGRESSION' if ratio > 1 + tolerance and r['seconds'] - old['seconds'] > 0.002 else ''
+        if flag:
+            worse.append(r['name'])
+        print(f"{r['name']:<24} {old['seconds']:9.4f}s -> {r['seconds']:9.4f}s  x{ratio:5.2f}  {flag}")
+    return worse
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, default=1_000_000)
+    ap.add_argument('--brands', type=int, default=200)
+    ap.add_argument('--days', type=int, default=30)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), default=None)
+    ap.add_argument('--out', default=None, help='results JSON (default benchmarks/results/<commit>-<rows>.json)')
+    ap.add_argument('--compare', default=None, help='baseline results JSON to diff against')
+    ap.add_argument('--tolerance', type=float, default=0.20)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    df = generate(args.rows, n_brands=args.brands, days=args.days, seed=args.seed)
+    print(f"[synth] {len(df):,} rows, {args.brands} brands, {args.days} days in {time.perf_counter() - t0:.1f}s\n")
+
+    commit = git_commit()
+    results = [measure(name, BENCHMARKS[name], df, args.repeat) for name in (args.only or BENCHMARKS)]
+    payload = {
+        'commit': commit,
+        'timestamp': pd.Timestamp.now(tz='UTC').isoformat(),
+        'config': {'rows': args.rows, 'brands': args.brands, 'days': args.days, 'seed': args.seed, 'repeat': args.repeat},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'pandas': pd.__version__, 'numpy': np.__version__, 'pyarrow': storage.HAVE_ARROW},
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'results': results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f'{commit}-{args.rows}.json'
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(payload, indent=2))
+    print(f"\n[bench] wrote {out}  peak_rss={payload['peak_rss_mb']:,.0f} MB")
+
+    if args.compare and compare(payload, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# Purpose: Seeded generator of synthetic inbound mentions at TWCS scale (1M-50M rows).
+# Why: The ~50-row samples say nothing about how stages behave at production volume; this
+#      produces the stage-02 output schema with Zipf-skewed brands, a daily cycle and
+#      brand-specific negative bursts, deterministically for a given seed.
+#
+# Usage:
+#   python benchmarks/synth_twcs.py --rows 10000000 --out data/twcs_inbound_synth
+#   (writes through storage.write_table in time-ordered chunks, so memory tracks --chunk-rows)
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+import storage  # noqa: E402
+
+COLUMNS = ['tweet_id', 'created_at', 'text_clean2', 'sentiment_roberta', 'response_time_min', 'author_id_brand']
+LABELS = ['Negative', 'Neutral', 'Positive']
+
+OPENERS = {
+    'Negative': ['still waiting on', 'why is', 'so frustrated with', 'third time asking about', 'terrible experience with',
+                 'nobody is helping with', 'really disappointed by', 'cannot believe', 'sick of'],
+    'Neutral': ['quick question about', 'can you check', 'how do i change', 'is there an update on', 'looking for info on',
+                'wondering about', 'dm sent regarding'],
+    'Positive': ['thanks for sorting', 'great help with', 'love the new', 'really appreciate the quick fix for',
+                 'impressed by', 'cheers for helping with'],
+}
+TOPICS = ['my order', 'the refund', 'my account', 'the delivery', 'my bill', 'the app', 'my booking', 'the wifi',
+          'my card', 'the update', 'customer service', 'the train', 'my flight', 'my subscription', 'the store']
+TAILS = ['', '', '', ' please help', ' any news?', ' dm me', ' this is ridiculous', ' thank you', ' asap',
+         ' been on hold for an hour', ' again today']
+INCIDENTS = ['app keeps crashing after the update', 'card payments declined at checkout', 'outage in my area again',
+             'website down cannot log in', 'delivery missed no driver showed up', 'double charged on my statement',
+             'train cancelled no replacement bus', 'flight delayed no information at the gate']
+
+
+def _brands(n_brands, rng, zipf_s=1.1):
+    names = np.array([f'Brand{i:04d}Support' for i in range(n_brands)], dtype=object)
+    w = 1.0 / np.arange(1, n_brands + 1) ** zipf_s
+    w = w / w.sum()
+    neg_rate = rng.beta(4, 7, size=n_brands)                 # per-brand baseline negativity ~0.36
+    rt_mu = np.log(rng.uniform(10, 180, size=n_brands))     # per-brand typical response time
+    return names, w, neg_rate, rt_mu
+
+
+def plan(rows, n_brands=200, days=30, seed=0, burst_share=0.03, n_bursts=None):
+    """Minute-level arrival counts for the base traffic and for each burst (cheap; no rows yet)."""
+    rng = np.random.default_rng(seed)
+    minutes = days * 1440
+    m = np.arange(minutes)
+    diurnal = 1 + 0.8 * np.sin(2 * np.pi * ((m % 1440) / 1440 - 0.3))   # peak mid-afternoon UTC
+    weekly = np.where((m // 1440) % 7 >= 5, 0.8, 1.0)                      # quieter weekends
+    intensity = diurnal * weekly
+    n_burst_rows = int(rows * burst_share)
+    base = rng.multinomial(rows - n_burst_rows, intensity / intensity.sum())
+
+    names, w, neg_rate, rt_mu = _brands(n_brands, rng)
+    n_bursts = n_bursts or max(1, days * 2)
+    bursts = pd.DataFrame({
+        'start': rng.integers(0, minutes - 120, size=n_bursts),
+        'duration': rng.integers(10, 120, size=n_bursts),
+        'brand': rng.choice(n_brands, size=n_bursts, p=w),    # big brands get more incidents
+        'incident': rng.integers(0, len(INCIDENTS), size=n_bursts),
+        'weight': rng.pareto(1.5, size=n_bursts) + 1,
+    })
+    per_burst = rng.multinomial(n_burst_rows, (bursts['weight'] / bursts['weight'].sum()).to_numpy())
+    burst_min = np.zeros((n_bursts, minutes), dtype=np.int64)
+    for b, (start, dur, n) in enumerate(zip(bursts['start'], bursts['duration'], per_burst)):
+        burst_min[b, start:start + dur] = rng.multinomial(n, np.full(dur, 1 / dur))
+    return {'seed': seed, 'days': days, 'base': base, 'burst_min': burst_min, 'bursts': bursts,
+            'brands': (names, w, neg_rate, rt_mu)}
+
+
+def _texts(rng, labels, brand_names, incident):
+    n = len(labels)
+    topic = np.array(TOPICS, dtype=object)[rng.integers(0, len(TOPICS), size=n)]
+    tail = np.array(TAILS, dtype=object)[rng.integers(0, len(TAILS), size=n)]
+    opener = np.empty(n, dtype=object)
+    for lab in LABELS:
+        idx = np.flatnonzero(labels == lab)
+        opts = np.array(OPENERS[lab], dtype=object)
+        opener[idx] = opts[rng.integers(0, len(opts), size=len(idx))]
+    body = opener + ' ' + topic
+    has_inc = incident >= 0
+    body[has_inc] = np.array(INCIDENTS, dtype=object)[incident[has_inc]]
+    return '@' + pd.Series(brand_names).str.lower().to_numpy() + ' ' + body + tail
+
+
+def _rows(p, lo, hi, first_id, rng):
+    names, w, neg_rate, rt_mu = p['brands']
+    base = p['base'][lo:hi]
+    minute = np.repeat(np.arange(lo, hi), base)
+    brand = rng.choice(len(names), size=len(minute), p=w)
+    incident = np.full(len(minute), -1)
+    bm = p['burst_min'][:, lo:hi]
+    if bm.any():
+        b_idx, m_idx = np.nonzero(bm)
+        counts = bm[b_idx, m_idx]
+        b_rows = np.repeat(b_idx, counts)
+        minute = np.concatenate([minute, np.repeat(m_idx + lo, counts)])
+        brand = np.concatenate([brand, p['bursts']['brand'].to_numpy()[b_rows]])
+        incident = np.concatenate([incident, p['bursts']['incident'].to_numpy()[b_rows]])
+    n = len(minute)
+    secs = minute * 60 + rng.integers(0, 60, size=n)
+    order = np.argsort(secs, kind='stable')
+    secs, brand, incident = secs[order], brand[order], incident[order]
+
+    u = rng.random(n)
+    p_neg = np.where(incident >= 0, 0.8, neg_rate[brand])
+    p_pos = (1 - p_neg) * 0.45
+    labels = np.where(u < p_neg, 'Negative', np.where(u < p_neg + p_pos, 'Positive', 'Neutral')).astype(object)
+    rt = np.exp(rt_mu[brand] + rng.normal(0, 1.1, size=n)) * np.where(incident >= 0, 2.5, 1.0)
+    rt[rng.random(n) < 0.2] = np.nan                        # mentions that never got a reply
+
+    start = pd.Timestamp('2017-10-01', tz='UTC')
+    return pd.DataFrame({
+        'tweet_id': np.arange(first_id, first_id + n, dtype=np.int64),
+        'created_at': start + pd.to_timedelta(secs, unit='s'),
+        'text_clean2': _texts(rng, labels, names[brand], incident),
+        'sentiment_roberta': pd.Categorical(labels, categories=LABELS),
+        'response_time_min': rt.astype(np.float32),
+        'author_id_brand': pd.Categorical.from_codes(brand, categories=names),
+    })
+
+
+def iter_chunks(rows, chunk_rows=1_000_000, **kw):
+    """Yield time-ordered DataFrames of roughly `chunk_rows` rows each; same seed and chunk_rows -> same data."""
+    p = plan(rows, **kw)
+    per_min = p['base'] + p['burst_min'].sum(axis=0)
+    edges = np.searchsorted(np.cumsum(per_min), np.arange(chunk_rows, per_min.sum(), chunk_rows), side='left') + 1
+    bounds = [0] + [int(e) for e in edges if 0 < e < len(per_min)] + [len(per_min)]
+    first_id = 0
+    for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+        if hi <= lo:
+            continue
+        rng = np.random.default_rng([p['seed'], i])
+        df = _rows(p, lo, hi, first_id, rng)
+        first_id += len(df)
+        yield df
+
+
+def generate(rows, n_brands=200, days=30, seed=0, **kw):
+    """The whole synthetic table in memory (use iter_chunks for tens of millions of rows)."""
+    chunks = list(iter_chunks(rows, n_brands=n_brands, days=days, seed=seed, **kw))
+    df = pd.concat(chunks, ignore_index=True)
+    for c in ['sentiment_roberta', 'author_id_brand']:
+        df[c] = df[c].astype(chunks[0][c].dtype)
+    return df
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, default=1_000_000)
+    ap.add_argument('--brands', type=int, default=200)
+    ap.add_argument('--days', type=int, default=30)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--chunk-rows', type=int, default=1_000_000)
+    ap.add_argument('--out', default='data/twcs_inbound_synth', help='storage table stem')
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    total = 0
+    for i, chunk in enumerate(iter_chunks(args.rows, args.chunk_rows, n_brands=args.brands, days=args.days, seed=args.seed)):
+        storage.write_table(chunk, args.out, append=i > 0)
+        total += len(chunk)
+        print(f"[synth] chunk {i + 1}: {len(chunk):,} rows  total={total:,}")
+    print(f"[synth] wrote {total:,} rows to {args.out} in {time.perf_counter() - t0:,.1f}s")
@@ -0,0 +1,322 @@
+# Purpose: Per-brand adaptive baselines (EWMA level, hour-of-week seasonality, variance) for
+#          mention volume and negative rate, scored for every brand in one vectorized step.
+# Why: The fixed 08 rule (>=30% negative with >=50 mentions) never fires for small brands and
+#      fires constantly for large ones. Scoring each brand against its own expected volume and
+#      negative rate for that hour of the week gives comparable z-scores across brand sizes; with
+#      state as NumPy arrays indexed by brand id, a time bucket is the same few dozen array ops
+#      whether there are 10 brands or 10,000, with no per-brand Python work. The tick cost is
+#      sub-linear, not flat: a fixed ~0.1 ms of NumPy call overhead plus ~0.1 us per brand,
+#      because every brand's baselines decay each bucket, so each op still touches every brand
+#      (benchmarks/bench_brand_baseline.py: ~9-11x the cost for 1000x the brands).
+#
+# Usage:
+#   det = BrandBaselineDetector(bucket_min=10)
+#   anomalies = det.ingest(ts_s, brands, negative)   # arrays; closes buckets as time moves on
+#   anomalies += det.advance(now_s)                  # close buckets that ended by now_s
+#   # each anomaly: brand, z, kind ('neg_rate' | 'volume'), volume, negatives, expected_*, ...
+# 08_slack_alert_10min_spike.py --detector baseline runs it over the inbound table or live stream.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+HOURS_PER_WEEK = 168
+EPOCH_HOUR_OF_WEEK = 72   # 1970-01-01 was a Thursday; slot 0 is Monday 00:00 UTC
+VAR_MIN_VOLUME = 10        # mentions a bucket needs to teach the negative-rate variance
+PRIOR_MENTIONS = 20        # pseudo-mentions shrinking a rate estimate toward the coarser one
+
+# per-brand state: name -> (initial value, dtype, one row per hour-of-week slot). Brand is always
+# the last axis, so the slot a bucket touches is one contiguous row of every seasonal array.
+STATE_ARRAYS = {
+    'level': (0.0, np.float64, False),        # EWMA of deseasonalized bucket volume
+    'var_v': (0.0, np.float64, False),        # EW variance of the volume residual
+    'ew_vol': (0.0, np.float64, False),       # EW volume and negatives -> baseline negative rate
+    'ew_neg': (0.0, np.float64, False),
+    'var_p': (0.0, np.float64, False),        # EW negative-rate variance beyond binomial noise
+    'seen': (0, np.int64, False),             # buckets observed
+    'season_v': (1.0, np.float32, True),      # hour-of-week volume index (x level)
+    'season_nv': (0.0, np.float32, True),     # hour-of-week EW volume and negatives -> seasonal rate
+    'season_nn': (0.0, np.float32, True),
+    'season_n': (0, np.int32, True),          # updates per slot
+    'cur_vol': (0, np.int64, False),          # counts in the open bucket
+    'cur_neg': (0, np.int64, False),
+}
+
+
+class BrandBaselineDetector:
+    """Vectorized per-brand anomaly detector over fixed time buckets.
+
+    Per brand (row of every state array) it keeps an EWMA level and EW residual variance of
+    bucket volume, an EW negative rate with its excess variance, and hour-of-week seasonal
+    indexes for both. A closed bucket is scored before it updates the state:
+
+      z_volume = (volume - expected) / sqrt(var + expected)                  Poisson floor
+      z_neg    = (negatives - volume*p) / sqrt(volume*p*(1-p) + volume^2*var_p)  binomial floor
+
+    so a handful of negatives on a small brand is not an outlier, but a small brand that is
+    normally quiet and suddenly negative is. Residuals are clipped to `clip` standard
+    deviations before updating, so an incident does not immediately become the new normal.
+    Early on each statistic is a plain running mean (alpha = max(alpha, 1/(n+1))).
+    """
+
+    def __init__(self, bucket_min=10, alpha=0.02, season_alpha=0.1, z_threshold=4.0, min_negatives=5,
+                 min_volume=20, warmup=36, season_warmup=2, clip=3.0, prior_rate=0.3, top_k=None,
+                 capacity=256):
+        self.bucket_min = bucket_min
+        self.bucket_s = int(bucket_min * 60)
+        self.alpha = alpha
+        self.season_alpha = season_alpha
+        self.z_threshold = z_threshold
+        self.min_negatives = min_negatives
+        self.min_volume = min_volume
+        self.warmup = warmup
+        self.season_warmup = season_warmup
+        self.clip = clip
+        self.prior_rate = prior_rate
+        self.top_k = top_k
+        self.max_gap = HOURS_PER_WEEK * 3600 // self.bucket_s   # empty buckets worth replaying
+
+        self.names = []
+        self.ids = {}
+        self.n = 0
+        self.open = None          # id of the bucket still collecting events
+        self.last_event_s = None
+        self.late = 0             # events older than the open bucket (dropped)
+        self._scalar = []         # update() buffer, flushed by evaluate()
+        self._alloc(capacity)
+
+    # ---------- state ----------
+
+    def _alloc(self, capacity):
+        # (re)allocate every state array with room for `capacity` brands, keeping existing ones
+        for name, (fill, dtype, seasonal) in STATE_ARRAYS.items():
+            new = np.full((HOURS_PER_WEEK, capacity) if seasonal else capacity, fill, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                new[..., :old.shape[-1]] = old
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def _id(self, brand):
+        i = self.ids.get(brand)
+        if i is None:
+            i = self.ids[brand] = self.n
+            self.names.append(brand)
+            self.n += 1
+            if self.n > self.capacity:
+                self._alloc(self.capacity * 2)
+        return i
+
+    def brand_ids(self, brands):
+        """Ids for an array of brand names (new brands are registered); -1 for missing."""
+        codes, uniques = pd.factorize(pd.Series(brands), sort=False)
+        if len(uniques) == 0:
+            return np.full(len(codes), -1, dtype=np.int64)
+        lookup = np.array([self._id(b) for b in uniques], dtype=np.int64)
+        return np.where(codes >= 0, lookup[np.maximum(codes, 0)], -1)
+
+    # ---------- scoring ----------
+
+    def _slot(self, bucket):
+        return int((bucket * self.bucket_s // 3600 + EPOCH_HOUR_OF_WEEK) % HOURS_PER_WEEK)
+
+    def step(self, vol, neg, bucket):
+        """Score one closed bucket for every brand, then fold it into the baselines.
+
+        `vol` and `neg` are per-brand counts (length self.n). Returns the anomalies, highest z first.
+        """
+        n = self.n
+        vol = np.asarray(vol, dtype=np.float64)[:n]
+        neg = np.asarray(neg, dtype=np.float64)[:n]
+        h = self._slot(bucket)
+        level, var_v, seen = self.level[:n], self.var_v[:n], self.seen[:n]
+        s_v = self.season_v[h, :n].astype(np.float64)
+        s_nv = self.season_nv[h, :n].astype(np.float64)
+        s_nn = self.season_nn[h, :n].astype(np.float64)
+        s_n = self.season_n[h, :n]
+        seasonal = s_n >= self.season_warmup
+
+        # expectations from the state before this bucket
+        factor = np.where(seasonal, np.maximum(s_v, 0.05), 1.0)
+        exp_v = level * factor
+        sd_v = np.sqrt(var_v + exp_v + 1e-9)
+        z_v = (vol - exp_v) / sd_v
+        # negative rate: brand-wide EW rate shrunk toward prior_rate, then the hour-of-week rate
+        # shrunk toward that, each by PRIOR_MENTIONS (EW sums x effective window = mentions seen)
+        m = np.minimum(seen, 1.0 / self.alpha)
+        p_base = (self.ew_neg[:n] * m + PRIOR_MENTIONS * self.prior_rate) / (self.ew_vol[:n] * m + PRIOR_MENTIONS)
+        sm = np.minimum(s_n, 1.0 / self.season_alpha)
+        p_season = (s_nn * sm + PRIOR_MENTIONS * p_base) / (s_nv * sm + PRIOR_MENTIONS)
+        p = np.clip(np.where(seasonal, p_season, p_base), 0.01, 0.99)
+        binom = p * (1 - p)
+        sd_n = np.sqrt(vol * binom + vol * vol * self.var_p[:n] + 1e-9)
+        z_n = np.where(vol > 0, (neg - vol * p) / sd_n, 0.0)
+
+        warm = seen >= self.warmup
+        hit_n = warm & (z_n >= self.z_threshold) & (neg >= self.min_negatives)
+        hit_v = warm & (z_v >= self.z_threshold) & (vol >= self.min_volume)
+        z = np.maximum(np.where(hit_n, z_n, -np.inf), np.where(hit_v, z_v, -np.inf))
+        hits = np.flatnonzero(hit_n | hit_v)
+        hits = hits[np.argsort(-z[hits], kind='stable')][:self.top_k]
+        end_s = (bucket + 1) * self.bucket_s
+        anomalies = [{
+            'ts': end_s, 'brand': self.names[i], 'window_min': self.bucket_min,
+            'kind': 'neg_rate' if hit_n[i] and (not hit_v[i] or z_n[i] >= z_v[i]) else 'volume',
+            'z': float(z[i]), 'z_neg': float(z_n[i]), 'z_volume': float(z_v[i]),
+            'volume': int(vol[i]), 'negatives': int(neg[i]),
+            'neg_rate': float(neg[i] / vol[i]) if vol[i] else 0.0,
+            'expected_volume': float(exp_v[i]), 'expected_neg_rate': float(p[i]),
+        } for i in hits]
+
+        # update with clipped residuals so outliers only nudge the baselines
+        a = np.maximum(self.alpha, 1.0 / (seen + 1))
+        r_v = np.clip(vol - exp_v, -self.clip * sd_v, self.clip * sd_v)
+        x_v = exp_v + r_v
+        self.level[:n] = level + a * (x_v / factor - level)
+        self.var_v[:n] = (1 - a) * (var_v + a * r_v * r_v)
+        sa = np.maximum(self.season_alpha, 1.0 / (s_n + 1))
+        ratio = np.where(self.level[:n] > 0, x_v / np.maximum(self.level[:n], 1e-9), 1.0)
+        self.season_v[h, :n] = s_v + sa * (ratio - s_v)
+
+        has = vol > 0
+        safe_vol = np.maximum(vol, 1.0)
+        rate = neg / safe_vol
+        band = self.clip * np.sqrt(binom / safe_vol + self.var_p[:n])
+        rate_c = np.where(has, p + np.clip(rate - p, -band, band), p)
+        # rates are volume-weighted with the clipped volume, so a burst's size does not also
+        # let its negative rate dominate the brand's (or the hour's) baseline
+        w = np.where(has, np.maximum(x_v, 1.0), 0.0)
+        self.ew_vol[:n] = (1 - a) * self.ew_vol[:n] + a * w
+        self.ew_neg[:n] = (1 - a) * self.ew_neg[:n] + a * w * rate_c
+        # squared residual minus its binomial part estimates the excess variance; it is only
+        # learned from buckets with some volume, as one- or two-mention buckets are pure noise
+        # (small brands then rely on the binomial term and min_negatives)
+        excess = (rate_c - p) ** 2 - binom / safe_vol
+        learn = vol >= VAR_MIN_VOLUME
+        self.var_p[:n] = np.where(learn, np.maximum(self.var_p[:n] + a * (excess - self.var_p[:n]), 0.0), self.var_p[:n])
+        self.season_nv[h, :n] = s_nv + sa * (w - s_nv)
+        self.season_nn[h, :n] = s_nn + sa * (w * rate_c - s_nn)
+        self.season_n[h, :n] = s_n + 1
+        self.seen[:n] = seen + 1
+        return anomalies
+
+    def _close_through(self, bucket):
+        """Close the open bucket and every empty one before `bucket`; `bucket` becomes open."""
+        out = self.step(self.cur_vol, self.cur_neg, self.open)
+        self.cur_vol[:] = 0
+        self.cur_neg[:] = 0
+        first_empty = max(self.open + 1, bucket - self.max_gap)
+        if first_empty < bucket:
+            zeros = np.zeros(self.n)
+            for b in range(first_empty, bucket):
+                out += self.step(zeros, zeros, b)
+        self.open = bucket
+        return out
+
+    # ---------- ingest ----------
+
+    def ingest(self, ts_s, brands, negative):
+        """Add events (epoch seconds, brand names, negative flags); returns anomalies of closed buckets."""
+        ts = np.asarray(ts_s, dtype=np.float64)
+        ids = self.brand_ids(brands)
+        negative = np.asarray(negative, dtype=bool)
+        keep = (ids >= 0) & ~np.isnan(ts)
+        ts, ids, negative = ts[keep], ids[keep], negative[keep]
+        if len(ts) == 0:
+            return []
+        self.last_event_s = max(self.last_event_s or ts.max(), ts.max())
+        buckets = (ts // self.bucket_s).astype(np.int64)
+        if self.open is None:
+            self.open = int(buckets.min())
+        late = buckets < self.open
+        if late.any():
+            self.late += int(late.sum())
+            buckets, ids, negative = buckets[~late], ids[~late], negative[~late]
+        order = np.argsort(buckets, kind='stable')
+        buckets, ids, negative = buckets[order], ids[order], negative[order]
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)]
+
+        out = []
+        for lo, hi in zip(starts, ends):
+            b = int(buckets[lo])
+            if b > self.open:
+                out += self._close_through(b)
+            self.cur_vol[:self.n] += np.bincount(ids[lo:hi], minlength=self.n)
+            self.cur_neg[:self.n] += np.bincount(ids[lo:hi], weights=negative[lo:hi], minlength=self.n).astype(np.int64)
+        return self._rank(out)
+
+    def ingest_frame(self, df, label_col='sentiment_roberta'):
+        """ingest() for a frame with created_at, author_id_brand and a sentiment label column."""
+        ts = pd.DatetimeIndex(df['created_at']).as_unit('ns').asi8 / 1e9
+        return self.ingest(ts, df['author_id_brand'], (df[label_col] == 'Negative').to_numpy())
+
+    def advance(self, now_s):
+        """Close every bucket that ended at or before `now_s` (quiet periods still count)."""
+        if self.open is None:
+            return []
+        now_bucket = int(now_s // self.bucket_s)
+        return self._rank(self._close_through(now_bucket)) if now_bucket > self.open else []
+
+    def reopen(self):
+        """Drop the open bucket's counts and return its start (epoch s), so a resumed run can re-read it."""
+        self.cur_vol[:] = 0
+        self.cur_neg[:] = 0
+        return None if self.open is None else self.open * self.bucket_s
+
+    def _rank(self, anomalies):
+        return sorted(anomalies, key=lambda a: (-a['ts'], -a['z']))
+
+    # ---------- SpikeDetector-compatible interface for spike_detector.follow ----------
+
+    def update(self, ts_s, brand, negative):
+        if brand:
+            self._scalar.append((ts_s, brand, negative))
+        if self.last_event_s is None or ts_s > self.last_event_s:
+            self.last_event_s = ts_s
+
+    def evaluate(self, now_s):
+        out = []
+        if self._scalar:
+            ts, brands, neg = zip(*self._scalar)
+            self._scalar = []
+            out += self.ingest(ts, brands, neg)
+        return out + self.advance(now_s)
+
+    def frame(self, anomalies):
+        cols = ['ts', 'brand', 'kind', 'z', 'z_neg', 'z_volume', 'volume', 'negatives', 'neg_rate',
+                'expected_volume', 'expected_neg_rate']
+        df = pd.DataFrame(anomalies, columns=cols)
+        df['ts'] = pd.to_datetime(df['ts'], unit='s', utc=True)
+        return df.sort_values('z', ascending=False, kind='stable').reset_index(drop=True)
+
+    # ---------- persistence ----------
+
+    def save(self, path):
+        n = self.n
+        meta = {'names': self.names, 'open': self.open, 'last_event_s': self.last_event_s, 'late': self.late,
+                'params': {k: getattr(self, k) for k in ('bucket_min', 'alpha', 'season_alpha', 'z_threshold',
+                                                         'min_negatives', 'min_volume', 'warmup',
+                                                         'season_warmup', 'clip', 'prior_rate', 'top_k')}}
+        tmp = str(path) + '.tmp.npz'
+        np.savez_compressed(tmp, meta=np.array(json.dumps(meta)),
+                            **{k: getattr(self, k)[..., :n] for k in STATE_ARRAYS})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, **overrides):
+        with np.load(path) as z:
+            meta = json.loads(str(z['meta']))
+            params = dict(meta['params'], **overrides)
+            det = cls(capacity=max(256, len(meta['names'])), **params)
+            for i, name in enumerate(meta['names']):
+                det.ids[name] = i
+            det.names = list(meta['names'])
+            det.n = len(det.names)
+            for k in STATE_ARRAYS:
+                getattr(det, k)[..., :det.n] = z[k]
+        det.open, det.last_event_s, det.late = meta['open'], meta['last_event_s'], meta['late']
+        return det
+
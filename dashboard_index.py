@@ -0,0 +1,174 @@
+# Purpose: In-memory index for brand filtering and time-window slicing in the dashboard.
+# Why: `str.contains` over every row plus two full timestamp comparisons on each rerun stall the UI
+#      at millions of rows; an index grown by appending new rows answers both in O(log n + matches).
+
+import threading
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+
+class BrandSuffixIndex:
+    """Sorted suffixes of every (lowercased) brand name -> brand codes.
+
+    A case-insensitive substring query is a prefix search over the suffixes: two binary
+    searches plus the matching entries, independent of the number of rows.
+    """
+
+    def __init__(self, names):
+        pairs = sorted((name[i:], code) for code, name in enumerate(names) for i in range(len(name)))
+        self.suffixes = [s for s, _ in pairs]
+        self.codes = np.array([c for _, c in pairs], dtype=np.int64)
+        self._cache = {}
+
+    def lookup(self, needle):
+        needle = needle.lower()
+        hit = self._cache.get(needle)
+        if hit is None:
+            lo = bisect_left(self.suffixes, needle)
+            hi = bisect_left(self.suffixes, needle + '\U0010ffff')
+            hit = self._cache[needle] = np.unique(self.codes[lo:hi])
+        return hit
+
+
+def _grow(arr, size):
+    # capacity-doubling append buffer: amortized O(1) per element
+    if size <= len(arr):
+        return arr
+    out = np.empty(max(size + size // 4, 2 * len(arr), 1024), dtype=arr.dtype)
+    out[:len(arr)] = arr
+    return out
+
+
+class FrameIndex:
+    """Time-sorted rows plus per-brand row positions, grown in place as new rows arrive.
+
+    `append()` folds in rows newer than the newest one indexed (a created_at watermark, as in
+    RollupStore) at a cost proportional to the new rows: timestamps and per-brand positions live
+    in capacity-doubling arrays and the rows in size-tiered frame blocks. `rows()` returns
+    positions in time order for a brand substring and/or a [start, end] window; `select()`
+    returns the matching rows. Appends and queries hold a lock, so one index can be shared
+    between Streamlit sessions.
+    """
+
+    def __init__(self, df=None, time_col='created_at', brand_col='author_id_brand'):
+        self.time_col = time_col
+        self.brand_col = brand_col
+        self.lock = threading.RLock()
+        self.n = 0
+        self.ts = np.empty(0, dtype=np.int64)
+        self.blocks, self.starts = [], []
+        self.brand_names, self._brand_codes = [], {}
+        self.brands = BrandSuffixIndex([])
+        self._pos, self._bts, self._blen = [], [], []   # per brand: row positions, their timestamps, fill
+        self.watermark = None
+        if df is not None:
+            self.append(df)
+
+    def __len__(self):
+        return self.n
+
+    def append(self, df):
+        """Index rows of `df` newer than the watermark; returns how many were added."""
+        with self.lock:
+            tc = self.time_col
+            if tc in df.columns:
+                df = df.dropna(subset=[tc])
+                if self.watermark is not None:
+                    df = df[df[tc] > self.watermark]
+                df = df.sort_values(tc, kind='stable')
+            k = len(df)
+            if k == 0:
+                return 0
+            n = self.n
+            df = df.set_axis(pd.RangeIndex(n, n + k))   # labels are positions, as rows() returns
+            self.ts = _grow(self.ts, n + k)
+            self.ts[n:n + k] = pd.DatetimeIndex(df[tc]).as_unit('ns').asi8 if tc in df.columns else 0
+            if self.brand_col in df.columns:
+                self._add_brands(df[self.brand_col], n)
+            self.blocks.append(df)
+            self.starts.append(n)
+            # keep block sizes shrinking geometrically toward the tail: O(log n) blocks to search,
+            # and each row is copied O(log n) times over the life of the index
+            while len(self.blocks) > 1 and len(self.blocks[-2]) <= 2 * len(self.blocks[-1]):
+                last = self.blocks.pop()
+                self.starts.pop()
+                self.blocks[-1] = pd.concat([self.blocks[-1], last])
+            self.n = n + k
+            if tc in df.columns:
+                self.watermark = df[tc].iloc[-1]
+            return k
+
+    def _add_brands(self, brands, n):
+        codes, uniques = pd.factorize(brands.astype(object), use_na_sentinel=True)
+        new_name = False
+        local = np.empty(len(uniques), dtype=np.int64)
+        for i, u in enumerate(uniques):
+            code = self._brand_codes.get(u)
+            if code is None:
+                code = self._brand_codes[u] = len(self.brand_names)
+                self.brand_names.append(str(u).lower())
+                self._pos.append(np.empty(0, dtype=np.int64))
+                self._bts.append(np.empty(0, dtype=np.int64))
+                self._blen.append(0)
+                new_name = True
+            local[i] = code
+        if new_name:
+            self.brands = BrandSuffixIndex(self.brand_names)
+        valid = np.flatnonzero(codes >= 0)
+        order = valid[np.argsort(codes[valid], kind='stable')]   # grouped by brand, time order within
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(codes[valid], minlength=len(uniques)))])
+        for i in np.flatnonzero(np.diff(bounds)):
+            b, rows = local[i], n + order[bounds[i]:bounds[i + 1]]
+            m = self._blen[b]
+            self._pos[b] = _grow(self._pos[b], m + len(rows))
+            self._bts[b] = _grow(self._bts[b], m + len(rows))
+            self._pos[b][m:m + len(rows)] = rows
+            self._bts[b][m:m + len(rows)] = self.ts[rows]
+            self._blen[b] = m + len(rows)
+
+    @staticmethod
+    def _ns(ts):
+        ts = pd.Timestamp(ts)
+        ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts
+        return ts.as_unit('ns').value
+
+    def rows(self, brand_filter='', start=None, end=None):
+        lo_ns = None if start is None else self._ns(start)
+        hi_ns = None if end is None else self._ns(end)
+        with self.lock:
+            if not brand_filter.strip():
+                ts = self.ts[:self.n]
+                lo = 0 if lo_ns is None else np.searchsorted(ts, lo_ns, side='left')
+                hi = len(ts) if hi_ns is None else np.searchsorted(ts, hi_ns, side='right')
+                return np.arange(lo, hi)
+            parts = []
+            for b in self.brands.lookup(brand_filter):
+                seg = self._bts[b][:self._blen[b]]
+                lo = 0 if lo_ns is None else np.searchsorted(seg, lo_ns, side='left')
+                hi = len(seg) if hi_ns is None else np.searchsorted(seg, hi_ns, side='right')
+                parts.append(self._pos[b][lo:hi])
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts)) if len(parts) > 1 else parts[0].copy()
+
+    def _take(self, pos):
+        # rows at ascending positions, gathered from the blocks they fall in
+        with self.lock:
+            blocks, starts = list(self.blocks), np.array(self.starts, dtype=np.int64)
+        if not blocks:
+            return pd.DataFrame(columns=[self.time_col])
+        if len(blocks) == 1:
+            return blocks[0].iloc[pos]
+        which = np.searchsorted(starts, pos, side='right') - 1
+        cut = np.searchsorted(which, np.arange(len(blocks) + 1), side='left')
+        parts = [blocks[i].iloc[pos[cut[i]:cut[i + 1]] - starts[i]] for i in range(len(blocks)) if cut[i] < cut[i + 1]]
+        return pd.concat(parts) if len(parts) > 1 else (parts[0] if parts else blocks[0].iloc[:0])
+
+    def select(self, brand_filter='', start=None, end=None):
+        return self._take(self.rows(brand_filter, start, end))
+
+    def tail(self, rows, k):
+        # newest k of the given positions, newest first
+        return self._take(rows[-k:])[::-1]
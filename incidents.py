@@ -0,0 +1,402 @@
+# Purpose: Incremental near-duplicate clustering of negative mentions into incidents (MinHash + LSH).
+# Why: During an outage thousands of near-identical complaints arrive and alerts / Recent Mentions list
+#      every one of them. Comparing each new mention with all previous ones is quadratic; a MinHash
+#      signature banded into LSH buckets finds the few incidents it could belong to in O(bands), so
+#      each mention joins an existing incident or starts a new one in time independent of history.
+#
+# Usage: python incidents.py          # fold new negative mentions into data/twcs_incidents
+#
+#   index = IncidentIndex.load(INCIDENTS, source=storage.INBOUND)
+#   ids = index.ingest(neg)                       # incident id per mention (-1: no words to compare)
+#   index.incidents(start, end, brands, k=20)     # largest incidents in a window, with a sample text
+
+import functools
+import json
+import threading
+import zlib
+from itertools import chain, repeat
+
+import numpy as np
+import pandas as pd
+
+import storage
+from phrase_counts import TOKEN_RE
+
+INCIDENTS = 'data/twcs_incidents'
+CHUNK_ROWS = 50_000
+MASK32 = np.uint64(0xFFFFFFFF)
+SHIFT32 = np.uint64(32)
+BIGRAM_MIX = np.uint64(0x9E3779B1)
+
+# per-incident state: name -> (initial value, dtype)
+INCIDENT_ARRAYS = {
+    'size': (0, np.int64),
+    'first_ns': (0, np.int64),
+    'last_ns': (0, np.int64),
+    'indexed': (False, bool),     # representative still in the LSH buckets
+}
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def inner(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return inner
+
+
+def shingles(texts):
+    """Hashed word 1- and 2-gram shingles: (hashes uint64 < 2**32, row ids), grouped by row.
+
+    Word bigrams keep order-sensitive phrases ("not working") apart; every distinct word is
+    hashed once per call and bigram hashes are mixed from the word hashes with array ops.
+    """
+    toks = [TOKEN_RE.findall(t.lower()) for t in texts]
+    lens = np.fromiter(map(len, toks), dtype=np.int64, count=len(toks))
+    flat = list(chain.from_iterable(toks))
+    if not flat:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    codes, uniques = pd.factorize(np.array(flat, dtype=object))
+    h = np.fromiter((zlib.crc32(u.encode()) for u in uniques), dtype=np.uint64, count=len(uniques))[codes]
+    row = np.repeat(np.arange(len(toks)), lens)
+    same = row[1:] == row[:-1]
+    bigram = ((h[:-1] * BIGRAM_MIX) ^ h[1:]) & MASK32
+    x = np.concatenate([h, bigram[same]])
+    r = np.concatenate([row, row[1:][same]])
+    order = np.argsort(r, kind='stable')
+    return x[order], r[order]
+
+
+def collapse_duplicates(df, incident_ids, time_col='created_at'):
+    """One row per incident (its newest mention) with a `similar` count; unclustered rows stay as is."""
+    out = df.assign(incident_id=np.asarray(incident_ids, dtype=np.int64))
+    out = out.sort_values(time_col, ascending=False, kind='stable')
+    key = pd.Series(np.where(out['incident_id'] >= 0, out['incident_id'], -1 - np.arange(len(out))))
+    first = ~key.duplicated().to_numpy()
+    out = out[first]
+    out['similar'] = key.map(key.value_counts()).to_numpy()[first]
+    return out
+
+
+class IncidentIndex:
+    """Greedy near-duplicate clustering of mentions with MinHash signatures and banded LSH.
+
+    Each incident is represented by its first mention. A new mention's `num_perm` MinHash values
+    are split into `bands` bands; any incident sharing a band bucket is a candidate, and it joins
+    the candidate with the highest estimated Jaccard similarity if that is at least `threshold`.
+    Otherwise it starts a new incident. Mentions within one chunk are clustered among themselves
+    the same way (each joins the earliest similar mention's incident), so a whole chunk is
+    assigned with array operations and one dict lookup per band.
+
+    Incidents with no mention for `ttl_hours` are dropped from the buckets, which bounds the
+    index by recent activity; their sizes and texts remain for reports.
+
+    Safe to share between Streamlit sessions (e.g. via st.cache_resource): ingest/refresh grow
+    the arrays and buckets in place, so they and every query hold one lock.
+    """
+
+    def __init__(self, num_perm=32, bands=8, threshold=0.5, ttl_hours=48, seed=1, capacity=1024):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.ttl_hours = ttl_hours
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # multiply-shift hashing: the high 32 bits of a*x + b (mod 2**64), one (a, b) per permutation
+        self.a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self.mix = rng.integers(1, 2**63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self.salt = rng.integers(0, 2**63, size=bands, dtype=np.uint64)
+
+        self.lock = threading.RLock()
+        self.buckets = {}          # band key -> incident id
+        self.n = 0
+        self.brand = []
+        self.text = []
+        self.members = []          # per ingest chunk: (created_at ns, tweet_id, incident id)
+        self._cat = None
+        self._by_tweet = None
+        self.watermark = None
+        self.source = None
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        for name, (fill, dtype) in INCIDENT_ARRAYS.items():
+            new = np.full(capacity, fill, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                new[:len(old)] = old
+            setattr(self, name, new)
+        sig = np.zeros((capacity, self.num_perm), dtype=np.uint32)
+        if hasattr(self, 'sig'):
+            sig[:len(self.sig)] = self.sig
+        self.sig = sig
+        self.capacity = capacity
+
+    # ---------- hashing ----------
+
+    def signatures(self, texts):
+        """MinHash signatures (len(texts) x num_perm, uint32) and whether each text had any words."""
+        x, row = shingles(texts)
+        sig = np.full((len(texts), self.num_perm), 0xFFFFFFFF, dtype=np.uint32)
+        has = np.zeros(len(texts), dtype=bool)
+        if len(x) == 0:
+            return sig, has
+        starts = np.flatnonzero(np.r_[True, row[1:] != row[:-1]])
+        rows = row[starts]
+        has[rows] = True
+        for k in range(self.num_perm):
+            sig[rows, k] = np.minimum.reduceat((self.a[k] * x + self.b[k]) >> SHIFT32, starts)
+        return sig, has
+
+    def band_keys(self, sig):
+        """One uint64 bucket key per band: the band's values mixed together, salted by band."""
+        s = sig.reshape(len(sig), self.bands, self.rows).astype(np.uint64)
+        return (s * self.mix).sum(axis=2, dtype=np.uint64) ^ self.salt
+
+    def _similar(self, sig_a, sig_b):
+        return (sig_a == sig_b).mean(axis=1) >= self.threshold
+
+    # ---------- assignment ----------
+
+    def _match_existing(self, sig, keys, has):
+        # candidates from the buckets, verified against each candidate's representative signature
+        m = len(sig)
+        out = np.full(m, -1, dtype=np.int64)
+        flat = keys.ravel().tolist()
+        cand = np.array(list(map(self.buckets.get, flat, repeat(-1, len(flat)))), dtype=np.int64).reshape(m, self.bands)
+        cand[~has] = -1
+        i, b = np.nonzero(cand >= 0)
+        if len(i) == 0:
+            return out
+        pair = np.unique(i * np.int64(self.n + 1) + cand[i, b])
+        i, c = pair // (self.n + 1), pair % (self.n + 1)
+        score = (sig[i] == self.sig[c]).mean(axis=1)
+        ok = score >= self.threshold
+        i, c, score = i[ok], c[ok], score[ok]
+        order = np.lexsort((-score, i))           # best candidate first within each mention
+        i, c = i[order], c[order]
+        first = np.r_[True, i[1:] != i[:-1]]
+        out[i[first]] = c[first]
+        return out
+
+    def _cluster_new(self, sig, keys):
+        # within-chunk grouping: each mention points at the earliest similar mention sharing a band
+        u = len(sig)
+        pos = np.arange(u)
+        leader = pos.copy()
+        for b in range(self.bands):
+            codes = pd.factorize(keys[:, b])[0]
+            first = np.unique(codes, return_index=True)[1][codes]
+            better = (first < leader) & self._similar(sig, sig[first])
+            leader = np.where(better, first, leader)
+        while True:
+            nxt = leader[leader]
+            if np.array_equal(nxt, leader):
+                return leader
+            leader = nxt
+
+    def _add_incidents(self, sig, keys, ts_ns, brands, texts):
+        k = len(sig)
+        ids = np.arange(self.n, self.n + k)
+        while self.n + k > self.capacity:
+            self._alloc(self.capacity * 2)
+        self.sig[ids] = sig
+        self.first_ns[ids] = ts_ns
+        self.last_ns[ids] = ts_ns
+        self.indexed[ids] = True
+        self.brand += list(brands)
+        self.text += list(texts)
+        self.n += k
+        # a newer incident takes over a bucket it shares with an older one
+        self.buckets.update(zip(keys.ravel().tolist(), np.repeat(ids, self.bands).tolist()))
+        return ids
+
+    def _evict(self, now_ns):
+        stale = np.flatnonzero(self.indexed[:self.n] & (self.last_ns[:self.n] < now_ns - int(self.ttl_hours * 3.6e12)))
+        if len(stale) == 0:
+            return 0
+        keys = self.band_keys(self.sig[stale]).tolist()
+        for c, row in zip(stale.tolist(), keys):
+            for key in row:
+                if self.buckets.get(key) == c:
+                    del self.buckets[key]
+        self.indexed[stale] = False
+        return len(stale)
+
+    def _assign(self, texts, ts_ns, brands):
+        sig, has = self.signatures(texts)
+        keys = self.band_keys(sig)
+        out = self._match_existing(sig, keys, has)
+        new = np.flatnonzero((out < 0) & has)
+        if len(new):
+            leader = self._cluster_new(sig[new], keys[new])
+            roots = np.flatnonzero(leader == np.arange(len(new)))
+            ids = self._add_incidents(sig[new[roots]], keys[new[roots]], ts_ns[new[roots]],
+                                      brands[new[roots]], texts[new[roots]])
+            root_id = np.empty(len(new), dtype=np.int64)
+            root_id[roots] = ids
+            out[new] = root_id[leader]
+        hit = out >= 0
+        self.size[:self.n] += np.bincount(out[hit], minlength=self.n)
+        np.maximum.at(self.last_ns, out[hit], ts_ns[hit])
+        if len(ts_ns):
+            self._evict(int(ts_ns.max()))
+        return out
+
+    # ---------- ingest ----------
+
+    @_locked
+    def ingest(self, df):
+        """Assign mentions newer than the watermark to incidents; returns their ids (Series on df's index).
+
+        `df` needs created_at and text_clean2; author_id_brand and tweet_id are kept when present.
+        Pass negative mentions only, as the pipeline does.
+        """
+        if self.watermark is not None:
+            df = df[df['created_at'] > self.watermark]
+        df = df.dropna(subset=['created_at']).sort_values('created_at', kind='stable')
+        out = []
+        for i in range(0, len(df), CHUNK_ROWS):
+            part = df.iloc[i:i + CHUNK_ROWS]
+            ts_ns = pd.DatetimeIndex(part['created_at']).as_unit('ns').asi8
+            texts = part['text_clean2'].fillna('').astype(str).to_numpy(dtype=object)
+            brands = (part['author_id_brand'].astype(object).fillna('').astype(str).to_numpy(dtype=object)
+                      if 'author_id_brand' in part.columns else np.full(len(part), '', dtype=object))
+            ids = self._assign(texts, ts_ns, brands)
+            tweet = (pd.to_numeric(part['tweet_id'], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+                     if 'tweet_id' in part.columns else np.full(len(part), -1, dtype=np.int64))
+            self.members.append((ts_ns, tweet, ids))
+            out.append(pd.Series(ids, index=part.index))
+        self._cat = self._by_tweet = None
+        if len(df):
+            self.watermark = df['created_at'].max() if self.watermark is None else max(self.watermark, df['created_at'].max())
+        return pd.concat(out) if out else pd.Series([], dtype=np.int64)
+
+    @_locked
+    def refresh(self, stem):
+        """Fold in negative rows of `stem` newer than the watermark."""
+        self.source = storage.csv_path(stem).with_suffix('').as_posix()
+        if not storage.exists(stem):
+            return 0
+        df = storage.read_table(stem, columns=['created_at', 'tweet_id', 'sentiment_roberta', 'text_clean2',
+                                               'author_id_brand'], start=self.watermark)
+        return len(self.ingest(df[df['sentiment_roberta'] == 'Negative']))
+
+    # ---------- queries ----------
+
+    def _members(self):
+        if self._cat is None:
+            parts = self.members or [(np.empty(0, dtype=np.int64),) * 3]
+            self._cat = tuple(np.concatenate(cols) for cols in zip(*parts))
+            self.members = [self._cat]
+        return self._cat
+
+    @_locked
+    def incident_ids(self, tweet_ids):
+        """Incident id of each tweet id (-1 if it was not clustered)."""
+        _, tweet, ids = self._members()
+        q = pd.to_numeric(pd.Series(tweet_ids), errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+        if len(tweet) == 0:
+            return np.full(len(q), -1, dtype=np.int64)
+        if self._by_tweet is None:
+            order = np.argsort(tweet, kind='stable')
+            self._by_tweet = (tweet[order], ids[order])
+        sorted_tweet, sorted_ids = self._by_tweet
+        pos = np.minimum(np.searchsorted(sorted_tweet, q), len(sorted_tweet) - 1)
+        return np.where((sorted_tweet[pos] == q) & (q >= 0), sorted_ids[pos], -1)
+
+    @_locked
+    def clusters(self):
+        """Every incident: id, size, first/last seen, brand and representative (first) text."""
+        n = self.n
+        return pd.DataFrame({
+            'incident_id': np.arange(n, dtype=np.int64),
+            'created_at': pd.to_datetime(self.first_ns[:n], utc=True),
+            'last_seen': pd.to_datetime(self.last_ns[:n], utc=True),
+            'size': self.size[:n],
+            'author_id_brand': pd.Series(self.brand, dtype=object),
+            'text_clean2': pd.Series(self.text, dtype=object),
+        })
+
+    @_locked
+    def incidents(self, start=None, end=None, brands=None, min_size=2, k=50):
+        """Largest incidents by mentions in [start, end], with their all-time size and sample text."""
+        ts, _, ids = self._members()
+        lo = 0 if start is None else np.searchsorted(ts, pd.Timestamp(start).as_unit('ns').value, side='left')
+        hi = len(ts) if end is None else np.searchsorted(ts, pd.Timestamp(end).as_unit('ns').value, side='right')
+        window = ids[lo:hi]
+        counts = np.bincount(window[window >= 0], minlength=self.n)
+        sel = np.flatnonzero(counts >= min_size)
+        if brands is not None:
+            wanted = set(brands)
+            sel = sel[[self.brand[i] in wanted for i in sel]]
+        sel = sel[np.lexsort((-self.last_ns[sel], -counts[sel]))][:k]
+        out = self.clusters().iloc[sel].reset_index(drop=True)
+        out.insert(1, 'mentions', counts[sel])
+        return out.rename(columns={'created_at': 'first_seen', 'size': 'total_mentions'})
+
+    # ---------- persistence ----------
+
+    @_locked
+    def save(self, stem=INCIDENTS):
+        storage.write_table(self.clusters(), stem, csv=not storage.HAVE_ARROW)
+        ts, tweet, ids = self._members()
+        storage.write_table(pd.DataFrame({'created_at': pd.to_datetime(ts, utc=True), 'tweet_id': tweet,
+                                          'incident_id': ids}), str(stem) + '_members', csv=not storage.HAVE_ARROW)
+        np.save(str(stem) + '.sig.npy', self.sig[:self.n])
+        with open(str(stem) + '.meta.json', 'w') as f:
+            json.dump({'created_at': None if self.watermark is None else self.watermark.isoformat(),
+                       'source': self.source, 'params': self._params()}, f)
+
+    def _params(self):
+        return {'num_perm': self.num_perm, 'bands': self.bands, 'threshold': self.threshold,
+                'ttl_hours': self.ttl_hours, 'seed': self.seed}
+
+    @classmethod
+    def load(cls, stem=INCIDENTS, source=None, **params):
+        """Load a saved index; start empty if it was built from another table or with other settings."""
+        index = cls(**params)
+        if source is not None:
+            index.source = storage.csv_path(source).with_suffix('').as_posix()
+        if not storage.exists(stem):
+            return index
+        with open(str(stem) + '.meta.json') as f:
+            meta = json.load(f)
+        if meta['params'] != index._params():
+            return index
+        if source is not None and meta.get('source') != index.source:
+            return index
+        inc = storage.read_table(stem).sort_values('incident_id', ignore_index=True)
+        mem = storage.read_table(str(stem) + '_members').sort_values('created_at', kind='stable', ignore_index=True)
+        n = len(inc)
+        index._alloc(max(1024, n))
+        index.n = n
+        index.sig[:n] = np.load(str(stem) + '.sig.npy')
+        index.size[:n] = inc['size'].to_numpy()
+        index.first_ns[:n] = pd.DatetimeIndex(inc['created_at']).as_unit('ns').asi8
+        index.last_ns[:n] = pd.DatetimeIndex(inc['last_seen']).as_unit('ns').asi8
+        index.brand = inc['author_id_brand'].astype(object).fillna('').astype(str).tolist()
+        index.text = inc['text_clean2'].astype(object).fillna('').astype(str).tolist()
+        index.members = [(pd.DatetimeIndex(mem['created_at']).as_unit('ns').asi8,
+                          mem['tweet_id'].to_numpy(dtype=np.int64), mem['incident_id'].to_numpy(dtype=np.int64))]
+        index.watermark = pd.Timestamp(meta['created_at']) if meta['created_at'] else None
+        index.source = meta.get('source', index.source)
+        # only incidents active within the ttl go back into the buckets
+        if index.watermark is not None:
+            live = np.flatnonzero(index.last_ns[:n] >= index.watermark.value - int(index.ttl_hours * 3.6e12))
+            keys = index.band_keys(index.sig[live])
+            index.buckets.update(zip(keys.ravel().tolist(), np.repeat(live, index.bands).tolist()))
+            index.indexed[live] = True
+        return index
+
+
+if __name__ == '__main__':
+    index = IncidentIndex.load(source=storage.INBOUND)
+    added = index.refresh(storage.INBOUND)
+    index.save()
+    print(f"[incidents] added rows={added:,} incidents={index.n:,} indexed={int(index.indexed[:index.n].sum()):,} "
+          f"buckets={len(index.buckets):,} watermark={index.watermark}")
@@ -0,0 +1,262 @@
+# Purpose: Lightweight timers, counters and peak-memory tracking for the stages and dashboards.
+# Why: Scripts only printed row counts, so a slow nightly run could not be pinned on read_csv,
+#      cleaning, tokenization, the model forward pass, resampling or writing. Hot paths are
+#      wrapped in named timers; each stage writes a JSON run report, long-running processes can
+#      expose the same numbers in Prometheus text format, and any stage can be profiled on demand.
+#
+# Usage:
+#   from instrument import metrics
+#   with metrics.stage('03'):                  # report -> outputs/metrics/03.json on exit
+#       with metrics.timer('read'):
+#           df = storage.read_table(...)
+#       metrics.count('rows', len(df))
+#
+#   @metrics.timed('load_data')                # decorator form
+#
+# Environment:
+#   PULSEGUARD_PROFILE=02,05 | all     cProfile the named stages -> outputs/profiles/<stage>.prof
+#   PULSEGUARD_PROFILER=pyinstrument   pyinstrument HTML (<stage>.html) instead, if installed
+#   PULSEGUARD_METRICS_PORT=9108       serve http://127.0.0.1:9108/metrics while the process runs
+#   PULSEGUARD_METRICS=0               no JSON reports
+
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+REPORT_DIR = 'outputs/metrics'
+PROFILE_DIR = 'outputs/profiles'
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Process-wide registry of named timers, counters and gauges (thread-safe).
+
+    Each timer keeps calls, total and max seconds, and how much the process peak RSS grew while
+    it ran, which points at the step that set the high-water mark.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stage_name = None
+        self.server = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.timers = {}     # name -> [calls, total_s, max_s, peak_growth_mb]
+            self.counters = {}
+            self.gauges = {}
+
+    # ---------- recording ----------
+
+    def observe(self, name, seconds, peak_growth_mb=0.0):
+        with self.lock:
+            t = self.timers.setdefault(name, [0, 0.0, 0.0, 0.0])
+            t[0] += 1
+            t[1] += seconds
+            t[2] = max(t[2], seconds)
+            t[3] += peak_growth_mb
+
+    @contextmanager
+    def timer(self, name):
+        rss0 = peak_rss_mb()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, peak_rss_mb() - rss0)
+
+    def timed(self, name=None):
+        def wrap(fn):
+            label = name or fn.__name__
+
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.timer(label):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    # ---------- export ----------
+
+    def snapshot(self):
+        with self.lock:
+            timers = {k: {'calls': c, 'total_s': round(tot, 6), 'mean_s': round(tot / c, 6) if c else 0.0,
+                          'max_s': round(mx, 6), 'peak_growth_mb': round(g, 1)}
+                      for k, (c, tot, mx, g) in sorted(self.timers.items(), key=lambda kv: -kv[1][1])}
+            return {'timers': timers, 'counters': dict(self.counters), 'gauges': dict(self.gauges),
+                    'peak_rss_mb': round(peak_rss_mb(), 1)}
+
+    def drain(self):
+        """Raw state for merging into another process's registry (e.g. a pool worker's), then reset."""
+        with self.lock:
+            raw = {'timers': self.timers, 'counters': self.counters, 'gauges': self.gauges}
+        self.reset()
+        return raw
+
+    def merge(self, raw, prefix=''):
+        with self.lock:
+            for k, (c, tot, mx, g) in raw['timers'].items():
+                t = self.timers.setdefault(prefix + k, [0, 0.0, 0.0, 0.0])
+                t[0] += c
+                t[1] += tot
+                t[2] = max(t[2], mx)
+                t[3] = max(t[3], g)   # workers have their own address space; growth does not add up
+            for k, v in raw['counters'].items():
+                self.counters[prefix + k] = self.counters.get(prefix + k, 0) + v
+            self.gauges.update({prefix + k: v for k, v in raw['gauges'].items()})
+
+    def prometheus(self):
+        snap = self.snapshot()
+        stage = _escape(self.stage_name or os.path.basename(sys.argv[0]))
+        lines = ['# TYPE pulseguard_timer_seconds_total counter',
+                 '# TYPE pulseguard_timer_calls_total counter',
+                 '# TYPE pulseguard_timer_max_seconds gauge']
+        for name, t in snap['timers'].items():
+            lbl = f'{{stage="{stage}",timer="{_escape(name)}"}}'
+            lines += [f'pulseguard_timer_seconds_total{lbl} {t["total_s"]}',
+                      f'pulseguard_timer_calls_total{lbl} {t["calls"]}',
+                      f'pulseguard_timer_max_seconds{lbl} {t["max_s"]}']
+        lines.append('# TYPE pulseguard_events_total counter')
+        for name, v in snap['counters'].items():
+            lines.append(f'pulseguard_events_total{{stage="{stage}",name="{_escape(name)}"}} {v}')
+        lines.append('# TYPE pulseguard_value gauge')
+        for name, v in snap['gauges'].items():
+            lines.append(f'pulseguard_value{{stage="{stage}",name="{_escape(name)}"}} {v}')
+        lines += ['# TYPE pulseguard_peak_rss_bytes gauge',
+                  f'pulseguard_peak_rss_bytes{{stage="{stage}"}} {int(snap["peak_rss_mb"] * 1024 * 1024)}']
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """Expose /metrics in Prometheus text format from a daemon thread (once per process)."""
+        if self.server is not None:
+            return self.server
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer((host, int(port)), Handler)
+        except OSError as e:
+            print(f"[metrics] cannot serve on {host}:{port}: {e}")
+            return None
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True).start()
+        print(f"[metrics] serving http://{host}:{self.server.server_address[1]}/metrics")
+        return self.server
+
+    def serve_from_env(self):
+        port = os.getenv('PULSEGUARD_METRICS_PORT')
+        return self.serve(port) if port else None
+
+    def write_report(self, path, **extra):
+        report = dict({'stage': self.stage_name, 'argv': sys.argv, 'pid': os.getpid()}, **extra, **self.snapshot())
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = str(path) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        os.replace(tmp, path)
+        return report
+
+    # ---------- per-stage scope ----------
+
+    @contextmanager
+    def stage(self, name, report_dir=REPORT_DIR):
+        """Time a whole stage run; on exit write <report_dir>/<name>.json and any profile."""
+        self.stage_name = name
+        self.serve_from_env()
+        profiler = _start_profiler(name)
+        started = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        t0 = time.perf_counter()
+        status = 'ok'
+        try:
+            yield self
+        except BaseException as e:
+            status = 'failed: ' + type(e).__name__
+            raise
+        finally:
+            wall = time.perf_counter() - t0
+            profile_path = _stop_profiler(profiler, name)
+            if os.getenv('PULSEGUARD_METRICS', '1') != '0':
+                path = Path(report_dir) / (name + '.json')
+                self.write_report(path, status=status, started_at=started, wall_s=round(wall, 3),
+                                  profile=profile_path)
+                top = ', '.join(f"{k}={v['total_s']:.2f}s" for k, v in list(self.snapshot()['timers'].items())[:4])
+                print(f"[metrics] {name}: wall={wall:,.2f}s peak_rss={peak_rss_mb():,.0f} MB  {top}  -> {path}")
+
+
+def _profiling(name):
+    wanted = {s.strip() for s in os.getenv('PULSEGUARD_PROFILE', '').split(',') if s.strip()}
+    return 'all' in wanted or name in wanted
+
+
+def _start_profiler(name):
+    if not _profiling(name):
+        return None
+    if os.getenv('PULSEGUARD_PROFILER', 'cprofile') == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+            prof = Profiler()
+            prof.start()
+            return ('pyinstrument', prof)
+        except ImportError:
+            print('[profile] pyinstrument not installed; using cProfile')
+    import cProfile
+    prof = cProfile.Profile()
+    prof.enable()
+    return ('cprofile', prof)
+
+
+def _stop_profiler(profiler, name):
+    if profiler is None:
+        return None
+    kind, prof = profiler
+    Path(PROFILE_DIR).mkdir(parents=True, exist_ok=True)
+    if kind == 'pyinstrument':
+        prof.stop()
+        path = Path(PROFILE_DIR) / (name + '.html')
+        path.write_text(prof.output_html())
+    else:
+        prof.disable()
+        path = Path(PROFILE_DIR) / (name + '.prof')
+        prof.dump_stats(str(path))
+    print(f"[profile] {name}: {path}" + ('  (python -m pstats ' + str(path) + ')' if kind == 'cprofile' else ''))
+    return str(path)
+
+
+metrics = Metrics()
@@ -0,0 +1,215 @@
+# Purpose: ONNX Runtime backend for the cardiffnlp RoBERTa sentiment model, plus backend selection.
+# Why: PyTorch eager inference on CPU leaves speed on the table and drags a ~2 GB dependency into
+#      every scoring process; the model is exported once to a local ONNX artifact (optionally int8
+#      quantized) and served by onnxruntime with its own intra-/inter-op thread pools. Serving only
+#      needs onnxruntime + tokenizers + numpy.
+#
+# Usage:
+#   python onnx_engine.py --export                 # one-off: writes models/<model>-onnx/ (needs torch + transformers)
+#   python onnx_engine.py --export --quantize      # also writes the int8 model (needs the onnx package)
+#
+# Backend selection (stage 02, stream_ingest): ROBERTA_BACKEND=auto|onnx|torch (default auto).
+# auto tries ONNX, then PyTorch; callers fall back to VADER when both fail. Numerical parity with
+# the PyTorch path is checked by benchmarks/check_onnx_parity.py.
+
+import argparse
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from roberta_engine import MODEL_NAME, RobertaScorer
+
+ONNX_DIR = os.getenv('ROBERTA_ONNX_DIR', 'models/' + MODEL_NAME.split('/')[-1] + '-onnx')
+FP32_FILE = 'model.onnx'
+INT8_FILE = 'model.int8.onnx'
+OPSET = 17
+
+
+def _tmp_path(out, name):
+    # unique per process, so concurrent exports never write the same temp file
+    fd, tmp = tempfile.mkstemp(dir=out, prefix=name + '.', suffix='.tmp')
+    os.close(fd)
+    return Path(tmp)
+
+
+@contextmanager
+def _export_lock(out):
+    out.mkdir(parents=True, exist_ok=True)
+    with open(out / '.export.lock', 'w') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def export_onnx(model_name=MODEL_NAME, out_dir=ONNX_DIR, quantize=False, opset=OPSET):
+    """Export `model_name` to <out_dir>/model.onnx with the tokenizer and a meta.json.
+
+    Batch and sequence axes are dynamic so the length-bucketed batches of RobertaScorer.score
+    run unchanged. With `quantize`, also writes model.int8.onnx (dynamic int8 weights).
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    model.config.return_dict = False
+    sample = tokenizer(['export sample', 'a slightly longer export sample text'], padding=True, return_tensors='pt')
+    tmp = _tmp_path(out, FP32_FILE)
+    with torch.inference_mode():
+        torch.onnx.export(
+            model, (sample['input_ids'], sample['attention_mask']), str(tmp),
+            input_names=['input_ids', 'attention_mask'], output_names=['logits'],
+            dynamic_axes={'input_ids': {0: 'batch', 1: 'sequence'},
+                          'attention_mask': {0: 'batch', 1: 'sequence'},
+                          'logits': {0: 'batch'}},
+            opset_version=opset, do_constant_folding=True,
+        )
+    os.replace(tmp, out / FP32_FILE)
+    tokenizer.save_pretrained(str(out))   # tokenizer.json is what the serving side loads
+    meta = {'model_name': model_name, 'revision': getattr(model.config, '_commit_hash', None) or 'local',
+            'opset': opset, 'torch': torch.__version__}
+    tmp_meta = _tmp_path(out, 'meta.json')
+    tmp_meta.write_text(json.dumps(meta, indent=2))
+    os.replace(tmp_meta, out / 'meta.json')
+    print(f"[onnx] exported {model_name} to {out / FP32_FILE}")
+    if quantize:
+        quantize_onnx(out_dir)
+    return out
+
+
+def quantize_onnx(out_dir=ONNX_DIR):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    src, dst = Path(out_dir) / FP32_FILE, Path(out_dir) / INT8_FILE
+    tmp = _tmp_path(dst.parent, INT8_FILE)
+    quantize_dynamic(str(src), str(tmp), weight_type=QuantType.QInt8)
+    os.replace(tmp, dst)
+    print(f"[onnx] quantized to {dst}")
+    return dst
+
+
+def ensure_onnx(model_name=MODEL_NAME, out_dir=ONNX_DIR, quantize=False):
+    """Export (and quantize) only if the artifact for `model_name` is missing.
+
+    Holds a file lock on <out_dir>/.export.lock, so processes racing here export once and the
+    rest reuse the result.
+    """
+    out = Path(out_dir)
+    with _export_lock(out):
+        meta_path = out / 'meta.json'
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+        if meta.get('model_name') != model_name or not (out / FP32_FILE).exists():
+            export_onnx(model_name, out_dir, quantize)
+        elif quantize and not (out / INT8_FILE).exists():
+            quantize_onnx(out_dir)
+    return out
+
+
+class OnnxRobertaScorer(RobertaScorer):
+    """RobertaScorer with the forward pass on onnxruntime instead of PyTorch.
+
+    Same `score()` / `last_stats` / `report()` contract and the same length-bucketed batching;
+    `model_version` carries an '-onnx' (and '-int8') suffix so cached scores from different
+    backends are never mixed.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, onnx_dir=ONNX_DIR, max_length=256, max_tokens=8192,
+                 max_batch=256, intra_op_threads=None, inter_op_threads=None, quantize=False,
+                 window=50_000, export=True):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        out = ensure_onnx(model_name, onnx_dir, quantize) if export else Path(onnx_dir)
+        meta = json.loads((out / 'meta.json').read_text())
+        if meta['model_name'] != model_name:
+            raise ValueError(f"{out} holds {meta['model_name']}, not {model_name}")
+        self.model_name = model_name
+        self.max_length = max_length
+        self.max_tokens = max_tokens
+        self.max_batch = max_batch
+        self.window = window
+        self.onnx_dir = str(out)
+
+        self.tokenizer = Tokenizer.from_file(str(out / 'tokenizer.json'))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length)
+        pad = self.tokenizer.token_to_id('<pad>')
+        self.pad_id = pad if pad is not None else 0
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            opts.intra_op_num_threads = int(intra_op_threads)
+        if inter_op_threads:
+            opts.inter_op_num_threads = int(inter_op_threads)
+            if int(inter_op_threads) > 1:
+                opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.quantized = bool(quantize)
+        model_file = out / (INT8_FILE if self.quantized else FP32_FILE)
+        self.session = ort.InferenceSession(str(model_file), opts, providers=['CPUExecutionProvider'])
+        self.model_version = meta['revision'] + '-onnx' + ('-int8' if self.quantized else '')
+        self.last_stats = {}
+
+    def _tokenize(self, texts):
+        return [e.ids for e in self.tokenizer.encode_batch(texts)]
+
+    def _forward(self, ids_list):
+        input_ids, attention = self._pad(ids_list)
+        logits = self.session.run(['logits'], {'input_ids': input_ids, 'attention_mask': attention})[0]
+        logits = logits.astype(np.float32) - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return probs, input_ids.size
+
+
+def load_scorer(model_name=MODEL_NAME, backend=None, num_threads=None, inter_op_threads=None,
+                max_tokens=None, quantize=None):
+    """Best available RoBERTa scorer: ONNX Runtime, then PyTorch. Raises if neither loads.
+
+    Unset arguments come from the environment: ROBERTA_BACKEND, ROBERTA_THREADS (torch threads /
+    ORT intra-op), ROBERTA_INTER_THREADS (ORT inter-op), ROBERTA_MAX_TOKENS, ROBERTA_QUANTIZE.
+    """
+    backend = backend or os.getenv('ROBERTA_BACKEND', 'auto')
+    num_threads = num_threads or os.getenv('ROBERTA_THREADS')
+    inter_op_threads = inter_op_threads or os.getenv('ROBERTA_INTER_THREADS')
+    max_tokens = int(max_tokens or os.getenv('ROBERTA_MAX_TOKENS', '8192'))
+    quantize = (os.getenv('ROBERTA_QUANTIZE', '0') == '1') if quantize is None else quantize
+    if backend not in ('auto', 'onnx', 'torch'):
+        raise ValueError('ROBERTA_BACKEND must be auto, onnx or torch, not ' + repr(backend))
+
+    if backend in ('auto', 'onnx'):
+        try:
+            return OnnxRobertaScorer(model_name, max_tokens=max_tokens, intra_op_threads=num_threads,
+                                     inter_op_threads=inter_op_threads, quantize=quantize)
+        except Exception as e:
+            if backend == 'onnx':
+                raise
+            print('ONNX backend unavailable (' + str(e) + '); trying PyTorch')
+    return RobertaScorer(model_name, max_tokens=max_tokens, num_threads=num_threads, quantize=quantize)
+
+
+def describe(scorer):
+    backend = 'onnxruntime' if isinstance(scorer, OnnxRobertaScorer) else 'pytorch'
+    return backend + (' int8' if scorer.quantized else '')
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--export', action='store_true', help='export the model even if the artifact exists')
+    ap.add_argument('--quantize', action='store_true', help='also write the int8 model')
+    ap.add_argument('--model', default=MODEL_NAME)
+    ap.add_argument('--out-dir', default=ONNX_DIR)
+    args = ap.parse_args()
+
+    if args.export:
+        export_onnx(args.model, args.out_dir, args.quantize)
+    else:
+        ensure_onnx(args.model, args.out_dir, args.quantize)
+        print(f"[onnx] artifact ready in {args.out_dir}")
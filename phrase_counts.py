@@ -0,0 +1,257 @@
+# Purpose: Incremental 1-3-gram phrase counts for negative mentions, kept per hour and brand.
+# Why: Fitting three CountVectorizers over the whole negative corpus tokenizes every text three
+#      times and rebuilds full vocabularies on each run; additive per-(hour, brand) counts are
+#      built once per mention and merged to answer top phrases for any range, brand or surge.
+#
+# Usage: python phrase_counts.py          # fold new negative mentions into data/twcs_phrase_counts
+
+import json
+import re
+import zlib
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+PHRASES = 'data/twcs_phrase_counts'
+NS_PER_HOUR = 3600 * 1_000_000_000
+CHUNK_ROWS = 200_000
+ORDERS = {'uni': 1, 'bi': 2, 'tri': 3}
+
+# CountVectorizer's default token pattern: words of two or more characters
+TOKEN_RE = re.compile(r'(?u)\b\w\w+\b')
+# sklearn's ENGLISH_STOP_WORDS (what CountVectorizer(stop_words='english') drops), copied verbatim so
+# phrases match the earlier CountVectorizer output without needing sklearn at run time
+STOP_WORDS = frozenset('''
+a about above across after afterwards again against all almost alone along already also although
+always am among amongst amoungst amount an and another any anyhow anyone anything anyway anywhere
+are around as at back be became because become becomes becoming been before beforehand behind being
+below beside besides between beyond bill both bottom but by call can cannot cant co con could
+couldnt cry de describe detail do done down due during each eg eight either eleven else elsewhere
+empty enough etc even ever every everyone everything everywhere except few fifteen fifty fill find
+fire first five for former formerly forty found four from front full further get give go had has
+hasnt have he hence her here hereafter hereby herein hereupon hers herself him himself his how
+however hundred i ie if in inc indeed interest into is it its itself keep last latter latterly least
+less ltd made many may me meanwhile might mill mine more moreover most mostly move much must my
+myself name namely neither never nevertheless next nine no nobody none noone nor not nothing now
+nowhere of off often on once one only onto or other others otherwise our ours ourselves out over own
+part per perhaps please put rather re same see seem seemed seeming seems serious several she should
+show side since sincere six sixty so some somehow someone something sometime sometimes somewhere
+still such system take ten than that the their them themselves then thence there thereafter thereby
+therefore therein thereupon these they thick thin third this those though three through throughout
+thru thus to together too top toward towards twelve twenty two un under until up upon us very via
+was we well were what whatever when whence whenever where whereafter whereas whereby wherein
+whereupon wherever whether which while whither who whoever whole whom whose why will with within
+without would yet you your yours yourself yourselves
+'''.split())
+# saved stores record which list built them; a different list means rebuilding from scratch
+STOP_WORDS_ID = zlib.crc32(' '.join(sorted(STOP_WORDS)).encode())
+
+
+def grams(text, max_n=3):
+    """Tokenize once and emit every 1..max_n-gram (stop words removed first, as CountVectorizer does)."""
+    toks = [t for t in TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+    out = toks[:]
+    for n in range(2, max_n + 1):
+        out += [' '.join(toks[i:i + n]) for i in range(len(toks) - n + 1)]
+    return out
+
+
+def _hours(ts):
+    return pd.DatetimeIndex(ts).as_unit('ns').asi8 // NS_PER_HOUR
+
+
+def _to_ts(hours):
+    return pd.to_datetime(np.asarray(hours, dtype=np.int64) * 3600, unit='s', utc=True)
+
+
+def _hash(phrases, n_features):
+    return np.fromiter((zlib.crc32(p.encode()) % n_features for p in phrases), dtype=np.int64, count=len(phrases))
+
+
+def aggregate(df, max_n=3, n_features=None):
+    """Raw mentions -> (counts, docs): phrase counts and document counts per (hour, brand, n, phrase),
+    plus the number of documents per (hour, brand). With `n_features`, phrases are hashed to ids."""
+    df = df.dropna(subset=['created_at'])
+    hours = _hours(df['created_at'])
+    brands = (df['author_id_brand'].astype(object).fillna('').astype(str).to_numpy()
+              if 'author_id_brand' in df.columns else np.full(len(df), '', dtype=object))
+    texts = df['text_clean2'].fillna('').astype(str).tolist()
+
+    per_text = [grams(t, max_n) for t in texts]
+    lens = np.fromiter(map(len, per_text), dtype=np.int64, count=len(per_text))
+    row = np.repeat(np.arange(len(per_text)), lens)
+    flat = list(chain.from_iterable(per_text))
+    long = pd.DataFrame({'row': row, 'hour': hours[row], 'brand': brands[row],
+                         'n': np.fromiter((p.count(' ') + 1 for p in flat), dtype=np.int8, count=len(flat)),
+                         'phrase': _hash(flat, n_features) if n_features else flat})
+    labels = {}
+    if n_features:
+        # first phrase seen per (order, bucket) stands in for it in reports
+        first = pd.Series(flat, index=pd.MultiIndex.from_arrays([long['n'].to_numpy(), long['phrase'].to_numpy()]))
+        labels = {(int(n), int(h)): p for (n, h), p in first[~first.index.duplicated()].items()}
+
+    keys = ['hour', 'brand', 'n', 'phrase']
+    counts = long.groupby(keys, sort=True).size().rename('count')
+    docs = long.drop_duplicates(['row', 'n', 'phrase']).groupby(keys, sort=True).size().rename('docs')
+    counts = pd.concat([counts, docs], axis=1).reset_index()
+    totals = (pd.DataFrame({'hour': hours, 'brand': brands, 'docs': 1})
+              .groupby(['hour', 'brand'], sort=True, as_index=False)['docs'].sum())
+    return counts, totals, labels
+
+
+class PhraseStore:
+    """Sorted (hour, brand, n, phrase) counts with per-(hour, brand) document totals.
+
+    Counts are additive, so new mentions are folded in by re-summing only the overlapping tail and
+    every query is a binary-searched hour range plus a groupby over the matching buckets.
+    """
+
+    def __init__(self, max_n=3, n_features=None):
+        self.max_n = max_n
+        self.n_features = n_features
+        self.counts = pd.DataFrame({'hour': np.empty(0, dtype=np.int64), 'brand': np.empty(0, dtype=object),
+                                    'n': np.empty(0, dtype=np.int8),
+                                    'phrase': np.empty(0, dtype=np.int64 if n_features else object),
+                                    'count': np.empty(0, dtype=np.int64), 'docs': np.empty(0, dtype=np.int64)})
+        self.docs = pd.DataFrame({'hour': np.empty(0, dtype=np.int64), 'brand': np.empty(0, dtype=object),
+                                  'docs': np.empty(0, dtype=np.int64)})
+        self.labels = {}
+        self.watermark = None
+        self.source = None
+
+    # ---------- maintenance ----------
+    @staticmethod
+    def _fold(table, new, keys):
+        if len(new) == 0:
+            return table
+        cut = np.searchsorted(table['hour'].to_numpy(), new['hour'].iloc[0], side='left')
+        head, tail = table.iloc[:cut], table.iloc[cut:]
+        if len(tail):
+            vals = [c for c in new.columns if c not in keys]
+            new = pd.concat([tail, new]).groupby(keys, sort=True, as_index=False)[vals].sum()
+        return pd.concat([head, new], ignore_index=True)
+
+    def ingest(self, df):
+        """Fold negative mentions newer than the watermark into the store; returns rows used."""
+        if self.watermark is not None:
+            df = df[df['created_at'] > self.watermark]
+        df = df.dropna(subset=['created_at']).sort_values('created_at', kind='stable')
+        for i in range(0, len(df), CHUNK_ROWS):
+            counts, totals, labels = aggregate(df.iloc[i:i + CHUNK_ROWS], self.max_n, self.n_features)
+            self.counts = self._fold(self.counts, counts, ['hour', 'brand', 'n', 'phrase'])
+            self.docs = self._fold(self.docs, totals, ['hour', 'brand'])
+            for k, v in labels.items():
+                self.labels.setdefault(k, v)
+        if len(df):
+            self.watermark = df['created_at'].max() if self.watermark is None else max(self.watermark, df['created_at'].max())
+        return len(df)
+
+    def refresh(self, stem):
+        """Fold in negative rows of `stem` newer than the watermark."""
+        self.source = storage.csv_path(stem).with_suffix('').as_posix()
+        if not storage.exists(stem):
+            return 0
+        df = storage.read_table(stem, columns=['created_at', 'sentiment_roberta', 'text_clean2', 'author_id_brand'],
+                                start=self.watermark)
+        return self.ingest(df[df['sentiment_roberta'] == 'Negative'])
+
+    def save(self, stem=PHRASES):
+        for table, path in [(self.counts, stem), (self.docs, str(stem) + '_docs')]:
+            out = table.copy()
+            out.insert(0, 'created_at', _to_ts(out.pop('hour')))
+            storage.write_table(out, path, csv=not storage.HAVE_ARROW)
+        with open(str(stem) + '.meta.json', 'w') as f:
+            json.dump({'created_at': None if self.watermark is None else self.watermark.isoformat(),
+                       'source': self.source, 'max_n': self.max_n, 'n_features': self.n_features,
+                       'stop_words': STOP_WORDS_ID,
+                       'labels': [[n, h, p] for (n, h), p in self.labels.items()]}, f)
+
+    @classmethod
+    def load(cls, stem=PHRASES, source=None, max_n=3, n_features=None):
+        """Load a saved store; start empty if it was built from another table or with other settings."""
+        store = cls(max_n, n_features)
+        if not storage.exists(stem):
+            return store
+        with open(str(stem) + '.meta.json') as f:
+            meta = json.load(f)
+        if (meta['max_n'], meta['n_features'], meta.get('stop_words')) != (max_n, n_features, STOP_WORDS_ID):
+            return store
+        if source is not None and meta.get('source') != storage.csv_path(source).with_suffix('').as_posix():
+            return store
+        for attr, path, keys in [('counts', stem, ['hour', 'brand', 'n', 'phrase']),
+                                 ('docs', str(stem) + '_docs', ['hour', 'brand'])]:
+            df = storage.read_table(path)
+            df['hour'] = _hours(df.pop('created_at'))
+            df['brand'] = df['brand'].astype(object).fillna('').astype(str)
+            cols = keys + [c for c in getattr(store, attr).columns if c not in keys]
+            setattr(store, attr, df.sort_values(keys, ignore_index=True)[cols])
+        store.counts['n'] = store.counts['n'].astype(np.int8)
+        store.labels = {(n, h): p for n, h, p in meta['labels']}
+        store.watermark = pd.Timestamp(meta['created_at']) if meta['created_at'] else None
+        store.source = meta.get('source')
+        return store
+
+    # ---------- queries ----------
+    @staticmethod
+    def _slice(table, lo_h=None, hi_h=None, brands=None):
+        h = table['hour'].to_numpy()
+        lo = 0 if lo_h is None else np.searchsorted(h, lo_h, side='left')
+        hi = len(h) if hi_h is None else np.searchsorted(h, hi_h, side='right')
+        sub = table.iloc[lo:hi]
+        if brands is not None:
+            sub = sub[sub['brand'].isin(brands)]
+        return sub
+
+    def _bounds(self, start, end):
+        lo_h = None if start is None else _hours([start])[0]
+        hi_h = None if end is None else _hours([end])[0]
+        return lo_h, hi_h
+
+    def _label(self, out):
+        if self.n_features:
+            out['phrase'] = [self.labels.get((int(n), int(h))) for n, h in zip(out['n'], out['phrase'])]
+        return out
+
+    def top(self, start=None, end=None, brands=None, n=None, k=50, min_df=2, max_df=0.9):
+        """Most frequent phrases in [start, end] (hour resolution) with CountVectorizer-style
+        document-frequency limits: at least `min_df` documents and at most `max_df` of them."""
+        lo_h, hi_h = self._bounds(start, end)
+        sub = self._slice(self.counts, lo_h, hi_h, brands)
+        if n is not None:
+            sub = sub[sub['n'] == n]
+        n_docs = int(self._slice(self.docs, lo_h, hi_h, brands)['docs'].sum())
+        agg = sub.groupby(['n', 'phrase'], as_index=False)[['count', 'docs']].sum()
+        agg = agg[(agg['docs'] >= min_df) & (agg['docs'] <= max_df * n_docs)]
+        agg = agg.sort_values(['count', 'phrase'], ascending=[False, True], kind='stable').head(k)
+        return self._label(agg.reset_index(drop=True))
+
+    def surging(self, now=None, recent_h=1, baseline_h=168, brands=None, n=None, k=50, min_count=3):
+        """Phrases whose count in the last `recent_h` hours most exceeds the rate over the
+        preceding `baseline_h` hours. `now` defaults to the newest mention seen."""
+        now = self.watermark if now is None else now
+        if now is None:
+            return pd.DataFrame(columns=['n', 'phrase', 'recent', 'expected', 'lift'])
+        now_h = _hours([now])[0]
+        recent = self._slice(self.counts, now_h - recent_h + 1, now_h, brands)
+        base = self._slice(self.counts, now_h - recent_h - baseline_h + 1, now_h - recent_h, brands)
+        if n is not None:
+            recent, base = recent[recent['n'] == n], base[base['n'] == n]
+        r = recent.groupby(['n', 'phrase'])['count'].sum().rename('recent')
+        b = base.groupby(['n', 'phrase'])['count'].sum().rename('baseline')
+        out = pd.concat([r, b], axis=1).fillna(0)
+        out = out[out['recent'] >= min_count]
+        out['expected'] = out.pop('baseline') * (recent_h / baseline_h)
+        out['lift'] = (out['recent'] + 1) / (out['expected'] + 1)
+        out = out.reset_index().sort_values(['lift', 'recent'], ascending=False, kind='stable').head(k)
+        out['recent'] = out['recent'].astype(np.int64)
+        return self._label(out.reset_index(drop=True))
+
+
+if __name__ == '__main__':
+    store = PhraseStore.load(source=storage.INBOUND)
+    added = store.refresh(storage.INBOUND)
+    store.save()
+    print(f"[phrases] added rows={added:,} buckets={len(store.counts):,} watermark={store.watermark}")
@@ -0,0 +1,102 @@
+# Purpose: Headless batch rendering of report figures with an input-hash render cache.
+# Why: plt.show() blocks on batch nodes, and redrawing every figure after a small append wastes
+#      minutes; figures are drawn with Agg in a process pool and skipped when their inputs match
+#      the last render.
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from instrument import metrics
+
+FIG_DIR = 'outputs/figures'
+
+
+def digest(*parts):
+    """Stable hash of frames, series, arrays and plain values."""
+    h = hashlib.sha1()
+    for p in parts:
+        if isinstance(p, (pd.DataFrame, pd.Series)):
+            h.update(repr(list(p.columns) if isinstance(p, pd.DataFrame) else p.name).encode())
+            h.update(pd.util.hash_pandas_object(p, index=True).to_numpy().tobytes())
+        elif isinstance(p, np.ndarray):
+            h.update(np.ascontiguousarray(p).tobytes())
+        elif isinstance(p, dict):
+            h.update(digest(*(x for kv in sorted(p.items(), key=lambda kv: kv[0]) for x in kv)).encode())
+        else:
+            h.update(repr(p).encode())
+    return h.hexdigest()
+
+
+def _render(fn, data, paths):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig = fn(data)
+    for path in paths:
+        tmp = path + '.tmp' + os.path.splitext(path)[1]
+        fig.savefig(tmp)
+        os.replace(tmp, path)
+    plt.close(fig)
+    return paths
+
+
+def show_figures(jobs):
+    """Interactive mode: draw every job and open the windows (needs a display)."""
+    import matplotlib.pyplot as plt
+    for _, fn, data in jobs:
+        fn(data)
+    plt.show()
+
+
+def render_figures(jobs, out_dir=FIG_DIR, formats=('png',), workers=None, force=False):
+    """Render `jobs` = [(name, draw_fn, data)] to <out_dir>/<name>.<fmt>.
+
+    `draw_fn(data)` must be a module-level function returning a matplotlib Figure. Jobs whose
+    data, draw function and formats hash the same as the last render (and whose files exist)
+    are skipped; the rest render in parallel. Returns {name: 'rendered' | 'skipped'}.
+
+    Each figure's hash lives in its own `.<name>.sha1` file, so scripts rendering different
+    figures into the same directory can run at the same time.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    status, todo = {}, []
+    for name, fn, data in jobs:
+        paths = [str(out / (name + '.' + fmt)) for fmt in formats]
+        key = digest(fn.__module__, fn.__qualname__, list(formats), data)
+        key_path = out / ('.' + name + '.sha1')
+        if (not force and key_path.exists() and key_path.read_text() == key
+                and all(os.path.exists(p) for p in paths)):
+            status[name] = 'skipped'
+        else:
+            todo.append((name, fn, data, paths, key))
+
+    def done(name, key):
+        key_path = out / ('.' + name + '.sha1')
+        key_path.with_suffix('.tmp').write_text(key)
+        os.replace(key_path.with_suffix('.tmp'), key_path)
+        status[name] = 'rendered'
+
+    with metrics.timer('render'):
+        if len(todo) == 1 or workers == 1:
+            for name, fn, data, paths, key in todo:
+                _render(fn, data, paths)
+                done(name, key)
+        elif todo:
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(todo))) as pool:
+                futures = [(name, key, pool.submit(_render, fn, data, paths)) for name, fn, data, paths, key in todo]
+                for name, key, fut in futures:
+                    fut.result()
+                    done(name, key)
+    metrics.count('figures_rendered', len(todo))
+    metrics.count('figures_skipped', len(jobs) - len(todo))
+
+    for name in status:
+        print('[render] ' + name + ': ' + status[name])
+    return status
@@ -0,0 +1,170 @@
+# Purpose: Mergeable streaming quantile sketches for response-time percentiles.
+# Why: Exact groupby quantiles need every raw response time in memory on every run; a t-digest per
+#      (brand, week) is a few KB, updates incrementally and merges into months or brand groups.
+
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+class TDigest:
+    """Merging t-digest with the k1 (arcsine) scale function, compressed with vectorized binning.
+
+    Centroids are kept as parallel `means`/`weights` arrays; new values are buffered and folded
+    in by sorting and grouping points whose k-scale position falls in the same unit interval,
+    which keeps tails (p90/p95/p99) much finer than the median. Exact while n < compression / 2.
+    """
+
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buf_means = []
+        self._buf_weights = []
+        self._buffered = 0
+
+    @property
+    def count(self):
+        return float(self.weights.sum()) + self._buffered
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._buf_means.append(values)
+        self._buf_weights.append(np.ones(len(values)))
+        self._buffered += len(values)
+        if self._buffered >= 20 * self.compression:
+            self._compress()
+        return self
+
+    def merge(self, other):
+        other._compress()
+        if len(other.means) == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._buf_means.append(other.means)
+        self._buf_weights.append(other.weights)
+        self._buffered += float(other.weights.sum())
+        self._compress()
+        return self
+
+    def _compress(self):
+        if not self._buf_means:
+            return
+        means = np.concatenate([self.means] + self._buf_means)
+        weights = np.concatenate([self.weights] + self._buf_weights)
+        self._buf_means, self._buf_weights, self._buffered = [], [], 0
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        if len(means) <= self.compression / 2:
+            self.means, self.weights = means, weights
+            return
+        q_left = (np.cumsum(weights) - weights) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        bins = np.floor(k - k[0]).astype(np.int64)
+        _, start = np.unique(bins, return_index=True)
+        w = np.add.reduceat(weights, start)
+        self.means = np.add.reduceat(means * weights, start) / w
+        self.weights = w
+
+    def quantile(self, q):
+        """Quantile(s) with pandas' linear interpolation convention on exact (unmerged) data."""
+        self._compress()
+        q = np.asarray(q, dtype=float)
+        if len(self.means) == 0:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        xp = np.concatenate([[0.5], centers, [total - 0.5]])
+        fp = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(q * (total - 1) + 0.5, xp, fp)
+
+    def to_dict(self):
+        self._compress()
+        return {'compression': self.compression, 'min': self.min, 'max': self.max,
+                'means': self.means.tolist(), 'weights': self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        t = cls(d['compression'])
+        t.min, t.max = d['min'], d['max']
+        t.means = np.asarray(d['means'], dtype=float)
+        t.weights = np.asarray(d['weights'], dtype=float)
+        return t
+
+
+class SketchStore:
+    """Persistent map of (brand, period start) -> TDigest, plus the created_at watermark."""
+
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.sketches = {}
+        self.watermark = None
+
+    def add(self, df, period_col, value_col='response_time_min', brand_col='author_id_brand'):
+        df = df.dropna(subset=[value_col, brand_col])
+        for (brand, period), vals in df.groupby([brand_col, period_col], observed=True)[value_col]:
+            key = (str(brand), pd.Timestamp(period).isoformat())
+            sk = self.sketches.get(key)
+            if sk is None:
+                sk = self.sketches[key] = TDigest(self.compression)
+            sk.update(vals.to_numpy())
+
+    def merge(self, other):
+        # combine stores built on different shards
+        for key, sk in other.sketches.items():
+            if key in self.sketches:
+                self.sketches[key].merge(sk)
+            else:
+                self.sketches[key] = TDigest.from_dict(sk.to_dict())
+        if other.watermark is not None:
+            self.watermark = other.watermark if self.watermark is None else max(self.watermark, other.watermark)
+
+    def rollup(self, key_fn):
+        """Merge sketches under new keys, e.g. weeks -> months or brands -> brand groups."""
+        out = {}
+        for key, sk in self.sketches.items():
+            new_key = key_fn(*key)
+            if new_key is None:
+                continue
+            if new_key not in out:
+                out[new_key] = TDigest(self.compression)
+            out[new_key].merge(sk)
+        return out
+
+    def save(self, path):
+        payload = {'compression': self.compression,
+                   'watermark': None if self.watermark is None else self.watermark.isoformat(),
+                   'sketches': [[b, p, sk.to_dict()] for (b, p), sk in sorted(self.sketches.items())]}
+        tmp = str(path) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            payload = json.load(f)
+        store = cls(payload['compression'])
+        store.watermark = pd.Timestamp(payload['watermark']) if payload['watermark'] else None
+        store.sketches = {(b, p): TDigest.from_dict(d) for b, p, d in payload['sketches']}
+        return store
+
+
+def percentile_frame(sketches, key_names, qs=(0.5, 0.9, 0.95)):
+    rows = []
+    for key, sk in sorted(sketches.items()):
+        key = key if isinstance(key, tuple) else (key,)
+        vals = sk.quantile(list(qs))
+        rows.append(list(key) + list(vals) + [int(sk.count)])
+    cols = list(key_names) + ['p' + str(int(round(q * 100))) + '_min' for q in qs] + ['n']
+    return pd.DataFrame(rows, columns=cols)
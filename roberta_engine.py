@@ -0,0 +1,132 @@
+# Purpose: Length-bucketed, dynamically batched RoBERTa sentiment inference.
+# Why: Scoring texts in file order pads every batch to its longest tweet; sorting by
+#      token length and filling batches up to a token budget removes most of that waste.
+
+import time
+import numpy as np
+
+from instrument import metrics
+
+MODEL_NAME = 'cardiffnlp/twitter-roberta-base-sentiment-latest'
+LABELS = np.array(['Negative', 'Neutral', 'Positive'], dtype=object)
+
+
+def plan_batches(lengths, max_tokens=8192, max_batch=256):
+    """Group row positions into batches of similar length.
+
+    Rows are visited shortest first; a batch is closed once adding the next row
+    would push `rows * longest_row` over `max_tokens` or the row count over `max_batch`.
+    """
+    order = np.argsort(lengths, kind='stable')
+    batches = []
+    start = 0
+    for i in range(len(order)):
+        rows = i - start + 1
+        if rows > 1 and (rows * lengths[order[i]] > max_tokens or rows > max_batch):
+            batches.append(order[start:i])
+            start = i
+    if start < len(order):
+        batches.append(order[start:])
+    return batches
+
+
+class RobertaScorer:
+    """Reusable scoring engine around the cardiffnlp RoBERTa sentiment model.
+
+    `score()` returns `(labels, confidence, score_pos_minus_neg)` as NumPy arrays aligned
+    with the input order; throughput of the last call is kept in `last_stats`.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, max_length=256, max_tokens=8192, max_batch=256,
+                 num_threads=None, quantize=False, window=50_000):
+        # imported here so plan_batches and the ONNX backend load without torch
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        if num_threads:
+            torch.set_num_threads(int(num_threads))
+        self.model_name = model_name
+        self.max_length = max_length
+        self.max_tokens = max_tokens
+        self.max_batch = max_batch
+        self.window = window
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.quantized = bool(quantize)
+        # identifies the exact weights for caches: hub revision plus quantization
+        revision = getattr(model.config, '_commit_hash', None) or 'local'
+        self.model_version = revision + ('-int8' if self.quantized else '')
+        self.pad_id = self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else 0
+        self.last_stats = {}
+
+    def _tokenize(self, texts):
+        return self.tokenizer(texts, truncation=True, max_length=self.max_length)['input_ids']
+
+    def _pad(self, ids_list):
+        width = max(len(ids) for ids in ids_list)
+        input_ids = np.full((len(ids_list), width), self.pad_id, dtype=np.int64)
+        attention = np.zeros((len(ids_list), width), dtype=np.int64)
+        for r, ids in enumerate(ids_list):
+            input_ids[r, :len(ids)] = ids
+            attention[r, :len(ids)] = 1
+        return input_ids, attention
+
+    def _forward(self, ids_list):
+        import torch
+        input_ids, attention = self._pad(ids_list)
+        width = input_ids.shape[1]
+        with torch.inference_mode():
+            logits = self.model(input_ids=torch.from_numpy(input_ids),
+                                attention_mask=torch.from_numpy(attention)).logits
+            probs = torch.softmax(logits.float(), dim=1).numpy()
+        return probs, width * len(ids_list)
+
+    def score(self, texts):
+        texts = ['' if t is None else str(t) for t in texts]
+        n = len(texts)
+        label_idx = np.empty(n, dtype=np.int8)
+        confidence = np.empty(n, dtype=np.float32)
+        pos_minus_neg = np.empty(n, dtype=np.float32)
+
+        t0 = time.perf_counter()
+        n_batches = real_tokens = padded_tokens = 0
+        tokenize_s = forward_s = 0.0
+        for w0 in range(0, n, self.window):
+            chunk = texts[w0:w0 + self.window]
+            t = time.perf_counter()
+            ids = self._tokenize(chunk)
+            tokenize_s += time.perf_counter() - t
+            lengths = np.fromiter((len(x) for x in ids), dtype=np.int64, count=len(ids))
+            for batch in plan_batches(lengths, self.max_tokens, self.max_batch):
+                t = time.perf_counter()
+                probs, cells = self._forward([ids[i] for i in batch])
+                forward_s += time.perf_counter() - t
+                rows = batch + w0
+                label_idx[rows] = probs.argmax(axis=1)
+                confidence[rows] = probs.max(axis=1)
+                pos_minus_neg[rows] = probs[:, 2] - probs[:, 0]
+                n_batches += 1
+                padded_tokens += cells
+            real_tokens += int(lengths.sum())
+        elapsed = time.perf_counter() - t0
+        metrics.observe('roberta.tokenize', tokenize_s)
+        metrics.observe('roberta.forward', forward_s)
+        metrics.count('roberta.rows', n)
+        metrics.count('roberta.batches', n_batches)
+
+        self.last_stats = {
+            'rows': n,
+            'batches': n_batches,
+            'seconds': elapsed,
+            'rows_per_sec': (n / elapsed) if elapsed > 0 else 0.0,
+            'padding_ratio': (1 - real_tokens / padded_tokens) if padded_tokens else 0.0,
+        }
+        return LABELS[label_idx], confidence, pos_minus_neg
+
+    def report(self):
+        s = self.last_stats
+        return (f"[roberta] rows={s.get('rows', 0):,} batches={s.get('batches', 0):,} "
+                f"{s.get('rows_per_sec', 0.0):,.1f} rows/s padding={s.get('padding_ratio', 0.0):.1%}")
@@ -0,0 +1,197 @@
+# Purpose: Minute-level per-brand rollups of mention volume and sentiment for the dashboard.
+# Why: Resampling the full inbound history on every refresh makes each rerun O(total rows);
+#      additive minute buckets answer KPI windows, 15-minute trends and the rolling index in
+#      time proportional to the visible range.
+#
+# Usage: python rollup_store.py          # fold new inbound rows into data/twcs_minute_rollup
+
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+import storage
+from instrument import metrics
+
+ROLLUP = 'data/twcs_minute_rollup'
+COUNT_COLS = ['mentions', 'negatives', 'positives', 'senti_sum']
+SENTI_MAP = {'Positive': 1, 'Neutral': 0, 'Negative': -1}
+NS_PER_MIN = 60 * 1_000_000_000
+
+
+def _minutes(ts):
+    # tz-aware timestamps / Series -> int64 minutes since epoch
+    return pd.DatetimeIndex(ts).as_unit('ns').asi8 // NS_PER_MIN
+
+
+def _to_ts(minutes):
+    return pd.to_datetime(np.asarray(minutes, dtype=np.int64) * 60, unit='s', utc=True)
+
+
+def aggregate(df):
+    """Collapse raw mentions into (minute, brand) buckets."""
+    df = df.dropna(subset=['created_at'])
+    label = df['sentiment_roberta'].astype(object)
+    out = pd.DataFrame({
+        'minute': _minutes(df['created_at']),
+        'brand': df['author_id_brand'].astype(object).fillna('').astype(str).to_numpy()
+                 if 'author_id_brand' in df.columns else '',
+        'mentions': 1,
+        'negatives': (label == 'Negative').to_numpy().astype(np.int64),
+        'positives': (label == 'Positive').to_numpy().astype(np.int64),
+        'senti_sum': label.map(SENTI_MAP).fillna(0).to_numpy().astype(np.int64),
+    })
+    return out.groupby(['minute', 'brand'], sort=True, as_index=False)[COUNT_COLS].sum()
+
+
+class RollupStore:
+    """Sorted (minute, brand) buckets with additive counts and a created_at watermark.
+
+    Buckets are additive, so new data is folded in by re-summing only the overlapping tail.
+    Queries slice the minute range with binary search and never touch raw rows.
+
+    Safe to share between Streamlit sessions (e.g. via st.cache_resource): refresh/ingest and
+    the range slice behind every query hold a lock, so concurrent refreshes cannot fold the
+    same rows in twice and a query never mixes two versions of the buckets.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.buckets = pd.DataFrame({'minute': np.empty(0, dtype=np.int64), 'brand': np.empty(0, dtype=object),
+                                     **{c: np.empty(0, dtype=np.int64) for c in COUNT_COLS}})
+        self.watermark = None
+        self.source = None
+
+    # ---------- maintenance ----------
+    def ingest(self, df):
+        with self.lock:
+            if self.watermark is not None:
+                df = df[df['created_at'] > self.watermark]
+            if len(df) == 0 or df['created_at'].notna().sum() == 0:
+                return 0
+            new = aggregate(df)
+            cut = np.searchsorted(self.buckets['minute'].to_numpy(), new['minute'].iloc[0], side='left')
+            head, tail = self.buckets.iloc[:cut], self.buckets.iloc[cut:]
+            if len(tail):
+                new = pd.concat([tail, new]).groupby(['minute', 'brand'], sort=True, as_index=False)[COUNT_COLS].sum()
+            self.buckets = pd.concat([head, new], ignore_index=True)
+            self.watermark = df['created_at'].max() if self.watermark is None else max(self.watermark, df['created_at'].max())
+            return len(df)
+
+    def refresh(self, stem):
+        """Fold in rows of `stem` newer than the watermark (Parquet reads only the new days)."""
+        with self.lock:
+            self.source = storage.csv_path(stem).with_suffix('').as_posix()
+            if not storage.exists(stem):
+                return 0
+            cols = ['created_at', 'sentiment_roberta', 'author_id_brand']
+            return self.ingest(storage.read_table(stem, columns=cols, start=self.watermark))
+
+    def save(self, stem=ROLLUP):
+        with self.lock:
+            out, watermark = self.buckets.copy(), self.watermark
+        out.insert(0, 'created_at', _to_ts(out.pop('minute')))
+        storage.write_table(out, stem, csv=not storage.HAVE_ARROW)
+        with open(str(stem) + '.watermark.json', 'w') as f:
+            json.dump({'created_at': None if watermark is None else watermark.isoformat(),
+                       'source': self.source}, f)
+
+    @classmethod
+    def load(cls, stem=ROLLUP, source=None):
+        """Load a saved store; with `source`, start empty unless it was built from that table."""
+        store = cls()
+        if storage.exists(stem):
+            df = storage.read_table(stem)
+            df['minute'] = _minutes(df.pop('created_at'))
+            df['brand'] = df['brand'].astype(object).fillna('').astype(str)
+            store.buckets = df.sort_values(['minute', 'brand'], ignore_index=True)[['minute', 'brand'] + COUNT_COLS]
+            with open(str(stem) + '.watermark.json') as f:
+                meta = json.load(f)
+            store.watermark = pd.Timestamp(meta['created_at']) if meta['created_at'] else None
+            store.source = meta.get('source')
+            if source is not None and store.source != storage.csv_path(source).with_suffix('').as_posix():
+                return cls()
+        return store
+
+    # ---------- queries ----------
+    @property
+    def brands(self):
+        with self.lock:
+            return pd.unique(self.buckets['brand'])
+
+    def window(self, start=None, end=None, brands=None):
+        with self.lock:
+            buckets = self.buckets   # ingest swaps in a new frame; slice one consistent version
+        m = buckets['minute'].to_numpy()
+        lo = 0 if start is None else np.searchsorted(m, _minutes([start])[0], side='left')
+        hi = len(m) if end is None else np.searchsorted(m, _minutes([end])[0], side='right')
+        sub = buckets.iloc[lo:hi]
+        if brands is not None:
+            sub = sub[sub['brand'].isin(brands)]
+        return sub
+
+    def kpis(self, start, end, brands=None):
+        sub = self.window(start, end, brands)
+        total = int(sub['mentions'].sum())
+        neg = int(sub['negatives'].sum())
+        rate = (neg / total) if total > 0 else 0.0
+        last = _to_ts([sub['minute'].iloc[-1]])[0] if len(sub) else pd.NaT
+        return total, neg, rate, last
+
+    def trend(self, start=None, end=None, freq_min=15, rolling_min=60, brands=None):
+        """mentions / negatives / positives / neg_rate per bin plus the rolling sentiment index.
+
+        The index for each bin is the mean sentiment over the `rolling_min` minutes ending at the
+        bin's last active minute, matching the old rolling('1H').resample(...).last() view.
+        """
+        ext = None if start is None else pd.Timestamp(start) - pd.Timedelta(minutes=rolling_min)
+        sub = self.window(ext, end, brands)
+        cols = ['created_at', 'mentions', 'negatives', 'positives', 'neg_rate', 'rolling_sentiment_1h']
+        if len(sub) == 0:
+            return pd.DataFrame(columns=cols)
+        per_min = sub.groupby('minute', sort=True)[COUNT_COLS].sum()
+        mins = per_min.index.to_numpy()
+        cs_n = np.concatenate([[0], np.cumsum(per_min['mentions'].to_numpy())])
+        cs_s = np.concatenate([[0], np.cumsum(per_min['senti_sum'].to_numpy())])
+
+        vis = per_min if start is None else per_min[mins >= _minutes([start])[0]]
+        if len(vis) == 0:
+            return pd.DataFrame(columns=cols)
+        vmins = vis.index.to_numpy()
+        bins = vmins // freq_min
+        b0 = bins[0]
+        n_bins = bins[-1] - b0 + 1
+        idx = bins - b0
+        counts = {c: np.bincount(idx, weights=vis[c].to_numpy(), minlength=n_bins) for c in ['mentions', 'negatives', 'positives']}
+        last_min = np.full(n_bins, -1, dtype=np.int64)
+        np.maximum.at(last_min, idx, vmins)
+
+        active = last_min >= 0
+        hi = np.searchsorted(mins, last_min[active], side='right')
+        lo = np.searchsorted(mins, last_min[active] - rolling_min, side='right')
+        rolling = np.full(n_bins, np.nan)
+        rolling[active] = (cs_s[hi] - cs_s[lo]) / (cs_n[hi] - cs_n[lo])
+
+        mentions = counts['mentions']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rate = np.where(mentions > 0, counts['negatives'] / mentions, np.nan)
+        return pd.DataFrame({
+            'created_at': _to_ts((b0 + np.arange(n_bins)) * freq_min),
+            'mentions': mentions.astype(np.int64),
+            'negatives': counts['negatives'].astype(np.int64),
+            'positives': counts['positives'].astype(np.int64),
+            'neg_rate': rate,
+            'rolling_sentiment_1h': rolling,
+        })
+
+
+if __name__ == '__main__':
+    with metrics.stage('rollup'):
+        store = RollupStore.load()
+        with metrics.timer('refresh'):
+            added = store.refresh(storage.INBOUND)
+        with metrics.timer('save'):
+            store.save()
+        metrics.count('rows', added)
+    print(f"[rollup] added rows={added:,} buckets={len(store.buckets):,} watermark={store.watermark}")
@@ -0,0 +1,264 @@
+# Purpose: Single entry point that runs the numbered stages as a dependency DAG.
+# Why: Running eight scripts by hand in order re-does unchanged work and serializes stages that
+#      could overlap; declaring each stage's inputs/outputs lets the runner skip stages whose
+#      inputs hash the same as last time and run independent stages together (03, 04, 06 and the
+#      minute rollup once 02 is done; 05 and 07 once their inputs are).
+#
+# Usage:
+#   python run_pipeline.py                 # run everything that is out of date
+#   python run_pipeline.py 05 07           # these stages and whatever they depend on
+#   python run_pipeline.py 03 04 --only    # exactly these, using existing upstream outputs
+#   python run_pipeline.py --force --jobs 4
+#   python run_pipeline.py --dry-run       # show what would run
+#
+# Per-stage wall time, peak RSS, status and the stage's own timers/counters (instrument.py,
+# outputs/metrics/<stage>.json) go to outputs/pipeline_report.json; stage output is captured in
+# outputs/logs/<stage>.log. --profile 02 writes a cProfile dump to outputs/profiles/02.prof.
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import storage
+from instrument import REPORT_DIR
+
+BASE_DIR = Path(__file__).resolve().parent
+RAW = os.getenv('TWCS_RAW', 'data/twcs.csv')
+PREPARED = 'data/twcs_prepared.csv'
+REPLIES = 'data/twcs_first_replies'
+ROLLUP = 'data/twcs_minute_rollup'
+RT_PAIRS = 'data/twcs_first_reply_times.csv'
+WEEKLY = 'data/twcs_weekly_rt_stats.csv'
+STATE = 'data/.pipeline_state.json'
+REPORT = 'outputs/pipeline_report.json'
+LOG_DIR = 'outputs/logs'
+
+# Table stems (no suffix) resolve to the Parquet dataset or the CSV, whichever storage uses.
+# `code` lists the modules a stage imports besides its own script, so edits to them re-run it.
+STAGES = [
+    {'name': '01', 'script': '01_clean_and_prepare.py', 'inputs': [RAW],
+     'outputs': [PREPARED], 'code': ['storage.py']},
+    {'name': '01b', 'script': '01b_match_first_replies.py', 'inputs': [RAW],
+     'outputs': [REPLIES], 'code': ['storage.py']},
+    {'name': '02', 'script': '02_sentiment_roberta_with_vader_fallback.py', 'inputs': [PREPARED, REPLIES],
+     'outputs': [storage.INBOUND], 'code': ['storage.py', 'roberta_engine.py', 'onnx_engine.py', 'score_client.py', 'sentiment_cache.py']},
+    {'name': '03', 'script': '03_build_alerts_from_sentiment.py', 'inputs': [storage.INBOUND],
+     'outputs': [storage.ALERTS], 'code': ['storage.py', 'alert_builder.py', 'incidents.py', 'phrase_counts.py']},
+    {'name': 'rollup', 'script': 'rollup_store.py', 'inputs': [storage.INBOUND],
+     'outputs': [ROLLUP], 'code': ['storage.py']},
+    {'name': '04', 'script': '04_response_time_metrics_and_weekly_stats.py', 'inputs': [storage.INBOUND],
+     'outputs': [RT_PAIRS, WEEKLY], 'code': ['storage.py', 'quantile_sketch.py']},
+    {'name': '05', 'script': '05_regenerate_plots_roberta.py', 'inputs': [RT_PAIRS, WEEKLY, ROLLUP, storage.ALERTS],
+     'outputs': [], 'code': ['storage.py', 'plot_render.py', 'rollup_store.py']},
+    {'name': '06', 'script': '06_negative_phrase_mining.py', 'inputs': [storage.INBOUND],
+     'outputs': ['data/negative_phrases_uni.csv', 'data/negative_phrases_bi.csv', 'data/negative_phrases_tri.csv'],
+     'code': ['storage.py', 'phrase_counts.py']},
+    {'name': '07', 'script': '07_trend_sentiment_over_time.py', 'inputs': [ROLLUP],
+     'outputs': [], 'code': ['storage.py', 'plot_render.py', 'rollup_store.py']},
+]
+
+
+def resolve(path):
+    if Path(path).suffix:
+        return Path(path)
+    return storage.parquet_path(path) if storage.HAVE_ARROW and storage.parquet_path(path).exists() else storage.csv_path(path)
+
+
+class FileHasher:
+    """sha1 of files and directory trees, memoized on (size, mtime_ns) so unchanged files are not re-read."""
+
+    def __init__(self, memo=None):
+        self.memo = memo or {}
+        self.lock = threading.Lock()
+
+    def file(self, path):
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        key = str(Path(path).resolve())
+        with self.lock:
+            hit = self.memo.get(key)
+        if hit and hit[0] == stamp:
+            return hit[1]
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        with self.lock:
+            self.memo[key] = [stamp, h.hexdigest()]
+        return h.hexdigest()
+
+    def path(self, path):
+        p = resolve(path)
+        if not p.exists():
+            return 'missing'
+        if p.is_file():
+            return self.file(p)
+        h = hashlib.sha1()
+        for f in sorted(q for q in p.rglob('*') if q.is_file()):
+            h.update(str(f.relative_to(p)).encode())
+            h.update(self.file(f).encode())
+        return h.hexdigest()
+
+
+def stage_key(stage, hasher, extra_args):
+    h = hashlib.sha1()
+    for code in [stage['script']] + stage.get('code', []):
+        h.update(hasher.file(BASE_DIR / code).encode())
+    h.update(json.dumps(extra_args.get(stage['name'], [])).encode())
+    for path in stage['inputs']:
+        h.update(path.encode())
+        h.update(hasher.path(path).encode())
+    return h.hexdigest()
+
+
+def upstream(stages):
+    """stage name -> names of stages producing one of its inputs."""
+    producers = {out: s['name'] for s in stages for out in s['outputs']}
+    return {s['name']: sorted({producers[i] for i in s['inputs'] if i in producers} - {s['name']}) for s in stages}
+
+
+def select(stages, targets, only=False):
+    if not targets:
+        return stages
+    if only:
+        return [s for s in stages if s['name'] in targets]
+    deps = upstream(stages)
+    want, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in want:
+            want.add(name)
+            todo += deps[name]
+    return [s for s in stages if s['name'] in want]
+
+
+def run_stage(stage, extra_args):
+    """Run one stage as a subprocess; returns (exit code, wall seconds, peak RSS MB)."""
+    Path(LOG_DIR).mkdir(parents=True, exist_ok=True)
+    cmd = [sys.executable, str(BASE_DIR / stage['script'])] + extra_args.get(stage['name'], [])
+    t0 = time.perf_counter()
+    with open(Path(LOG_DIR) / (stage['name'] + '.log'), 'w') as log:
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports this child's own max RSS, even while other stages run concurrently
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, time.perf_counter() - t0, usage.ru_maxrss / 1024
+
+
+def run(stages, jobs=None, force=False, dry_run=False, extra_args=None):
+    extra_args = extra_args or {}
+    state = json.loads(Path(STATE).read_text()) if Path(STATE).exists() else {}
+    hasher = FileHasher(state.get('files'))
+    keys = state.get('stages', {})
+    deps = upstream(stages)
+    names = {s['name'] for s in stages}
+    by_name = {s['name']: s for s in stages}
+    report, pending, running, started = {}, [s['name'] for s in stages], {}, {}
+
+    def ready(name):
+        return all(d in report or d not in names for d in deps[name])
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        while pending or running:
+            for name in [n for n in pending if ready(n)]:
+                pending.remove(name)
+                stage = by_name[name]
+                failed = [d for d in deps[name] if d in report and report[d]['status'] in ('failed', 'blocked')]
+                if failed:
+                    report[name] = {'status': 'blocked', 'by': failed}
+                    print('[' + name + '] blocked by ' + ', '.join(failed))
+                    continue
+                key = stage_key(stage, hasher, extra_args)
+                outputs_ok = all(resolve(o).exists() for o in stage['outputs'])
+                # in a dry run nothing upstream is rebuilt, so its outputs still hash the same;
+                # a dependency that would run would change them, so this stage would run too
+                rerun = [d for d in deps[name] if d in report and report[d]['status'] == 'would run']
+                if not force and not rerun and keys.get(name) == key and outputs_ok:
+                    report[name] = {'status': 'skipped', 'key': key}
+                    print('[' + name + '] unchanged, skipped')
+                    continue
+                if dry_run:
+                    report[name] = {'status': 'would run', 'key': key}
+                    if rerun:
+                        report[name]['after'] = rerun
+                    print('[' + name + '] would run: ' + stage['script'] + (' (after ' + ', '.join(rerun) + ')' if rerun else ''))
+                    continue
+                print('[' + name + '] running ' + stage['script'])
+                started[name] = time.time()
+                running[pool.submit(run_stage, stage, extra_args)] = (name, key)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name, key = running.pop(fut)
+                code, wall, rss = fut.result()
+                ok = code == 0
+                report[name] = {'status': 'ok' if ok else 'failed', 'exit_code': code,
+                                'wall_s': round(wall, 3), 'peak_rss_mb': round(rss, 1), 'key': key}
+                stage_metrics = Path(REPORT_DIR) / (name + '.json')
+                if stage_metrics.exists() and stage_metrics.stat().st_mtime >= started[name]:
+                    m = json.loads(stage_metrics.read_text())
+                    report[name].update({k: m[k] for k in ('timers', 'counters', 'profile') if m.get(k)})
+                if ok:
+                    keys[name] = key
+                else:
+                    keys.pop(name, None)
+                    log = (Path(LOG_DIR) / (name + '.log')).read_text().splitlines()
+                    print('\n'.join('    ' + line for line in log[-20:]))
+                print('[' + name + '] ' + report[name]['status'] + f"  wall={wall:,.1f}s  peak_rss={rss:,.0f} MB")
+
+    if not dry_run:
+        Path(STATE).parent.mkdir(parents=True, exist_ok=True)
+        tmp = STATE + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'stages': keys, 'files': hasher.memo}, f)
+        os.replace(tmp, STATE)
+        Path(REPORT).parent.mkdir(parents=True, exist_ok=True)
+        with open(REPORT, 'w') as f:
+            json.dump({'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'stages': report}, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('targets', nargs='*', help='stage names (default: all)')
+    ap.add_argument('--jobs', type=int, default=None, help='max stages running at once')
+    ap.add_argument('--force', action='store_true', help='run selected stages even if their inputs are unchanged')
+    ap.add_argument('--only', action='store_true', help='run only the named targets, not their upstream stages')
+    ap.add_argument('--dry-run', action='store_true')
+    ap.add_argument('--list', action='store_true', help='print the DAG and exit')
+    ap.add_argument('--stage-args', action='append', default=[], metavar='NAME=ARGS',
+                    help="extra arguments for one stage, e.g. --stage-args '02=--workers 8'")
+    ap.add_argument('--profile', action='append', default=[], metavar='NAME',
+                    help='profile this stage (cProfile, or pyinstrument with PULSEGUARD_PROFILER=pyinstrument)')
+    args = ap.parse_args()
+
+    os.chdir(BASE_DIR)
+    deps = upstream(STAGES)
+    if args.list:
+        for s in STAGES:
+            print(s['name'].ljust(7) + s['script'].ljust(48) + 'after: ' + (', '.join(deps[s['name']]) or '-'))
+        sys.exit(0)
+    unknown = [t for t in args.targets if t not in deps]
+    if unknown:
+        ap.error('unknown stage(s): ' + ', '.join(unknown))
+    if args.profile:
+        os.environ['PULSEGUARD_PROFILE'] = ','.join(args.profile)   # inherited by the stage processes
+    extra = {}
+    for item in args.stage_args:
+        name, _, rest = item.partition('=')
+        extra[name] = rest.split()
+
+    t0 = time.perf_counter()
+    report = run(select(STAGES, args.targets, args.only), args.jobs, args.force, args.dry_run, extra)
+    failed = [n for n, r in report.items() if r['status'] in ('failed', 'blocked')]
+    print(f"[pipeline] {len(report)} stages in {time.perf_counter() - t0:,.1f}s"
+          + ('' if not failed else '  failed/blocked: ' + ', '.join(failed)))
+    sys.exit(1 if failed else 0)
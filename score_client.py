@@ -0,0 +1,122 @@
+# Purpose: Thin client for score_server.py with the same score() contract as RobertaScorer.
+# Why: Stage 02, the streamer and the dashboards can score against a warm model instead of
+#      loading their own; SCORE_SERVER points them at it (http://127.0.0.1:8765 or
+#      unix:/tmp/pulseguard-score.sock), and they load a local model when it is unset or down.
+
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from roberta_engine import LABELS
+
+
+class ScoreServerError(RuntimeError):
+    pass
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class ScoreClient:
+    """`score(texts)` -> (labels, confidence, score_pos_minus_neg) from a running score server.
+
+    Safe to share between threads (one keep-alive connection per thread). Large inputs go out in
+    `chunk`-sized requests. `model_name` / `model_version` mirror the server's scorer, so
+    sentiment-cache keys match those of a local model with the same weights.
+    """
+
+    def __init__(self, url, timeout=300, chunk=2048):
+        self.url = url
+        self.timeout = timeout
+        self.chunk = chunk
+        self._local = threading.local()
+        info = self.health()
+        self.model_name = info['model_name']
+        self.model_version = info['model_version']
+        self.backend = info['backend']
+        self.quantized = info['quantized']
+        self.last_stats = {}
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.url.startswith('unix:'):
+                conn = _UnixConnection(self.url[len('unix:'):], self.timeout)
+            else:
+                u = urlparse(self.url)
+                conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload).encode()
+        headers = {'Content-Type': 'application/json'} if body else {}
+        for attempt in (0, 1):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # the server may have closed an idle keep-alive connection; reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        if resp.status != 200:
+            try:
+                msg = json.loads(data)['error']
+            except (ValueError, KeyError):
+                msg = data[:200].decode(errors='replace')
+            raise ScoreServerError(f'{method} {path}: HTTP {resp.status}: {msg}')
+        return json.loads(data)
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def score(self, texts):
+        texts = ['' if t is None else str(t) for t in texts]
+        labels, conf, pos_minus_neg = [], [], []
+        t0 = time.perf_counter()
+        for i in range(0, len(texts), self.chunk):
+            res = self._request('POST', '/score', {'texts': texts[i:i + self.chunk]})
+            labels += res['labels']
+            conf += res['confidence']
+            pos_minus_neg += res['score_pos_minus_neg']
+        elapsed = time.perf_counter() - t0
+        self.last_stats = {'rows': len(texts), 'seconds': elapsed,
+                           'rows_per_sec': (len(texts) / elapsed) if elapsed > 0 else 0.0}
+        return (np.array(labels, dtype=LABELS.dtype), np.array(conf, dtype=np.float32),
+                np.array(pos_minus_neg, dtype=np.float32))
+
+    def report(self):
+        s = self.last_stats
+        return (f"[score-server] rows={s.get('rows', 0):,} {s.get('rows_per_sec', 0.0):,.1f} rows/s "
+                f"via {self.url}")
+
+
+def connect(url=None, timeout=300):
+    """ScoreClient for `url` (default $SCORE_SERVER), or None if unset or unreachable."""
+    url = url or os.getenv('SCORE_SERVER', '')
+    if not url:
+        return None
+    try:
+        return ScoreClient(url, timeout=timeout)
+    except (OSError, ScoreServerError, http.client.HTTPException, ValueError) as e:
+        print('Score server ' + url + ' unavailable: ' + str(e))
+        return None
@@ -0,0 +1,236 @@
+# Purpose: Long-lived local sentiment-scoring service that keeps the RoBERTa model warm.
+# Why: Every consumer used to pay model load and tokenizer start-up per process, which dominates
+#      small jobs and rules out ad-hoc scoring from the dashboard. One server holds the model;
+#      concurrent requests are coalesced into shared batches within a small latency budget.
+#
+# Usage:
+#   python score_server.py                                   # http://127.0.0.1:8765
+#   python score_server.py --unix /tmp/pulseguard-score.sock
+#   python score_server.py --port 8765 --max-delay-ms 10 --max-texts 512
+#   SCORE_SERVER=http://127.0.0.1:8765 python 02_sentiment_roberta_with_vader_fallback.py
+#
+# API (JSON):
+#   POST /score   {"texts": [...]}  -> {"labels": [...], "confidence": [...], "score_pos_minus_neg": [...]}
+#   GET  /health                    -> model name/version, backend and coalescing counters
+# Backend selection and threads follow onnx_engine.load_scorer (ROBERTA_BACKEND, ROBERTA_THREADS, ...).
+
+import argparse
+import json
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+from instrument import metrics
+
+DEFAULT_PORT = 8765
+MAX_BODY = 64 << 20
+
+
+class Coalescer:
+    """Funnels scoring requests from many threads into one scorer.
+
+    A single batcher thread takes the first waiting request, keeps collecting for up to
+    `max_delay_ms` or until `max_texts` texts are gathered, scores them in one call and hands
+    each request its slice. `submit()` raises queue.Full once `max_queue` requests are waiting.
+    """
+
+    def __init__(self, scorer, max_texts=512, max_delay_ms=10, max_queue=1000):
+        self.scorer = scorer
+        self.max_texts = max_texts
+        self.max_delay = max_delay_ms / 1000
+        self.q = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'texts': 0, 'batches': 0, 'errors': 0, 'score_seconds': 0.0}
+        self.thread = threading.Thread(target=self._loop, name='coalescer', daemon=True)
+        self.thread.start()
+
+    def submit(self, texts):
+        fut = Future()
+        self.q.put_nowait((texts, fut))
+        return fut
+
+    def close(self):
+        self.q.put(None)
+        self.thread.join()
+
+    def _collect(self):
+        first = self.q.get()
+        if first is None:
+            return None
+        batch, n = [first], len(first[0])
+        deadline = time.monotonic() + self.max_delay
+        while n < self.max_texts:
+            wait = deadline - time.monotonic()
+            if wait <= 0:
+                break
+            try:
+                item = self.q.get(timeout=wait)
+            except queue.Empty:
+                break
+            if item is None:
+                self.q.put(None)   # finish this batch, stop on the next round
+                break
+            batch.append(item)
+            n += len(item[0])
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            texts = [t for item, _ in batch for t in item]
+            t0 = time.perf_counter()
+            try:
+                labels, conf, pos_minus_neg = self.scorer.score(texts)
+            except Exception as e:
+                with self.lock:
+                    self.stats['errors'] += len(batch)
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - t0
+            metrics.observe('score_batch', elapsed)
+            metrics.count('texts', len(texts))
+            start = 0
+            for item, fut in batch:
+                end = start + len(item)
+                fut.set_result((labels[start:end].tolist(), conf[start:end].tolist(), pos_minus_neg[start:end].tolist()))
+                start = end
+            with self.lock:
+                self.stats['requests'] += len(batch)
+                self.stats['texts'] += len(texts)
+                self.stats['batches'] += 1
+                self.stats['score_seconds'] += elapsed
+
+    def snapshot(self):
+        with self.lock:
+            s = dict(self.stats)
+        s['queued'] = self.q.qsize()
+        s['requests_per_batch'] = round(s['requests'] / s['batches'], 2) if s['batches'] else 0.0
+        s['score_seconds'] = round(s['score_seconds'], 3)
+        return s
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, so clients reuse one connection per thread
+    server_version = 'pulseguard-score/1'
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self._send(404, {'error': 'not found'})
+        self._send(200, dict(self.server.info, stats=self.server.coalescer.snapshot()))
+
+    def do_POST(self):
+        if self.path != '/score':
+            return self._send(404, {'error': 'not found'})
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            return self._send(413, {'error': 'request body over ' + str(MAX_BODY) + ' bytes'})
+        try:
+            texts = json.loads(self.rfile.read(length))['texts']
+            if not isinstance(texts, list):
+                raise ValueError('"texts" must be a list')
+        except (ValueError, KeyError, TypeError) as e:
+            return self._send(400, {'error': 'bad request: ' + str(e)})
+        texts = ['' if t is None else str(t) for t in texts]
+        if not texts:
+            return self._send(200, {'labels': [], 'confidence': [], 'score_pos_minus_neg': []})
+        try:
+            fut = self.server.coalescer.submit(texts)
+        except queue.Full:
+            return self._send(503, {'error': 'server busy, retry later'})
+        try:
+            labels, conf, pos_minus_neg = fut.result(timeout=self.server.request_timeout)
+        except Exception as e:
+            return self._send(500, {'error': type(e).__name__ + ': ' + str(e)})
+        self._send(200, {'labels': labels, 'confidence': conf, 'score_pos_minus_neg': pos_minus_neg})
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+
+class TCPHandler(Handler):
+    # headers and body are separate writes; without TCP_NODELAY the body waits ~40 ms for an ACK
+    disable_nagle_algorithm = True
+
+
+class TCPHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024   # the default backlog of 5 drops connections under concurrent load
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def get_request(self):
+        conn, _ = self.socket.accept()
+        return conn, ('unix', 0)   # BaseHTTPRequestHandler expects a (host, port) pair
+
+
+def make_server(scorer, host='127.0.0.1', port=DEFAULT_PORT, unix=None, max_texts=512, max_delay_ms=10,
+                max_queue=1000, request_timeout=300, verbose=False):
+    if unix:
+        if os.path.exists(unix):
+            os.remove(unix)
+        server = UnixHTTPServer(unix, Handler)
+        url = 'unix:' + unix
+    else:
+        server = TCPHTTPServer((host, port), TCPHandler)
+        url = f'http://{host}:{server.server_address[1]}'
+    server.coalescer = Coalescer(scorer, max_texts, max_delay_ms, max_queue)
+    server.request_timeout = request_timeout
+    server.verbose = verbose
+    server.url = url
+    server.info = {'model_name': scorer.model_name, 'model_version': scorer.model_version,
+                   'backend': type(scorer).__name__, 'quantized': bool(getattr(scorer, 'quantized', False)),
+                   'max_texts': max_texts, 'max_delay_ms': max_delay_ms}
+    return server
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=DEFAULT_PORT)
+    ap.add_argument('--unix', default=None, help='listen on this Unix socket path instead of TCP')
+    ap.add_argument('--max-texts', type=int, default=512, help='texts gathered into one scoring call')
+    ap.add_argument('--max-delay-ms', type=float, default=10, help='how long a request may wait for company')
+    ap.add_argument('--max-queue', type=int, default=1000, help='waiting requests before answering 503')
+    ap.add_argument('--backend', choices=['auto', 'onnx', 'torch'], default=None)
+    ap.add_argument('--verbose', action='store_true', help='log every request')
+    args = ap.parse_args()
+
+    from onnx_engine import describe, load_scorer
+    t0 = time.perf_counter()
+    scorer = load_scorer(backend=args.backend)
+    print(f"[server] loaded {scorer.model_name} ({describe(scorer)}) in {time.perf_counter() - t0:.1f}s")
+    server = make_server(scorer, args.host, args.port, args.unix, args.max_texts, args.max_delay_ms,
+                         args.max_queue, verbose=args.verbose)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"[server] listening on {server.url}")
+    metrics.serve_from_env()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.coalescer.close()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+        print('[server] stopped  ' + json.dumps(server.coalescer.snapshot()))
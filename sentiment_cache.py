@@ -0,0 +1,109 @@
+# Purpose: Content-addressed, on-disk cache of sentiment scores.
+# Why: Most of the corpus was already scored on a previous run and templated complaints repeat
+#      the same cleaned text, so only new or changed texts should ever reach the model.
+
+import hashlib
+import sqlite3
+import numpy as np
+import pandas as pd
+
+_LOOKUP_CHUNK = 500   # stays well under SQLite's bound-parameter limit
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+class SentimentCache:
+    """SQLite table keyed by (model, sha1(text)).
+
+    `model` is "<model_name>@<version>", so switching model name, revision or quantization
+    never returns stale scores; `prune()` drops rows written by any other model.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.conn = sqlite3.connect(self.path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS scores ('
+            ' model TEXT NOT NULL, key BLOB NOT NULL,'
+            ' label TEXT NOT NULL, confidence REAL NOT NULL, score REAL NOT NULL, compound REAL,'
+            ' PRIMARY KEY (model, key)) WITHOUT ROWID')
+        self.conn.commit()
+
+    def get_many(self, model, keys):
+        found = {}
+        for i in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[i:i + _LOOKUP_CHUNK]
+            q = ('SELECT key, label, confidence, score, compound FROM scores WHERE model = ? AND key IN ('
+                 + ','.join('?' * len(chunk)) + ')')
+            for row in self.conn.execute(q, [model, *chunk]):
+                found[row[0]] = row[1:]
+        return found
+
+    def put_many(self, model, keys, labels, confidence, score, compound=None):
+        if compound is None:
+            compound = [None] * len(keys)
+        rows = zip([model] * len(keys), keys, map(str, labels), map(float, confidence), map(float, score),
+                   (None if c is None else float(c) for c in compound))
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def prune(self, keep_model):
+        with self.conn:
+            return self.conn.execute('DELETE FROM scores WHERE model != ?', (keep_model,)).rowcount
+
+    def close(self):
+        self.conn.close()
+
+
+def cached_score(cache, model, texts, score_fn, with_compound=False):
+    """Score `texts` through `cache`, sending only unseen unique texts to `score_fn`.
+
+    `score_fn(list_of_texts)` returns `(labels, confidence, score_pos_minus_neg)`, plus a
+    fourth `compound` array when `with_compound` is set. Returns the same tuple for every
+    input row and a stats dict with row, unique, hit and miss counts. `cache` may be None.
+    """
+    codes, uniques = pd.factorize(pd.Series(texts, dtype=object), use_na_sentinel=False)
+    uniques = [str(u) for u in uniques]
+    keys = [text_key(u) for u in uniques]
+    found = cache.get_many(model, keys) if cache is not None else {}
+
+    n = len(uniques)
+    labels = np.empty(n, dtype=object)
+    conf = np.empty(n, dtype=np.float32)
+    pmn = np.empty(n, dtype=np.float32)
+    compound = np.full(n, np.nan, dtype=np.float32)
+
+    miss = []
+    for i, k in enumerate(keys):
+        hit = found.get(k)
+        if hit is None:
+            miss.append(i)
+        else:
+            labels[i], conf[i], pmn[i] = hit[0], hit[1], hit[2]
+            if hit[3] is not None:
+                compound[i] = hit[3]
+
+    if miss:
+        out = score_fn([uniques[i] for i in miss])
+        labels[miss], conf[miss], pmn[miss] = out[0], out[1], out[2]
+        if with_compound:
+            compound[miss] = out[3]
+        if cache is not None:
+            cache.put_many(model, [keys[i] for i in miss], out[0], out[1], out[2],
+                           out[3] if with_compound else None)
+
+    stats = {'rows': len(codes), 'unique': n, 'hits': n - len(miss), 'misses': len(miss)}
+    result = (labels[codes], conf[codes], pmn[codes])
+    if with_compound:
+        result = result + (compound[codes],)
+    return result, stats
+
+
+def format_stats(name, stats):
+    rate = stats['hits'] / stats['unique'] if stats['unique'] else 0.0
+    return (f"[cache] {name}: rows={stats['rows']:,} unique={stats['unique']:,} "
+            f"hits={stats['hits']:,} misses={stats['misses']:,} hit_rate={rate:.1%}")
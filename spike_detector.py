@@ -0,0 +1,235 @@
+# Purpose: Incremental sliding-window negative-spike detection for the live mention stream.
+# Why: Re-reading the whole inbound table every invocation is slow and only sees the window it
+#      happens to be run in; ring-buffer counters make each tick cost O(brands), not O(history).
+
+import asyncio
+import csv
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from instrument import metrics
+
+
+ALL_BRANDS = '__all__'
+
+
+class WindowCounter:
+    """Volume and negative counts over the last `window_s` seconds in `bucket_s` buckets.
+
+    `add()` and `totals()` are O(1) amortized: stale buckets are cleared as time advances and
+    the running sums are adjusted, so cost never depends on how much history has been seen.
+    """
+
+    def __init__(self, window_s, bucket_s=5):
+        self.bucket_s = bucket_s
+        self.n = max(1, -(-int(window_s) // bucket_s))
+        self.vol = [0] * self.n
+        self.neg = [0] * self.n
+        self.total_vol = 0
+        self.total_neg = 0
+        self.head = None   # newest bucket id seen
+
+    def _advance(self, bucket):
+        if self.head is None:
+            self.head = bucket
+            return
+        steps = min(bucket - self.head, self.n)
+        for k in range(1, steps + 1):
+            i = (self.head + k) % self.n
+            self.total_vol -= self.vol[i]
+            self.total_neg -= self.neg[i]
+            self.vol[i] = self.neg[i] = 0
+        if bucket > self.head:
+            self.head = bucket
+
+    def add(self, ts_s, negative):
+        bucket = int(ts_s // self.bucket_s)
+        if self.head is not None and bucket <= self.head - self.n:
+            return   # older than the window
+        self._advance(bucket)
+        i = bucket % self.n
+        self.vol[i] += 1
+        self.total_vol += 1
+        if negative:
+            self.neg[i] += 1
+            self.total_neg += 1
+
+    def totals(self, now_s):
+        self._advance(int(now_s // self.bucket_s))
+        return self.total_vol, self.total_neg
+
+
+class SpikeDetector:
+    """The 08 rule (negative rate >= 30% with volume >= 50) over several windows, pooled and per brand."""
+
+    def __init__(self, windows_min=(10,), min_volume=50, min_neg_rate=0.30, bucket_s=5, per_brand=True):
+        self.windows_s = [int(m * 60) for m in windows_min]
+        self.min_volume = min_volume
+        self.min_neg_rate = min_neg_rate
+        self.bucket_s = bucket_s
+        self.per_brand = per_brand
+        self.counters = {}
+        self.last_event_s = None
+
+    def _for(self, key):
+        c = self.counters.get(key)
+        if c is None:
+            c = self.counters[key] = [WindowCounter(w, self.bucket_s) for w in self.windows_s]
+        return c
+
+    def update(self, ts_s, brand, negative):
+        keys = [ALL_BRANDS]
+        if self.per_brand and brand:
+            keys.append(brand)
+        for key in keys:
+            for counter in self._for(key):
+                counter.add(ts_s, negative)
+        if self.last_event_s is None or ts_s > self.last_event_s:
+            self.last_event_s = ts_s
+
+    def evaluate(self, now_s):
+        alerts = []
+        for key, counters in self.counters.items():
+            for window_s, counter in zip(self.windows_s, counters):
+                total, neg = counter.totals(now_s)
+                rate = (neg / total) if total > 0 else 0.0
+                if total >= self.min_volume and rate >= self.min_neg_rate:
+                    alerts.append({'ts': now_s, 'brand': key, 'window_min': window_s // 60,
+                                   'volume': total, 'negatives': neg, 'neg_rate': rate})
+        return alerts
+
+
+def format_alert(alert):
+    scope = '' if alert['brand'] == ALL_BRANDS else ' for ' + alert['brand']
+    text = ('PulseGuard Alert' + scope + ': ' + str(alert['window_min']) + '-min negative rate '
+            + str(round(alert['neg_rate'] * 100, 2)) + '% with volume ' + str(alert['volume']))
+    if 'z' in alert:
+        # brand_baseline anomalies carry what the brand normally looks like in this hour of the week
+        text += (' (z=' + str(round(alert['z'], 1)) + ' ' + alert['kind'] + '; expected '
+                 + str(round(alert['expected_neg_rate'] * 100, 1)) + '% of ~' + str(round(alert['expected_volume'], 1)) + ')')
+    return text
+
+
+# ---------- webhooks ----------
+
+class SlackWebhook:
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, payload):
+        import requests
+        resp = requests.post(self.url, json=payload, timeout=self.timeout)
+        return resp.status_code
+
+
+class StubWebhook:
+    """Local stand-in for Slack: records payloads instead of posting them."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, payload):
+        self.sent.append(payload)
+        return 200
+
+
+class AlertDispatcher:
+    """Async alert delivery with de-duplication and a per-(brand, window) cooldown.
+
+    `submit()` never blocks the detection loop; a background task posts queued alerts through
+    the webhook in a worker thread and appends them to the alert log read by the dashboard.
+    """
+
+    def __init__(self, webhook, cooldown_s=900, log_path=None):
+        self.webhook = webhook
+        self.cooldown_s = cooldown_s
+        self.log_path = Path(log_path) if log_path else None
+        self.last_sent = {}
+        self.queue = asyncio.Queue()
+        self.suppressed = 0
+
+    def submit(self, alert):
+        key = (alert['brand'], alert['window_min'])
+        last = self.last_sent.get(key)
+        if last is not None and alert['ts'] - last < self.cooldown_s:
+            self.suppressed += 1
+            return False
+        self.last_sent[key] = alert['ts']
+        self.queue.put_nowait(alert)
+        return True
+
+    def _log(self, alert, status):
+        if self.log_path is None:
+            return
+        new = not self.log_path.exists()
+        with open(self.log_path, 'a', newline='') as f:
+            w = csv.writer(f)
+            if new:
+                w.writerow(['ts', 'brand', 'window_min', 'volume', 'negatives', 'neg_rate', 'status', 'message'])
+            ts = datetime.fromtimestamp(alert['ts'], tz=timezone.utc).isoformat()
+            w.writerow([ts, alert['brand'], alert['window_min'], alert['volume'], alert['negatives'],
+                        round(alert['neg_rate'], 4), status, format_alert(alert)])
+
+    async def run(self):
+        while True:
+            alert = await self.queue.get()
+            try:
+                status = await asyncio.to_thread(self.webhook.send, {'text': format_alert(alert)})
+                print('Slack status: ' + str(status) + ' ' + format_alert(alert))
+            except Exception as e:
+                status = 'error'
+                print('Slack send failed: ' + str(e))
+            self._log(alert, status)
+            self.queue.task_done()
+
+
+# ---------- source ----------
+
+def parse_row(row):
+    # Accepts the stream buffer (t, sentiment[, label, author_id_brand]) or inbound-style rows
+    ts = row.get('t') or row.get('created_at')
+    ts_s = pd.Timestamp(ts).timestamp() if ts else None
+    label = row.get('label') or row.get('sentiment_roberta')
+    if label:
+        negative = label == 'Negative'
+    else:
+        try:
+            negative = float(row.get('sentiment', 0)) < 0
+        except ValueError:
+            negative = False
+    return ts_s, row.get('author_id_brand') or row.get('brand') or None, negative
+
+
+async def follow(tail, detector, dispatcher, tick_s=1.0, clock='wall', max_ticks=None):
+    """Poll `tail`, update counters and evaluate the rule every `tick_s` seconds.
+
+    `clock='event'` evaluates at the newest event time instead of wall time, for replays.
+    """
+    sender = asyncio.create_task(dispatcher.run())
+    ticks = 0
+    try:
+        while max_ticks is None or ticks < max_ticks:
+            rows = 0
+            with metrics.timer('ingest'):
+                for row in tail.poll():
+                    ts_s, brand, negative = parse_row(row)
+                    if ts_s is not None:
+                        detector.update(ts_s, brand, negative)
+                        rows += 1
+            metrics.count('rows', rows)
+            now_s = detector.last_event_s if clock == 'event' else time.time()
+            if now_s is not None:
+                with metrics.timer('evaluate'):
+                    alerts = detector.evaluate(now_s)
+                for alert in alerts:
+                    dispatcher.submit(alert)
+                metrics.count('alerts', len(alerts))
+            ticks += 1
+            await asyncio.sleep(tick_s)
+        await dispatcher.queue.join()
+    finally:
+        sender.cancel()
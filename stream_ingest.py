@@ -0,0 +1,342 @@
+# Purpose: Async live ingestion: source -> clean -> micro-batched scoring -> stream buffer CSV.
+# Why: The dashboard's live tab and the --follow spike detector read outputs/twitter_stream_buffer.csv,
+#      but nothing produced it; scoring was only the offline stage 02.
+#
+# Usage:
+#   python stream_ingest.py --replay data/twcs.csv --speedup 60          # replay TWCS at 60x real time
+#   python stream_ingest.py --replay data/twcs.csv --speedup 0 --limit 100000 --stats-json outputs/stream_stats.json
+#   python stream_ingest.py --socket 127.0.0.1:9099                      # newline-delimited JSON or text
+#   python stream_ingest.py --file inbox.csv                             # follow an append-only CSV
+#
+# Mentions flow through a bounded queue: when scoring falls behind, the queue fills and the
+# source awaits, so memory stays bounded. Batches close at --batch-size or --max-delay-ms after
+# their first mention, are cleaned and scored in a worker thread, and are appended in order.
+
+import argparse
+import asyncio
+import csv
+import importlib.util
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from tail_reader import FileTail
+
+BASE_DIR = Path(__file__).resolve().parent
+STREAM_BUF = 'outputs/twitter_stream_buffer.csv'
+BUFFER_COLUMNS = ['t', 'sentiment', 'label', 'author_id_brand', 'tweet_id', 'text']
+
+
+def _load_clean_text():
+    # 01_clean_and_prepare.py is not importable by name
+    spec = importlib.util.spec_from_file_location('clean_and_prepare', BASE_DIR / '01_clean_and_prepare.py')
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod.clean_text, mod.detect_columns
+
+
+clean_text, detect_columns = _load_clean_text()
+
+
+def mention(text, created_at=None, brand=None, tweet_id=None):
+    # `t_in` (monotonic) is when the mention entered the streamer; end-to-end latency is measured from it
+    return {'text': text, 'created_at': created_at, 'author_id_brand': brand, 'tweet_id': tweet_id,
+            't_in': time.perf_counter()}
+
+
+# ---------- sources: async iterators of mention dicts ----------
+
+class ReplaySource:
+    """Replays a TWCS-style CSV, sleeping the original created_at gaps / `speedup`.
+
+    Rows are time-ordered within each `chunksize` read, which matches how the dumps are laid out.
+
+    `speedup=0` replays as fast as the pipeline accepts, for throughput measurements.
+    """
+
+    def __init__(self, path, speedup=60.0, limit=None, chunksize=100_000, inbound_only=True):
+        self.path = path
+        self.speedup = speedup
+        self.limit = limit
+        self.chunksize = chunksize
+        self.inbound_only = inbound_only
+
+    async def __aiter__(self):
+        header = pd.read_csv(self.path, nrows=0).columns
+        text_col, time_col, id_col = detect_columns(header)
+        brand_col = 'author_id_brand' if 'author_id_brand' in header else None
+        usecols = {text_col, time_col, id_col} | ({brand_col} if brand_col else set())
+        if self.inbound_only and 'inbound' in header:
+            usecols.add('inbound')
+        sent, t0_event, t0_wall = 0, None, time.perf_counter()
+        for chunk in pd.read_csv(self.path, usecols=sorted(usecols), chunksize=self.chunksize):
+            if 'inbound' in chunk.columns:
+                chunk = chunk[chunk['inbound'].astype(str).str.lower() == 'true']
+            ts = pd.to_datetime(chunk[time_col], errors='coerce', utc=True, format='mixed')
+            chunk = chunk.assign(_ts=ts).dropna(subset=['_ts']).sort_values('_ts', kind='stable')
+            brands = chunk[brand_col] if brand_col else [None] * len(chunk)
+            for text, ts, tid, brand in zip(chunk[text_col], chunk['_ts'], chunk[id_col], brands):
+                if self.speedup > 0:
+                    t0_event = ts if t0_event is None else t0_event
+                    due = t0_wall + (ts - t0_event).total_seconds() / self.speedup
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                yield mention(text, ts.isoformat(), None if pd.isna(brand) else brand, tid)
+                sent += 1
+                if self.limit is not None and sent >= self.limit:
+                    return
+
+
+class FileSource:
+    """Follows an append-only CSV (text/created_at/tweet_id columns as in 01) with FileTail."""
+
+    def __init__(self, path, poll_s=0.5, from_end=False):
+        self.tail = FileTail(path, from_end=from_end)
+        self.poll_s = poll_s
+
+    async def __aiter__(self):
+        cols = None
+        while True:
+            rows = self.tail.poll()
+            if rows and cols is None:
+                text_col, time_col, id_col = detect_columns(self.tail.header)
+                cols = text_col, time_col, id_col
+            for row in rows:
+                text_col, time_col, id_col = cols
+                yield mention(row.get(text_col, ''), row.get(time_col), row.get('author_id_brand'), row.get(id_col))
+            if not rows:
+                await asyncio.sleep(self.poll_s)
+
+
+class SocketSource:
+    """TCP server taking newline-delimited JSON ({"text": ..., "author_id_brand": ...}) or plain text."""
+
+    def __init__(self, host='127.0.0.1', port=9099, maxsize=10_000):
+        self.host, self.port = host, port
+        self.queue = asyncio.Queue(maxsize)
+
+    async def _client(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                line = line.decode('utf-8', 'replace').strip()
+                if not line:
+                    continue
+                try:
+                    d = json.loads(line)
+                except ValueError:
+                    d = {'text': line}
+                if not isinstance(d, dict):
+                    d = {'text': str(d)}
+                # awaiting here stops reading the socket, so TCP flow control pushes back on the client
+                await self.queue.put(mention(d.get('text', ''), d.get('created_at'), d.get('author_id_brand'), d.get('tweet_id')))
+        finally:
+            writer.close()
+
+    async def __aiter__(self):
+        server = await asyncio.start_server(self._client, self.host, self.port)
+        print(f"[stream] listening on {self.host}:{self.port}")
+        async with server:
+            while True:
+                yield await self.queue.get()
+
+
+# ---------- scoring ----------
+
+class RobertaBatchScorer:
+    name = 'roberta'
+
+    def __init__(self):
+        from onnx_engine import load_scorer
+        from score_client import connect
+        # a warm score server if $SCORE_SERVER is up, else a local model; env as in stage 02
+        self.scorer = connect() or load_scorer()
+
+    def __call__(self, texts):
+        labels, _, pos_minus_neg = self.scorer.score(texts)
+        return labels, pos_minus_neg
+
+
+class VaderBatchScorer:
+    name = 'vader'
+
+    def __init__(self):
+        import nltk
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        try:
+            nltk.data.find('sentiment/vader_lexicon.zip')
+        except LookupError:
+            nltk.download('vader_lexicon')
+        self.sia = SentimentIntensityAnalyzer()
+
+    def __call__(self, texts):
+        # same thresholds as stage 02's VADER fallback
+        compound = np.array([self.sia.polarity_scores(t)['compound'] for t in texts], dtype=np.float32)
+        labels = np.where(compound >= 0.05, 'Positive', np.where(compound <= -0.05, 'Negative', 'Neutral'))
+        return labels, compound
+
+
+def make_scorer(kind='auto'):
+    """'roberta', 'vader', or 'auto' (RoBERTa, falling back to VADER like stage 02)."""
+    if kind in ('auto', 'roberta'):
+        try:
+            return RobertaBatchScorer()
+        except Exception as e:
+            if kind == 'roberta':
+                raise
+            print('RoBERTa load failed: ' + str(e) + '; falling back to VADER')
+    return VaderBatchScorer()
+
+
+# ---------- pipeline ----------
+
+class LatencyStats:
+    def __init__(self, keep=200_000):
+        self.latencies = deque(maxlen=keep)
+        self.count = 0
+        self.batches = 0
+        self.t0 = None
+
+    def add(self, t_ins, t_out):
+        self.t0 = self.t0 or min(t_ins)
+        self.latencies.extend(t_out - t for t in t_ins)
+        self.count += len(t_ins)
+        self.batches += 1
+
+    def summary(self):
+        lat = np.fromiter(self.latencies, dtype=float) if self.latencies else np.zeros(1)
+        elapsed = (time.perf_counter() - self.t0) if self.t0 else 0.0
+        return {'messages': self.count, 'batches': self.batches, 'seconds': round(elapsed, 3),
+                'msgs_per_s': round(self.count / elapsed, 1) if elapsed > 0 else 0.0,
+                'p50_ms': round(float(np.percentile(lat, 50)) * 1000, 2),
+                'p99_ms': round(float(np.percentile(lat, 99)) * 1000, 2),
+                'max_ms': round(float(lat.max()) * 1000, 2)}
+
+
+class StreamIngestor:
+    def __init__(self, scorer, buffer_path=STREAM_BUF, batch_size=64, max_delay_ms=200, queue_size=5_000,
+                 inflight=2, stamp='event'):
+        self.scorer = scorer
+        self.buffer_path = Path(buffer_path)
+        self.batch_size = batch_size
+        self.max_delay_s = max_delay_ms / 1000
+        self.queue = asyncio.Queue(queue_size)
+        self.scored = asyncio.Queue(inflight)     # futures in arrival order; bounds batches in flight
+        self.executor = ThreadPoolExecutor(max_workers=inflight)
+        self.stamp = stamp
+        self.stats = LatencyStats()
+
+    def _score(self, batch):
+        texts = [clean_text(m['text']) for m in batch]
+        labels, values = self.scorer(texts)
+        now = datetime.now(timezone.utc).isoformat()
+        rows = []
+        for m, text, label, value in zip(batch, texts, labels, values):
+            t = m['created_at'] if self.stamp == 'event' and m['created_at'] else now
+            rows.append([t, round(float(value), 4), label, m['author_id_brand'] or '',
+                         '' if m['tweet_id'] is None else m['tweet_id'], text])
+        return rows
+
+    async def _produce(self, source):
+        async for m in source:
+            await self.queue.put(m)          # blocks when full: backpressure on the source
+        await self.queue.put(None)
+
+    async def _batch(self):
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            first = await self.queue.get()
+            if first is None:
+                break
+            batch, deadline = [first], loop.time() + self.max_delay_s
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    m = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if m is None:
+                    done = True
+                    break
+                batch.append(m)
+            fut = loop.run_in_executor(self.executor, self._score, batch)
+            await self.scored.put((batch, fut))
+        await self.scored.put(None)
+
+    def _append(self, rows):
+        new = not self.buffer_path.exists() or self.buffer_path.stat().st_size == 0
+        with open(self.buffer_path, 'a', newline='') as f:
+            w = csv.writer(f)
+            if new:
+                w.writerow(BUFFER_COLUMNS)
+            w.writerows(rows)
+
+    async def _write(self, report_every_s):
+        last = time.perf_counter()
+        while (item := await self.scored.get()) is not None:
+            batch, fut = item
+            rows = await fut
+            await asyncio.to_thread(self._append, rows)
+            self.stats.add([m['t_in'] for m in batch], time.perf_counter())
+            if report_every_s and time.perf_counter() - last >= report_every_s:
+                last = time.perf_counter()
+                s = self.stats.summary()
+                print(f"[stream] {s['messages']:,} msgs  {s['msgs_per_s']:,.0f} msgs/s  p50={s['p50_ms']:.1f} ms  "
+                      f"p99={s['p99_ms']:.1f} ms  queue={self.queue.qsize():,}")
+
+    async def run(self, source, report_every_s=5.0):
+        self.buffer_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            await asyncio.gather(self._produce(source), self._batch(), self._write(report_every_s))
+        finally:
+            self.executor.shutdown(wait=False)
+        return self.stats.summary()
+
+
+def build_source(args):
+    if args.replay:
+        return ReplaySource(args.replay, args.speedup, args.limit)
+    if args.socket:
+        host, _, port = args.socket.rpartition(':')
+        return SocketSource(host or '127.0.0.1', int(port), args.queue_size)
+    return FileSource(args.file, from_end=args.from_end)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument('--replay', help='TWCS-style CSV to replay in time order')
+    src.add_argument('--socket', help='HOST:PORT to listen on for newline-delimited mentions')
+    src.add_argument('--file', help='append-only CSV to follow')
+    ap.add_argument('--speedup', type=float, default=60.0, help='replay speed vs real time (0 = as fast as possible)')
+    ap.add_argument('--limit', type=int, default=None, help='stop the replay after this many mentions')
+    ap.add_argument('--from-end', action='store_true', help='--file: skip rows already in the file')
+    ap.add_argument('--buffer', default=STREAM_BUF)
+    ap.add_argument('--scorer', choices=['auto', 'roberta', 'vader'], default='auto')
+    ap.add_argument('--batch-size', type=int, default=64)
+    ap.add_argument('--max-delay-ms', type=float, default=200)
+    ap.add_argument('--queue-size', type=int, default=5_000)
+    ap.add_argument('--inflight', type=int, default=2, help='batches scored concurrently')
+    ap.add_argument('--stamp', choices=['event', 'ingest'], default='event',
+                    help="'t' column: the mention's created_at, or the time it was scored")
+    ap.add_argument('--stats-json', default=None)
+    args = ap.parse_args()
+
+    ingestor = StreamIngestor(make_scorer(args.scorer), args.buffer, args.batch_size, args.max_delay_ms,
+                              args.queue_size, args.inflight, args.stamp)
+    try:
+        stats = asyncio.run(ingestor.run(build_source(args)))
+    except KeyboardInterrupt:
+        stats = ingestor.stats.summary()
+    print('[stream] done ' + json.dumps(stats))
+    if args.stats_json:
+        Path(args.stats_json).write_text(json.dumps(stats, indent=2))
@@ -2,6 +2,9 @@
 import streamlit as st
 import pandas as pd
 from pathlib import Path
+import storage
+from tail_reader import TailReader
+from score_client import connect
 
 # ---------- paths ----------
 APP_DIR   = Path(__file__).resolve().parent
@@ -13,37 +16,58 @@ STREAM_BUF = OUT_DIR / "twitter_stream_buffer.csv"   # live buffer from streamer
 ALERT_LOG  = OUT_DIR / "alerts_log.csv"              # spike alerts (if any)
 STATIC_CSV = DATA_DIR / "twcs_inbound_with_roberta.csv"  # fallback for quick demo
 
+# ---------- tailing readers (shared across sessions; each rerun parses only appended lines) ----------
+@st.cache_resource
+def stream_reader():
+    return TailReader(STREAM_BUF, maxlen=500, parse_dates=["t"], numeric=["sentiment"])
+
+@st.cache_resource
+def alert_reader():
+    # the ring only feeds the table; the 24h metric counts every alert in the window
+    return TailReader(ALERT_LOG, maxlen=5000, parse_dates=["ts"], window_col="ts", window="1D")
+
+@st.cache_resource(ttl=60, show_spinner=False)
+def score_client():
+    # warm score_server.py at $SCORE_SERVER (None if unset/down; retried after the ttl)
+    return connect(timeout=30)
+
 # ---------- ui ----------
 st.set_page_config(page_title="PulseGuard Lite", layout="wide")
 st.title("PulseGuard Lite — Real-Time Support Sentiment")
 
-tabs = st.tabs(["Live stream", "Alerts", "Static snapshot"])
+tabs = st.tabs(["Live stream", "Alerts", "Static snapshot", "Score text"])
 
 # ---------- live stream ----------
 with tabs[0]:
-    if STREAM_BUF.exists():
-        df = pd.read_csv(STREAM_BUF, parse_dates=["t"])
-        df = df.sort_values("t")
-        st.metric("Total streamed", len(df))
-        st.line_chart(df.set_index("t")["sentiment"].tail(500), height=240)
+    reader = stream_reader()
+    if reader.exists:
+        reader.poll()
+        df = reader.recent().sort_values("t", kind="stable")
+        st.metric("Total streamed", reader.total_rows)
+        st.line_chart(df.set_index("t")["sentiment"], height=240)
         st.subheader("Latest messages")
         st.dataframe(df.tail(25), use_container_width=True)
     else:
-        st.info("No live buffer found at `outputs/twitter_stream_buffer.csv`. Start the streamer or use the Static snapshot tab.")
+        st.info("No live buffer found at `outputs/twitter_stream_buffer.csv`. Start the streamer "
+                "(`python stream_ingest.py --replay data/twcs.csv`) or use the Static snapshot tab.")
 
 # ---------- alerts ----------
 with tabs[1]:
-    if ALERT_LOG.exists():
-        al = pd.read_csv(ALERT_LOG, parse_dates=["ts"]).sort_values("ts", ascending=False)
-        st.metric("Alerts (24h)", (al["ts"] > (pd.Timestamp.utcnow() - pd.Timedelta("1D"))).sum())
+    reader = alert_reader()
+    if reader.exists:
+        reader.poll()
+        al = reader.recent()
+        if "ts" in al.columns:
+            al = al.sort_values("ts", ascending=False)
+        st.metric("Alerts (24h)", reader.window_count())
         st.dataframe(al.head(50), use_container_width=True)
     else:
         st.info("No alerts logged yet.")
 
 # ---------- static snapshot ----------
 with tabs[2]:
-    if STATIC_CSV.exists():
-        sdf = pd.read_csv(STATIC_CSV)
+    if storage.exists(STATIC_CSV):
+        sdf = storage.read_table(STATIC_CSV)
         # try to parse timestamp if present
         ts_col = next((c for c in sdf.columns if c.lower() in ("created_at","date","datetime","timestamp")), None)
         if ts_col:
@@ -62,3 +86,21 @@ with tabs[2]:
             st.bar_chart(sdf[sent_col].value_counts())
     else:
         st.warning("Static file not found at `data/twcs_inbound_with_roberta.csv`.")
+
+# ---------- ad-hoc scoring ----------
+with tabs[3]:
+    client = score_client()
+    if client is None:
+        st.info("No score server reachable. Start one (`python score_server.py`) and set "
+                "`SCORE_SERVER=http://127.0.0.1:8765` before launching the app.")
+    else:
+        st.caption(f"{client.model_name} ({client.backend}) via {client.url}")
+        text = st.text_area("One message per line", height=150)
+        lines = [t for t in text.splitlines() if t.strip()]
+        if lines and st.button("Score"):
+            try:
+                labels, conf, pos_minus_neg = client.score(lines)
+                st.dataframe(pd.DataFrame({"text": lines, "sentiment": labels, "confidence": conf,
+                                           "score_pos_minus_neg": pos_minus_neg}), use_container_width=True)
+            except (OSError, RuntimeError) as e:
+                st.warning(f"Scoring failed: {e}")
@@ -0,0 +1,82 @@
+# Purpose: End-to-end check of the live spike path: SpikeDetector -> AlertDispatcher -> webhook.
+# Why: The detector, cooldown and payload formatting are only exercised together when a stream is
+#      running; a synthetic spike through a StubWebhook pins down what actually gets posted.
+#
+# Usage: python -m pytest -q tests
+
+import asyncio
+import csv
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from spike_detector import AlertDispatcher, SpikeDetector, StubWebhook  # noqa: E402
+
+
+def feed_spike(detector, start_s, n=60, negatives=40, brand='AcmeSupport'):
+    # one mention per second, the first `negatives` of them negative
+    for i in range(n):
+        detector.update(start_s + i, brand, i < negatives)
+
+
+async def deliver(dispatcher, batches):
+    # submit each tick's alerts, then wait for the sender to drain the queue
+    sender = asyncio.create_task(dispatcher.run())
+    try:
+        accepted = [[dispatcher.submit(a) for a in alerts] for alerts in batches]
+        await dispatcher.queue.join()
+    finally:
+        sender.cancel()
+    return accepted
+
+
+def test_spike_alert_cooldown_and_payload(tmp_path):
+    detector = SpikeDetector(windows_min=(10,), min_volume=50, min_neg_rate=0.30, per_brand=False)
+    assert detector.evaluate(0) == []
+
+    feed_spike(detector, 0)
+    first = detector.evaluate(60)
+    assert len(first) == 1
+    alert = first[0]
+    assert (alert['brand'], alert['window_min'], alert['volume'], alert['negatives']) == ('__all__', 10, 60, 40)
+    assert abs(alert['neg_rate'] - 40 / 60) < 1e-12
+
+    # still inside the window and the cooldown: the rule fires again but nothing is re-sent
+    again = detector.evaluate(120)
+    assert len(again) == 1
+
+    webhook = StubWebhook()
+    log = tmp_path / 'alerts_log.csv'
+    dispatcher = AlertDispatcher(webhook, cooldown_s=900, log_path=log)
+    accepted = asyncio.run(deliver(dispatcher, [first, again]))
+
+    assert accepted == [[True], [False]]
+    assert dispatcher.suppressed == 1
+    assert len(webhook.sent) == 1
+    assert webhook.sent[0] == {'text': 'PulseGuard Alert: 10-min negative rate 66.67% with volume 60'}
+
+    rows = list(csv.DictReader(log.read_text().splitlines()))
+    assert len(rows) == 1
+    assert rows[0]['brand'] == '__all__' and rows[0]['window_min'] == '10'
+    assert rows[0]['volume'] == '60' and rows[0]['negatives'] == '40'
+    assert rows[0]['status'] == '200' and rows[0]['message'] == webhook.sent[0]['text']
+
+
+def test_cooldown_is_per_brand_and_expires():
+    detector = SpikeDetector(windows_min=(10,), min_volume=50, min_neg_rate=0.30, per_brand=True)
+    feed_spike(detector, 0)
+    alerts = detector.evaluate(60)
+    assert sorted(a['brand'] for a in alerts) == ['AcmeSupport', '__all__']
+
+    # a second spike once the cooldown has passed is delivered again
+    feed_spike(detector, 1000)
+    later = detector.evaluate(1060)
+
+    webhook = StubWebhook()
+    dispatcher = AlertDispatcher(webhook, cooldown_s=900)
+    accepted = asyncio.run(deliver(dispatcher, [alerts, later]))
+
+    assert accepted == [[True, True], [True, True]]
+    assert len(webhook.sent) == 4
+    assert sum(' for AcmeSupport: ' in p['text'] for p in webhook.sent) == 2